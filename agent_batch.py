@@ -0,0 +1,185 @@
+"""Modo batch (sin Streamlit) del CryptoAgent.
+
+Procesa un fichero JSONL de consultas contra un único snapshot de pools y
+escribe los resultados en JSONL o Parquet:
+
+    python agent_batch.py consultas.jsonl -o resultados.jsonl --snapshot pools.json --workers 4
+
+Cada línea es una consulta en texto o un objeto {"id", "query", "session"}.
+Las consultas de una misma sesión se procesan en orden con el mismo agente
+(para refinamientos como "ahora con APY mínimo 5"); las que no indican sesión
+se procesan con el estado reseteado.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from crypto_agent import CryptoAgent
+from defillama import fetch_pools, load_pools_snapshot
+from pools_snapshot import write_snapshot
+
+# Snapshot compartido en solo lectura por los procesos del pool
+_SNAPSHOT = None
+
+
+def read_queries(path):
+    """Lee el fichero de consultas y asigna id y sesión a cada una"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line) if line.startswith("{") else {"query": line}
+            item.setdefault("id", line_number)
+            item.setdefault("session", f"_{item['id']}")
+            queries.append(item)
+    return queries
+
+
+def _init_worker(snapshot_path):
+    """Carga el snapshot en el proceso si no se heredó del padre (spawn)"""
+    global _SNAPSHOT
+    if _SNAPSHOT is None:
+        _SNAPSHOT = load_pools_snapshot(snapshot_path)
+
+
+def _result_record(item, response, elapsed_ms):
+    if isinstance(response, tuple) and len(response) == 3:
+        message, data_type, data = response
+    else:
+        message, data_type, data = response, "text", None
+
+    if isinstance(data, pd.DataFrame):
+        data = data.to_dict("records")
+    elif data is not None:
+        data = None  # Las figuras no se serializan
+
+    return {
+        "id": item.get("id"),
+        "session": item.get("session"),
+        "query": item["query"],
+        "type": data_type,
+        "message": message,
+        "data": data,
+        "elapsed_ms": round(elapsed_ms, 3),
+    }
+
+
+def run_sessions(sessions, reset_each=False, seed=None):
+    """Procesa una lista de sesiones (listas de (posición, consulta)) con un agente por sesión.
+
+    Devuelve pares (posición en la entrada, resultado).
+    """
+    agent = CryptoAgent(snapshot=_SNAPSHOT)
+    results = []
+    for session in sessions:
+        agent.reset_state()
+        for position, item in session:
+            if reset_each:
+                agent.reset_state()
+            if seed is not None:
+                random.seed(f"{seed}-{item.get('id', position)}")
+            start = time.perf_counter()
+            response = agent.process_query(item["query"])
+            results.append((position, _result_record(item, response, (time.perf_counter() - start) * 1000)))
+    return results
+
+
+def run_batch(queries, snapshot, snapshot_path=None, workers=1, reset_each=False, seed=None):
+    """Procesa todas las consultas y devuelve (resultados, estadísticas).
+
+    Sin fork y sin snapshot_path, el snapshot se escribe en un fichero
+    temporal para que lo carguen los procesos.
+    """
+    global _SNAPSHOT
+    _SNAPSHOT = snapshot
+
+    # Cada consulta viaja con su posición en la entrada (los ids pueden repetirse o faltar)
+    sessions = {}
+    for position, item in enumerate(queries):
+        sessions.setdefault(item.get("session", f"_{position}"), []).append((position, item))
+    sessions = list(sessions.values())
+
+    start = time.perf_counter()
+    if workers <= 1 or len(sessions) <= 1:
+        results = run_sessions(sessions, reset_each, seed)
+    else:
+        # Reparto de sesiones en bloques; con fork los procesos heredan el snapshot sin copiarlo
+        n_chunks = min(len(sessions), workers * 4)
+        chunks = [sessions[i::n_chunks] for i in range(n_chunks)]
+        method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+        temporary_path = None
+        if method == "spawn" and snapshot_path is None:
+            # Sin fork, los procesos necesitan leer el snapshot de disco
+            fd, temporary_path = tempfile.mkstemp(prefix="agent_batch_", suffix=".arrow")
+            os.close(fd)
+            write_snapshot(snapshot, temporary_path)
+            snapshot_path = temporary_path
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker,
+                initargs=(snapshot_path,)
+            ) as executor:
+                parts = executor.map(run_sessions, chunks, [reset_each] * n_chunks, [seed] * n_chunks)
+                results = [record for part in parts for record in part]
+        finally:
+            if temporary_path is not None:
+                os.remove(temporary_path)
+    elapsed = time.perf_counter() - start
+
+    # Resultados en el orden del fichero de entrada
+    results.sort(key=lambda pair: pair[0])
+    results = [record for _, record in results]
+
+    stats = {
+        "queries": len(results),
+        "sessions": len(sessions),
+        "workers": workers,
+        "seconds": round(elapsed, 3),
+        "queries_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else None,
+    }
+    return results, stats
+
+
+def write_results(results, path):
+    if path.endswith(".parquet"):
+        frame = pd.DataFrame(results)
+        frame["data"] = frame["data"].map(lambda data: json.dumps(data, ensure_ascii=False, default=str))
+        frame.to_parquet(path, index=False)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            for record in results:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Procesa un fichero JSONL de consultas con el CryptoAgent")
+    parser.add_argument("queries", help="Fichero JSONL de consultas")
+    parser.add_argument("-o", "--output", required=True, help="Resultados (.jsonl o .parquet)")
+    parser.add_argument("--snapshot", help="Snapshot de pools (JSON, Parquet o Feather); por defecto se descarga")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--reset-each", action="store_true", help="Resetear el estado antes de cada consulta")
+    parser.add_argument("--seed", help="Semilla para que los mensajes sean reproducibles")
+    args = parser.parse_args(argv)
+
+    snapshot = load_pools_snapshot(args.snapshot) if args.snapshot else fetch_pools()
+    queries = read_queries(args.queries)
+
+    results, stats = run_batch(queries, snapshot, args.snapshot, args.workers, args.reset_each, args.seed)
+    write_results(results, args.output)
+    print(json.dumps(stats), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
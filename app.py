@@ -1,15 +1,8 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
 import random
-import matplotlib as mpl
-from PIL import Image
-from io import BytesIO
-import requests
-import datetime
 import hashlib
+import uuid
+from conversation_log import conversation_log
 
 # Page configuration - DEBE SER LA PRIMERA LLAMADA A STREAMLIT
 st.set_page_config(
@@ -24,6 +17,9 @@ SECONDARY_COLOR = "#403680"
 BG_COLOR = "#000000"
 ACCENT_COLOR = "#A199DA"
 
+# Rows per page in the Positions table
+PAGE_SIZES = [25, 50, 100, 250]
+
 # Apply custom branding
 def apply_custom_branding():
     # Custom CSS with branding
@@ -121,6 +117,9 @@ USERS = {
     "demo": "demo2024"
 }
 
+# Users allowed to see the admin panels
+ADMIN_USERS = {"admin"}
+
 # Initialize session states
 if 'logged_in' not in st.session_state:
     st.session_state.logged_in = False
@@ -128,17 +127,28 @@ if 'logged_in' not in st.session_state:
 if 'user' not in st.session_state:
     st.session_state.user = None
 
+# Session id shared with the agent page's conversation logs
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+
+# Login and logout events go to the same persistent log as the agent conversations
+def log_session_event(event, user):
+    conversation_log.log(page="app", session=st.session_state.session_id, user=user, event=event)
+
 # Login function
 def login(username, password):
     if username in USERS and USERS[username] == password:
         st.session_state.logged_in = True
         st.session_state.user = username
+        log_session_event("login", username)
         return True
     else:
+        log_session_event("login_failed", username)
         return False
 
 # Logout function
 def logout():
+    log_session_event("logout", st.session_state.user)
     st.session_state.logged_in = False
     st.session_state.user = None
 
@@ -185,10 +195,38 @@ else:
         logout()
         st.rerun()
 
+    # Opt-in rerun profiling (admins toggle it per session, ROCKY_PROFILE=1 for everyone)
+    from rerun_profiler import rerun_profiler
+    if st.session_state.user in ADMIN_USERS:
+        st.sidebar.checkbox("Profile reruns", key="profile_reruns")
+    profile = rerun_profiler.start(st.session_state.user, st.session_state.get("profile_reruns", False),
+                                   session=st.session_state.session_id)
+    profile.mark("imports")
+
+    # Heavy dependencies are only imported once logged in, so the login form loads fast
+    import pandas as pd
+    import numpy as np
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    from portfolio_index import PortfolioIndex, page_slice, page_count
+    from concentration import portfolio_concentration
+    from portfolio_store import portfolio_cache, read_user_portfolio
+    from pricing import Repricer, load_prices, prices_version
+    from pools_snapshot import shared_pools
+    from pool_matching import PoolIndex, weighted_apy
+    from portfolio_history import SnapshotStore
+    from result_export import FORMATS, export_to_tempfile
+    from yield_risk import ApyHistory, load_histories, pool_exposure, portfolio_risk
+
+    profile.mark("setup")
+
     # Here starts the main application code
     # Función para cargar imágenes desde URL
     @st.cache_data
     def load_image(url):
+        import requests
+        from io import BytesIO
+        from PIL import Image
         try:
             response = requests.get(url)
             img = Image.open(BytesIO(response.content))
@@ -201,56 +239,6 @@ else:
     def create_custom_cmap():
         return mpl.colors.LinearSegmentedColormap.from_list("Rocky", [PRIMARY_COLOR, SECONDARY_COLOR])
 
-    # Load portfolio data
-    @st.cache_data
-    def load_portfolio_data():
-        portfolio_data = [
-            {
-                "id": 1,
-                "wallet": "Wallet #1",
-                "chain": "base",
-                "protocol": "Uniswap V3",
-                "token": "ODOS",
-                "usd": 21.91
-            },
-            {
-                "id": 2,
-                "wallet": "Wallet #1",
-                "chain": "mantle",
-                "protocol": "Pendle V2",
-                "token": "ETH/cmETH",
-                "usd": 554.81
-            },
-            {
-                "id": 3,
-                "wallet": "Wallet #2",
-                "chain": "base",
-                "protocol": "aave",
-                "token": "USDT",
-                "usd": 2191
-            },
-            {
-                "id": 4,
-                "wallet": "Wallet #3",
-                "chain": "solana",
-                "protocol": "meteora",
-                "token": "JLP/SOL",
-                "usd": 551
-            },
-            {
-                "id": 5,
-                "wallet": "Wallet #1",
-                "chain": "ethereum",
-                "protocol": "Aave V3",
-                "token": "ETH",
-                "usd": 3.50
-            },
-        ]
-        return pd.DataFrame(portfolio_data)
-
-    # Load data
-    df = load_portfolio_data()
-
     # Classify tokens
     def classify_token(token):
         stablecoins = ['USDT', 'USDC', 'DAI', 'BUSD']
@@ -266,7 +254,85 @@ else:
 
         return 'Altcoin'
 
-    df['category'] = df['token'].apply(classify_token)
+    # Load the portfolio partition of a user
+    def load_portfolio_data(user):
+        df = read_user_portfolio(user)
+        df['category'] = df['token'].apply(classify_token)
+        return df
+
+    # Price snapshot for revaluation (None when no price source is configured)
+    @st.cache_data(ttl=60)
+    def load_price_snapshot():
+        prices = load_prices()
+        return prices, (prices_version(prices) if prices is not None else None)
+
+    prices, price_version = load_price_snapshot()
+
+    # Snapshot history, shared by every session of the process
+    @st.cache_resource
+    def get_history_store():
+        return SnapshotStore()
+
+    # Appends the portfolio to the snapshot history (returns the snapshot id)
+    def record_snapshot(data):
+        try:
+            return get_history_store().append(st.session_state.user, data)
+        except Exception as e:
+            st.warning(f"Could not record portfolio snapshot: {e}")
+            return None
+
+    # One cache entry per user: the positions as loaded, with the repricer and the
+    # repriced positions as aggregates (a new price snapshot replaces the previous revaluation)
+    portfolio_key = st.session_state.user
+    portfolio_loader = load_portfolio_data
+
+    def load_priced_portfolio():
+        repricer = portfolio_cache.aggregate(portfolio_key, 'repricer', Repricer, portfolio_loader)
+        return portfolio_cache.aggregate(portfolio_key, 'priced', lambda d: repricer.revalue(prices), portfolio_loader,
+                                         version=price_version)
+
+    # Per-user aggregate of the (repriced) portfolio, cached alongside it in the shared cache
+    # (a new version or price snapshot replaces the cached result instead of adding another one;
+    # priced=False for results that do not depend on position values)
+    def user_aggregate(name, func, version=None, priced=True):
+        return portfolio_cache.aggregate(portfolio_key, name, lambda d: func(df), portfolio_loader,
+                                         version=(price_version if priced else None, version))
+
+    def usd_by(column):
+        return user_aggregate(f'usd_by_{column}', lambda d: d.groupby(column)['usd'].sum().sort_values(ascending=False))
+
+    profile.mark("data_load")
+
+    # Load data (shared by every session of the same user)
+    if price_version is None:
+        df = portfolio_cache.get(portfolio_key, portfolio_loader)
+    else:
+        df = load_priced_portfolio()
+
+    # Recorded once per user, day and price snapshot, also while the portfolio stays cached
+    user_aggregate('history_snapshot', record_snapshot, version=pd.Timestamp.today().date())
+
+    profile.mark("pool_matching")
+
+    # Pools snapshot and its match index, refreshed every 5 minutes
+    @st.cache_resource(ttl=300)
+    def get_pool_index():
+        try:
+            return PoolIndex(shared_pools.get(), version=shared_pools.version)
+        except Exception as e:
+            st.warning(f"Could not load DeFiLlama pools: {e}")
+            return None
+
+    # Match every position to its most likely pool (current APY and projected yield)
+    pool_index = get_pool_index()
+    if pool_index is not None:
+        pool_matches = user_aggregate('pools', pool_index.match, version=pool_index.version)
+    else:
+        pool_matches = pd.DataFrame(
+            np.nan, index=df.index, columns=['pool', 'pool_project', 'apy', 'apyMean30d', 'projected_yield']
+        )
+
+    profile.mark("layout")
 
     # Configure plot style for all visualizations
     plt.style.use('dark_background')
@@ -289,14 +355,14 @@ else:
         st.session_state.conversation_logs = []
 
     # Create tabs for navigation
-    tabs = st.tabs(["Positions", "Wallet", "Blockchain", "Categories", "Summary"])
+    tabs = st.tabs(["Positions", "Wallet", "Blockchain", "Categories", "Summary", "Risk", "History"])
 
     # POSITIONS TAB
     with tabs[0]:
+        profile.mark("positions.filters")
         st.subheader("All Positions")
 
-        # Enrich DataFrame with data to display
-        df_display = df.copy()
+        index = user_aggregate('positions_index', PortfolioIndex)
 
         # Create filters
         st.write("#### Filters")
@@ -304,40 +370,23 @@ else:
 
         with col1:
             # Wallet filter
-            wallet_options = ['All'] + sorted(df_display['wallet'].unique().tolist())
-            wallet_filter = st.selectbox('Wallet', wallet_options)
+            wallet_filter = st.selectbox('Wallet', ['All'] + index.options['wallet'])
 
         with col2:
             # Blockchain filter
-            chain_options = ['All'] + sorted(df_display['chain'].unique().tolist())
-            chain_filter = st.selectbox('Blockchain', chain_options)
+            chain_filter = st.selectbox('Blockchain', ['All'] + index.options['chain'])
 
         with col3:
             # Category filter
-            category_options = ['All'] + sorted(df_display['category'].unique().tolist())
-            category_filter = st.selectbox('Category', category_options)
+            category_filter = st.selectbox('Category', ['All'] + index.options['category'])
 
         with col4:
             # Protocol filter
-            protocol_options = ['All'] + sorted(df_display['protocol'].unique().tolist())
-            protocol_filter = st.selectbox('Protocol', protocol_options)
-
-        # Apply filters
-        if wallet_filter != 'All':
-            df_display = df_display[df_display['wallet'] == wallet_filter]
-
-        if chain_filter != 'All':
-            df_display = df_display[df_display['chain'] == chain_filter]
-
-        if category_filter != 'All':
-            df_display = df_display[df_display['category'] == category_filter]
-
-        if protocol_filter != 'All':
-            df_display = df_display[df_display['protocol'] == protocol_filter]
+            protocol_filter = st.selectbox('Protocol', ['All'] + index.options['protocol'])
 
         # Range to filter by USD value (minimum and maximum)
-        min_usd = float(df['usd'].min())
-        max_usd = float(df['usd'].max())
+        min_usd = index.min_usd
+        max_usd = index.max_usd
 
         usd_range = st.slider(
             "Value Range (USD)",
@@ -347,24 +396,50 @@ else:
             step=1.0
         )
 
-        # Apply USD range filter
-        df_display = df_display[(df_display['usd'] >= usd_range[0]) & (df_display['usd'] <= usd_range[1])]
+        # Apply filters through the index (memoized by filter tuple)
+        view = index.filter(
+            {
+                'wallet': wallet_filter,
+                'chain': chain_filter,
+                'category': category_filter,
+                'protocol': protocol_filter,
+            },
+            usd_range
+        )
+
+        # Server-side pagination: only the visible page is sent to the browser
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page_size = st.selectbox('Rows per page', PAGE_SIZES, index=1)
+        total_pages = page_count(view, page_size)
+        with col2:
+            page = st.number_input('Page', min_value=1, max_value=total_pages, value=1, step=1)
 
         # Show number of results
-        st.write(f"Showing {len(df_display)} of {len(df)} positions")
+        st.write(f"Showing {len(view)} of {len(df)} positions (page {page} of {total_pages})")
+
+        df_display = page_slice(df, view, page, page_size).copy()
 
-        # Calculate percentages AFTER all filters, based on the filtered table
-        if not df_display.empty:
-            filtered_total = df_display['usd'].sum()
-            df_display['% of Total'] = (df_display['usd'] / filtered_total * 100).round(2)
+        profile.mark("positions.page")
+
+        # Percentages are based on the whole filtered selection, not just this page
+        if view.total_usd > 0:
+            df_display['% of Total'] = (df_display['usd'] / view.total_usd * 100).round(2)
         else:
             df_display['% of Total'] = 0  # Handle empty case
 
+        # Current yield of the matched DeFiLlama pools
+        df_display = df_display.join(pool_matches[['apy', 'apyMean30d', 'projected_yield']])
+
         # Reorganize columns for better display
-        df_display = df_display[['wallet', 'chain', 'protocol', 'token', 'category', 'usd', '% of Total']]
+        df_display = df_display[['wallet', 'chain', 'protocol', 'token', 'category', 'usd', '% of Total',
+                                 'apy', 'apyMean30d', 'projected_yield']]
 
         # Rename columns for better presentation
-        df_display.columns = ['Wallet', 'Blockchain', 'Protocol', 'Token', 'Category', 'USD', '% of Selection']
+        df_display.columns = ['Wallet', 'Blockchain', 'Protocol', 'Token', 'Category', 'USD', '% of Selection',
+                              'APY', 'APY 30d', 'Projected Yield']
+
+        profile.mark("positions.dataframe")
 
         # Interactive table with filtering and sorting
         st.dataframe(
@@ -378,37 +453,67 @@ else:
                     min_value=0,
                     max_value=100,
                 ),
+                "APY": st.column_config.NumberColumn(format="%.2f%%"),
+                "APY 30d": st.column_config.NumberColumn(format="%.2f%%"),
+                "Projected Yield": st.column_config.NumberColumn(format="$%.2f"),
             },
             hide_index=True,
             use_container_width=True
         )
 
+        profile.mark("positions.metrics")
+
         # Add useful metrics
-        if len(df_display) > 0:  # Only if there are results after filtering
-            filtered_total = df_display['USD'].sum()
+        if len(view) > 0:  # Only if there are results after filtering
+            filtered_total = view.total_usd
             total_portfolio = df['usd'].sum()
             filtered_percent = (filtered_total / total_portfolio) * 100
 
             st.subheader("Selection Metrics")
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Positions", f"{len(df_display)}")
+                st.metric("Positions", f"{len(view)}")
             with col2:
                 st.metric("Total Value", f"${filtered_total:.2f}")
             with col3:
                 st.metric("% of Portfolio", f"{filtered_percent:.1f}%")
             with col4:
-                if len(df_display) > 0:
-                    st.metric("Average", f"${df_display['USD'].mean():.2f}")
+                st.metric("Average", f"${filtered_total / len(view):.2f}")
+
+            # Export of the whole filtered selection (not just the visible page), written in chunks
+            st.write("#### Export Selection")
+            col1, col2 = st.columns([1, 3])
+            with col1:
+                export_format = st.selectbox('Format', list(FORMATS), format_func=str.upper)
+            with col2:
+                if st.button("Prepare export"):
+                    path, count = export_to_tempfile(
+                        df, export_format, f"portfolio_{st.session_state.session_id}",
+                        rows=view.rows, columns=['wallet', 'chain', 'protocol', 'token', 'category', 'usd']
+                    )
+                    st.session_state.positions_export = (export_format, path, count)
+
+            if st.session_state.get("positions_export", (None,))[0] == export_format:
+                _, path, count = st.session_state.positions_export
+                with open(path, "rb") as f:
+                    st.download_button(
+                        label=f"Download {count} positions",
+                        data=f,
+                        file_name=f"portfolio_{st.session_state.user}{FORMATS[export_format][1]}",
+                        mime=FORMATS[export_format][0]
+                    )
 
     # WALLET TAB
     with tabs[1]:
+        profile.mark("wallet.aggregate")
         st.subheader("Wallet Analysis")
 
         # Aggregate data
-        wallet_data = df.groupby('wallet')['usd'].sum().sort_values(ascending=False)
+        wallet_data = usd_by('wallet')
         total = wallet_data.sum()
 
+        profile.mark("wallet.charts")
+
         # Charts
         col1, col2 = st.columns(2)
 
@@ -430,6 +535,8 @@ else:
             ax.axis('equal')
             st.pyplot(fig)
 
+        profile.mark("wallet.table")
+
         # Data table
         data_df = pd.DataFrame({
             "Wallet": wallet_data.index,
@@ -438,6 +545,8 @@ else:
         })
         st.dataframe(data_df, hide_index=True)
 
+        profile.mark("wallet.summary")
+
         # Prepare information for the summary
         top_item = wallet_data.idxmax()
         top_value = wallet_data.max()
@@ -459,12 +568,15 @@ else:
 
     # BLOCKCHAIN TAB
     with tabs[2]:
+        profile.mark("chain.aggregate")
         st.subheader("Blockchain Analysis")
 
         # Aggregate data
-        chain_data = df.groupby('chain')['usd'].sum().sort_values(ascending=False)
+        chain_data = usd_by('chain')
         total = chain_data.sum()
 
+        profile.mark("chain.charts")
+
         # Charts
         col1, col2 = st.columns(2)
 
@@ -486,6 +598,8 @@ else:
             ax.axis('equal')
             st.pyplot(fig)
 
+        profile.mark("chain.table")
+
         # Data table
         data_df = pd.DataFrame({
             "Blockchain": chain_data.index,
@@ -494,6 +608,8 @@ else:
         })
         st.dataframe(data_df, hide_index=True)
 
+        profile.mark("chain.summary")
+
         # Prepare information for the summary
         top_item = chain_data.idxmax()
         top_value = chain_data.max()
@@ -515,12 +631,15 @@ else:
 
     # CATEGORIES TAB
     with tabs[3]:
+        profile.mark("category.aggregate")
         st.subheader("Categories Analysis")
 
         # Aggregate data
-        cat_data = df.groupby('category')['usd'].sum().sort_values(ascending=False)
+        cat_data = usd_by('category')
         total = cat_data.sum()
 
+        profile.mark("category.charts")
+
         # Charts
         col1, col2 = st.columns(2)
 
@@ -542,6 +661,8 @@ else:
             ax.axis('equal')
             st.pyplot(fig)
 
+        profile.mark("category.table")
+
         # Data table
         data_df = pd.DataFrame({
             "Category": cat_data.index,
@@ -550,6 +671,8 @@ else:
         })
         st.dataframe(data_df, hide_index=True)
 
+        profile.mark("category.summary")
+
         # Prepare information for the summary
         top_item = cat_data.idxmax()
         top_value = cat_data.max()
@@ -574,6 +697,7 @@ else:
 
     # SUMMARY TAB
     with tabs[4]:
+        profile.mark("summary.metrics")
         st.subheader("Portfolio Summary")
 
         # First row: general metrics
@@ -581,18 +705,22 @@ else:
         avg_value = df['usd'].mean()
         unique_chains = df['chain'].nunique()
 
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         col1.metric("Total Value", f"${total_value:.2f}")
         col2.metric("Average per Position", f"${avg_value:.2f}")
         col3.metric("Blockchains", f"{unique_chains}")
+        portfolio_apy = weighted_apy(df, pool_matches)
+        col4.metric("Weighted APY", f"{portfolio_apy:.2f}%" if portfolio_apy is not None else "N/A")
+        if portfolio_apy is not None:
+            st.caption(f"Projected annual yield: ${pool_matches['projected_yield'].sum():.2f}")
 
         # Main distribution metrics
         st.subheader("Key Metrics")
 
         # Prepare data
-        wallet_data = df.groupby('wallet')['usd'].sum().sort_values(ascending=False)
-        chain_data = df.groupby('chain')['usd'].sum().sort_values(ascending=False)
-        cat_data = df.groupby('category')['usd'].sum().sort_values(ascending=False)
+        wallet_data = usd_by('wallet')
+        chain_data = usd_by('chain')
+        cat_data = usd_by('category')
 
         # Calculate summaries
         top_wallet = wallet_data.idxmax()
@@ -625,6 +753,20 @@ else:
             st.metric("Amount", f"${top_category_value:.2f}")
             st.metric("Percentage", f"{top_category_percent}%")
 
+        # Change from the previous price snapshot
+        if price_version is not None:
+            repricer = portfolio_cache.aggregate(portfolio_key, 'repricer', Repricer, portfolio_loader)
+            if repricer.last_delta is not None:
+                st.subheader("Revaluation")
+                st.write("USD change from the previous price snapshot")
+                col1, col2, col3 = st.columns(3)
+                for col, (dimension, delta) in zip([col1, col2, col3], repricer.last_delta.items()):
+                    with col:
+                        st.dataframe(
+                            pd.DataFrame({dimension.capitalize(): delta.index, "Δ USD": delta.values.round(2)}),
+                            hide_index=True
+                        )
+
         # Position Ranking
         st.subheader("Top Positions")
         positions_df = df.copy()
@@ -636,6 +778,8 @@ else:
         if len(top_positions) > 5:
             top_positions = top_positions.head(5)
 
+        profile.mark("summary.chart")
+
         # Position chart (horizontal bars)
         fig, ax = plt.subplots(figsize=(10, max(4, len(top_positions) * 0.4)))
         positions_plot = top_positions.set_index('position_name')['usd']
@@ -648,28 +792,27 @@ else:
         ax.set_ylabel("Position")
         st.pyplot(fig)
 
+        profile.mark("summary.strategy")
+
         # Portfolio strategy summary
         st.subheader("Strategy Assessment")
 
-        # Calculate diversification metrics
-        wallet_hhi = ((wallet_data / total_value) ** 2).sum() * 100
-        chain_hhi = ((chain_data / total_value) ** 2).sum() * 100
-        category_hhi = ((cat_data / total_value) ** 2).sum() * 100
+        # Diversification metrics from the shared concentration module
+        metrics = user_aggregate('concentration', portfolio_concentration)
+        wallet_hhi = metrics['wallet_hhi']
+        chain_hhi = metrics['chain_hhi']
+        category_hhi = metrics['category_hhi']
 
         # Coefficient of variation (higher means more spread out values)
-        coef_var = (df['usd'].std() / df['usd'].mean() * 100)
-
-        # Wallet concentration level
-        wallet_concentration = "High" if wallet_hhi > 50 else "Medium" if wallet_hhi > 25 else "Low"
-
-        # Blockchain concentration level
-        chain_concentration = "High" if chain_hhi > 50 else "Medium" if chain_hhi > 25 else "Low"
+        coef_var = metrics['coef_var']
 
-        # Category concentration level
-        category_concentration = "High" if category_hhi > 50 else "Medium" if category_hhi > 25 else "Low"
+        # Concentration levels
+        wallet_concentration = metrics['wallet_level']
+        chain_concentration = metrics['chain_level']
+        category_concentration = metrics['category_level']
 
         # Position size variation
-        pos_variation = "High" if coef_var > 100 else "Medium" if coef_var > 50 else "Low"
+        pos_variation = metrics['variation_level']
 
         # Strategy assessment
         st.markdown(f"""
@@ -688,3 +831,187 @@ else:
         - **Main blockchain exposure:** {', '.join([f"**{chain}**: **{(value/total_value*100).round(1)}%**" for chain, value in chain_data.items()][:3])}
         - **Main category exposure:** {', '.join([f"**{cat}**: **{(value/total_value*100).round(1)}%**" for cat, value in cat_data.items()])}
         """)
+
+    # RISK TAB
+    with tabs[5]:
+        profile.mark("risk.histories")
+        st.subheader("Yield Risk")
+
+        matched_pools = sorted(pool_matches['pool'].dropna().unique())
+        if not matched_pools:
+            st.write("No positions are matched to a DeFiLlama pool.")
+        elif not st.session_state.get('risk_loaded') and not st.button("Load APY histories"):
+            st.write(f"Expected yield, APY volatility and correlation from the APY history "
+                     f"of the {len(matched_pools)} pools matched to your positions.")
+        else:
+            st.session_state.risk_loaded = True
+
+            # Daily histories change once a day: one matrix per user, replaced on a new day or set of matched pools
+            history_version = (pd.Timestamp.today().date(), hash(tuple(matched_pools)))
+            with st.spinner("Loading APY histories..."):
+                history = user_aggregate('apy_history', lambda d: ApyHistory(load_histories(matched_pools)),
+                                         version=history_version, priced=False)
+
+            windows = {"90 days": 90, "1 year": 365, "All history": None}
+            window = windows[st.selectbox("History window", list(windows.keys()), index=1)]
+
+            profile.mark("risk.metrics")
+            risk = portfolio_risk(history, pool_exposure(df, pool_matches), window)
+
+            if risk is None:
+                st.write("Not enough APY history for the matched pools.")
+            else:
+                figures = risk['figures']
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Expected APY", f"{figures['expected_apy']:.2f}%")
+                col2.metric("Expected Yield", f"${figures['expected_yield']:.2f}")
+                col3.metric("APY Volatility", f"{figures['portfolio_volatility']:.2f} pp")
+                col4.metric("Avg. Correlation",
+                            f"{figures['avg_correlation']:.2f}" if figures['avg_correlation'] is not None else "N/A")
+                st.caption(f"{figures['pools']} pools over {figures['days']} days, "
+                           f"covering {figures['coverage']:.1f}% of the matched USD")
+
+                # Diversification, next to the concentration metrics of the Summary tab
+                metrics = user_aggregate('concentration', portfolio_concentration)
+                diversification = figures['diversification_ratio']
+                st.markdown(f"""
+                #### Diversification
+                - **Pool concentration:** {figures['pool_level']} ({figures['pool_hhi']:.1f}/100)
+                - **Protocol concentration:** {metrics['protocol_level']} ({metrics['protocol_hhi']:.1f}/100)
+                - **Blockchain concentration:** {metrics['chain_level']} ({metrics['chain_hhi']:.1f}/100)
+                - **Diversification ratio:** {f"{diversification:.2f}" if diversification is not None else "N/A"} (1 = no benefit from diversification)
+                """)
+
+                profile.mark("risk.table")
+
+                # One row per pool, labelled by its first position
+                labels = (df['token'] + ' (' + df['protocol'] + ')').groupby(pool_matches['pool']).first()
+                pools_table = risk['pools'].sort_values('usd', ascending=False)
+                pools_table.insert(0, 'Position', labels.reindex(pools_table.index).to_numpy())
+                pools_table.columns = ['Position', 'USD', 'Weight', 'Mean APY', 'Current APY', 'Volatility', 'Days']
+                st.dataframe(
+                    pools_table,
+                    column_config={
+                        "USD": st.column_config.NumberColumn(format="$%.2f"),
+                        "Weight": st.column_config.NumberColumn(format="%.1f%%"),
+                        "Mean APY": st.column_config.NumberColumn(format="%.2f%%"),
+                        "Current APY": st.column_config.NumberColumn(format="%.2f%%"),
+                        "Volatility": st.column_config.NumberColumn(format="%.2f pp"),
+                    },
+                    hide_index=True,
+                    use_container_width=True
+                )
+
+                profile.mark("risk.chart")
+
+                # Correlation between the largest pools
+                top = pools_table.index[:15]
+                correlation = risk['correlation'].loc[top, top]
+                fig, ax = plt.subplots(figsize=(10, 8))
+                image = ax.imshow(correlation.to_numpy(), cmap=custom_cmap, vmin=-1, vmax=1)
+                ticks = np.arange(len(top))
+                ax.set_xticks(ticks)
+                ax.set_xticklabels(pools_table['Position'].iloc[:15], rotation=90)
+                ax.set_yticks(ticks)
+                ax.set_yticklabels(pools_table['Position'].iloc[:15])
+                fig.colorbar(image, ax=ax)
+                style_plot(ax)
+                ax.set_title("APY Correlation (largest pools)")
+                st.pyplot(fig)
+
+    # HISTORY TAB
+    with tabs[6]:
+        profile.mark("history.rollups")
+        st.subheader("Portfolio History")
+
+        history = get_history_store()
+        available = history.date_range(st.session_state.user)
+
+        if available is None:
+            st.write("No snapshots recorded yet.")
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                date_range = st.date_input(
+                    "Date range",
+                    value=available,
+                    min_value=available[0],
+                    max_value=available[1]
+                )
+            with col2:
+                dimension_labels = {
+                    "Total": "total",
+                    "Wallet": "wallet",
+                    "Blockchain": "chain",
+                    "Category": "category",
+                    "Protocol": "protocol"
+                }
+                dimension = dimension_labels[st.selectbox("Dimension", list(dimension_labels.keys()))]
+
+            # The date input returns a single date while the range is being picked
+            if len(date_range) == 2:
+                rollups = history.rollups(st.session_state.user, dimension, date_range[0], date_range[1])
+                daily_values = rollups.pivot(index='day', columns='item', values='last_usd')
+
+                fig, ax = plt.subplots(figsize=(10, 5))
+                colors = plt.cm.get_cmap(custom_cmap)(np.linspace(0, 1, max(1, len(daily_values.columns))))
+                daily_values.plot(ax=ax, color=colors, marker='o')
+                style_plot(ax)
+                ax.set_title("End-of-day value (USD)")
+                ax.set_xlabel("Day")
+                ax.set_ylabel("USD")
+                st.pyplot(fig)
+
+                # Daily rollup table
+                table = rollups.rename(columns={
+                    'day': 'Day', 'item': 'Item', 'last_usd': 'Close', 'min_usd': 'Min',
+                    'max_usd': 'Max', 'mean_usd': 'Mean', 'samples': 'Snapshots'
+                })
+                table['Day'] = table['Day'].dt.date
+                st.dataframe(table, hide_index=True, use_container_width=True)
+
+    # Close the rerun profile before rendering the admin panel
+    rerun_profiler.record(profile)
+
+    # ADMIN: rerun profiler panel
+    if st.session_state.user in ADMIN_USERS:
+        with st.sidebar.expander("Rerun profiler"):
+            last = rerun_profiler.last(st.session_state.user)
+            if last is None:
+                st.write("Enable 'Profile reruns' and interact with the dashboard.")
+            else:
+                # Waterfall of the last profiled rerun
+                sections = pd.DataFrame(last.sections)
+                fig, ax = plt.subplots(figsize=(6, max(3, len(sections) * 0.3)))
+                ax.barh(sections['section'], sections['duration_ms'], left=sections['start_ms'], color=PRIMARY_COLOR)
+                style_plot(ax)
+                ax.invert_yaxis()
+                ax.set_title(f"Last rerun: {last.total_ms:.0f} ms")
+                ax.set_xlabel("ms")
+                st.pyplot(fig)
+                if not last.allocations_available:
+                    st.caption("Allocation figures unavailable for sections that overlapped other profiled reruns "
+                               "(allocation tracing is process-wide).")
+                st.dataframe(sections.round(2), hide_index=True)
+
+                # Rolling histogram of rerun times across all sessions
+                totals = rerun_profiler.totals()
+                fig, ax = plt.subplots(figsize=(6, 3))
+                ax.hist(totals, bins=min(30, max(5, len(totals) // 5)), color=PRIMARY_COLOR)
+                style_plot(ax)
+                ax.set_title(f"Rerun time, last {len(totals)} reruns")
+                ax.set_xlabel("ms")
+                st.pyplot(fig)
+                st.dataframe(rerun_profiler.section_stats(), hide_index=True)
+
+        # DeFiLlama traffic of this process: bytes received vs saved by compression and 304s
+        with st.sidebar.expander("Upstream traffic"):
+            from defillama import flights, transfer
+            traffic = transfer.stats()
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Transferred", f"{traffic['bytes_transferred'] / 2**20:.1f} MB")
+            with col2:
+                st.metric("Saved", f"{traffic['bytes_saved'] / 2**20:.1f} MB")
+            st.write(f"{traffic['requests']} requests, {traffic['not_modified']} not modified")
+            st.json({"snapshot": shared_pools.stats(), "fetches": flights.stats()})
@@ -0,0 +1,263 @@
+"""Synthetic-scale benchmark of the portfolio dashboard stages.
+
+Generates synthetic portfolios (configurable wallets, chains, protocols and
+tokens) and times, headlessly, each stage a dashboard rerun goes through:
+loading the user's partition, classify_token, the Positions tab filter index
+and filters, the per-tab groupbys and HHI, the concentration metrics and the
+matplotlib charts (rendered to PNG with the Agg backend, as st.pyplot does).
+
+classify_token is taken from app.py itself, so the benchmark times the code
+the dashboard runs. Results are written as a JSON report; passing a previous
+report as --baseline compares every stage against it and exits with status 1
+when one got slower than the allowed ratio, so it can gate CI:
+
+    python benchmarks/dashboard_scale.py --output dashboard_baseline.json
+    python benchmarks/dashboard_scale.py --baseline dashboard_baseline.json
+    python benchmarks/dashboard_scale.py --sizes 1000,100000 --wallets 200 --repeats 5
+"""
+import argparse
+import ast
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import matplotlib  # noqa: E402
+
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt  # noqa: E402
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+from concentration import portfolio_concentration  # noqa: E402
+from portfolio_index import PortfolioIndex, page_count, page_slice  # noqa: E402
+from portfolio_store import read_user_portfolio  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+
+# A stage fails the comparison when it is this many times slower than the baseline...
+DEFAULT_MAX_RATIO = 1.5
+# ...and the difference is above this floor (sub-millisecond stages are mostly noise)
+DEFAULT_MIN_DELTA_MS = 5.0
+
+CHAINS = ["ethereum", "arbitrum", "base", "solana", "polygon", "bsc", "optimism", "avalanche",
+          "mantle", "fantom", "linea", "scroll", "blast", "zksync", "sonic", "sui", "aptos", "ton"]
+TOKENS = ["USDC", "USDT", "DAI", "BUSD", "ETH", "WETH", "BTC", "WBTC", "SOL", "JLP/SOL", "ETH/cmETH",
+          "USDC/ETH", "ODOS", "ARB", "OP", "PENDLE", "AAVE", "UNI", "LINK", "JUP"]
+PROTOCOLS = ["Aave V3", "Uniswap V3", "Pendle V2", "meteora", "Curve", "Lido", "Compound V3",
+             "Morpho", "Aerodrome", "Kamino", "Raydium", "GMX", "Euler", "Balancer"]
+
+
+def classify_token_from_app():
+    """classify_token as defined in app.py"""
+    with open(os.path.join(ROOT, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.FunctionDef) and node.name == "classify_token":
+            namespace = {}
+            exec(compile(ast.Module(body=[node], type_ignores=[]), "app.py", "exec"), namespace)
+            return namespace["classify_token"]
+    raise RuntimeError("classify_token not found in app.py")
+
+
+def _names(base, prefix, count):
+    """count names: the real ones first, then synthetic ones"""
+    return (base + [f"{prefix}{i}" for i in range(count - len(base))])[:count]
+
+
+def synthetic_portfolio(n, wallets=50, chains=12, protocols=100, tokens=1000, seed=0):
+    """Portfolio with the columns of a user partition and skewed (Zipf-like) value counts"""
+    rng = np.random.default_rng(seed)
+
+    def pick(values):
+        weights = 1 / np.arange(1, len(values) + 1)
+        return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=weights / weights.sum())]
+
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "wallet": pick([f"Wallet #{i + 1}" for i in range(wallets)]),
+        "chain": pick(_names(CHAINS, "chain-", chains)),
+        "protocol": pick(_names(PROTOCOLS, "Protocol ", protocols)),
+        "token": pick(_names(TOKENS, "TKN", tokens)),
+        "usd": rng.lognormal(mean=6, sigma=2, size=n).round(2),
+    })
+
+
+def _render(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    plt.close(fig)
+    return buffer.tell()
+
+
+def tab_charts(data):
+    """Bar and pie chart of one distribution tab"""
+    fig, ax = plt.subplots(figsize=(8, 5))
+    data.plot(kind='bar', ax=ax)
+    _render(fig)
+    fig, ax = plt.subplots(figsize=(8, 5))
+    data.plot(kind='pie', autopct='%1.1f%%', ax=ax)
+    ax.axis('equal')
+    _render(fig)
+
+
+def run_stages(path, user, classify_token):
+    """Milliseconds of each dashboard stage for one portfolio partition"""
+    timings = {}
+    clock = time.perf_counter
+
+    start = clock()
+    df = read_user_portfolio(user, path)
+    timings["load"] = clock() - start
+
+    start = clock()
+    df['category'] = df['token'].apply(classify_token)
+    timings["classify_token"] = clock() - start
+
+    start = clock()
+    index = PortfolioIndex(df)
+    timings["filter_index"] = clock() - start
+
+    # Selections a user goes through in the Positions tab (fresh index: no memoized views)
+    start = clock()
+    selections = [
+        {},
+        {'wallet': index.options['wallet'][0]},
+        {'chain': index.options['chain'][0], 'category': 'Stablecoin'},
+        {'protocol': index.options['protocol'][-1]},
+    ]
+    for selection in selections:
+        view = index.filter(selection, (index.min_usd, index.max_usd / 2))
+        page_slice(df, view, page_count(view, 50), 50)
+    timings["filtering"] = clock() - start
+
+    # Wallet, Blockchain and Categories tabs: groupby + HHI
+    aggregates = {}
+    for column in ['wallet', 'chain', 'category']:
+        start = clock()
+        data = df.groupby(column)['usd'].sum().sort_values(ascending=False)
+        total = data.sum()
+        ((data / total) ** 2).sum() * 100
+        timings[f"groupby_hhi.{column}"] = clock() - start
+        aggregates[column] = data
+
+    start = clock()
+    portfolio_concentration(df)
+    timings["concentration"] = clock() - start
+
+    # Summary tab: top positions
+    start = clock()
+    positions_df = df.copy()
+    positions_df['position_name'] = positions_df['token'] + ' (' + positions_df['protocol'] + ')'
+    top_positions = positions_df.sort_values('usd', ascending=False).head(5)
+    timings["summary.top_positions"] = clock() - start
+
+    start = clock()
+    for data in aggregates.values():
+        tab_charts(data)
+    fig, ax = plt.subplots(figsize=(10, 4))
+    top_positions.set_index('position_name')['usd'].plot(kind='barh', ax=ax)
+    _render(fig)
+    timings["charts"] = clock() - start
+
+    return {stage: seconds * 1000 for stage, seconds in timings.items()}
+
+
+def benchmark(sizes, repeats, wallets, chains, protocols, tokens, seed):
+    classify_token = classify_token_from_app()
+    # Fonts and the Agg canvas are set up on the first figure; keep that out of the timings
+    tab_charts(pd.Series([1.0, 2.0], index=["a", "b"]))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            user = f"bench{n}"
+            portfolio = synthetic_portfolio(n, wallets, chains, protocols, tokens, seed)
+            portfolio.to_parquet(os.path.join(directory, f"{user}.parquet"), index=False)
+            runs = [run_stages(directory, user, classify_token) for _ in range(repeats)]
+            stages = {stage: round(statistics.median(run[stage] for run in runs), 3) for stage in runs[0]}
+            stages["total"] = round(sum(stages.values()), 3)
+            results[str(n)] = stages
+            print(f"{n:>9} positions: {stages['total']:.1f} ms", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, max_ratio, min_delta_ms):
+    """Stages slower than the baseline by more than max_ratio (and min_delta_ms)"""
+    regressions = []
+    for size, stages in results.items():
+        for stage, ms in stages.items():
+            reference = baseline.get("results", {}).get(size, {}).get(stage)
+            if reference is None:
+                continue
+            if ms > reference * max_ratio and ms - reference > min_delta_ms:
+                regressions.append({"size": int(size), "stage": stage, "baseline_ms": reference,
+                                    "ms": ms, "ratio": round(ms / reference, 2)})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="Comma-separated portfolio sizes (positions)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per size (the median is reported)")
+    parser.add_argument("--wallets", type=int, default=50)
+    parser.add_argument("--chains", type=int, default=12)
+    parser.add_argument("--protocols", type=int, default=100)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    parser.add_argument("--baseline", help="Previous report to compare against")
+    parser.add_argument("--max-ratio", type=float, default=DEFAULT_MAX_RATIO,
+                        help="Allowed slowdown against the baseline per stage")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS,
+                        help="Slowdowns below this many ms are never regressions")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = benchmark(sizes, args.repeats, args.wallets, args.chains, args.protocols, args.tokens, args.seed)
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "config": {"wallets": args.wallets, "chains": args.chains, "protocols": args.protocols,
+                   "tokens": args.tokens, "repeats": args.repeats, "seed": args.seed},
+        "results": results,
+    }
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_ratio, args.min_delta_ms)
+        report["thresholds"] = {"baseline": args.baseline, "max_ratio": args.max_ratio,
+                                "min_delta_ms": args.min_delta_ms}
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for regression in regressions:
+        print(f"REGRESSION {regression['stage']} at {regression['size']} positions: "
+              f"{regression['ms']:.1f} ms vs {regression['baseline_ms']:.1f} ms (x{regression['ratio']})",
+              file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
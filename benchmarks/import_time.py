@@ -0,0 +1,126 @@
+"""Cold-start import benchmark for the Streamlit pages.
+
+Collects the module-level imports of each page (the ones that run before the
+first widget is drawn), imports them in a fresh interpreter with
+``python -X importtime`` and reports the cumulative time per top-level
+package. Exits with status 1 when a page goes over its budget or eagerly
+imports one of the libraries that must stay lazy, so it can gate CI:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget-ms app.py=800 --runs 7
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Page -> budget in ms for its module-level imports
+BUDGETS_MS = {
+    "app.py": 1000,
+    "pages/1_AI_Agent.py": 1500,
+}
+
+# Libraries that must only be imported on the code path that needs them
+LAZY_MODULES = {
+    "app.py": ["matplotlib", "seaborn", "PIL", "pandas", "plotly"],
+    "pages/1_AI_Agent.py": ["matplotlib", "seaborn", "plotly"],
+}
+
+
+def module_level_imports(path):
+    """Source of the import statements at the top level of a script"""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def measure(code):
+    """Runs code under -X importtime.
+
+    Returns the cumulative us of every top-level import and the set of all
+    modules that got loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, capture_output=True, text=True, env={**os.environ, "PYTHONPATH": ROOT}
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    top_level = {}
+    loaded = set()
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if not line.startswith("import time:") or len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        loaded.add(name.split(".")[0])
+        # Nested imports are indented below the module that triggered them
+        if len(parts[2]) - len(parts[2].lstrip()) == 1:
+            top_level[name] = int(parts[1])
+    return top_level, loaded
+
+
+def benchmark(page, runs, baseline):
+    """Import timings of a page; baseline is the set of modules Streamlit itself loads"""
+    code = module_level_imports(os.path.join(ROOT, page))
+    totals = []
+    for _ in range(runs):
+        modules, loaded = measure(code)
+        totals.append(sum(modules.values()) / 1000)
+    top = sorted(((us / 1000, name) for name, us in modules.items()), reverse=True)[:8]
+    return {
+        "page": page,
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "top_imports_ms": {name: round(ms, 1) for ms, name in top},
+        "eager_lazy_modules": sorted(m for m in LAZY_MODULES.get(page, []) if m in loaded - baseline),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", action="append", default=[], metavar="PAGE=MS",
+                        help="Override the budget of a page")
+    parser.add_argument("--json", action="store_true", help="Print a machine-readable report")
+    args = parser.parse_args()
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget_ms:
+        page, ms = item.split("=")
+        budgets[page] = float(ms)
+
+    # Libraries pulled in by Streamlit itself can't be deferred by the pages
+    _, baseline = measure("import streamlit")
+
+    reports = []
+    failed = False
+    for page, budget in budgets.items():
+        report = benchmark(page, args.runs, baseline)
+        report["budget_ms"] = budget
+        report["ok"] = report["median_ms"] <= budget and not report["eager_lazy_modules"]
+        failed = failed or not report["ok"]
+        reports.append(report)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            status = "OK" if report["ok"] else "FAIL"
+            print(f"[{status}] {report['page']}: {report['median_ms']} ms (budget {report['budget_ms']} ms)")
+            for name, ms in report["top_imports_ms"].items():
+                print(f"    {ms:8.1f} ms  {name}")
+            if report["eager_lazy_modules"]:
+                print(f"    imported eagerly: {', '.join(report['eager_lazy_modules'])}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
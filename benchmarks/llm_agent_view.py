@@ -0,0 +1,96 @@
+"""Benchmark of the LLM pandas agent path with a fake local LLM.
+
+Runs the same questions through LLMPoolsAgent with LangChain's FakeListLLM
+(no API key or network needed) and reports the size of the reduced view
+against the full feed, the agent build + first answer latency and the
+cached answer latency:
+
+    python benchmarks/llm_agent_view.py --snapshot pools.json
+    python benchmarks/llm_agent_view.py --pools 20000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import pandas as pd  # noqa: E402
+
+from defillama import load_pools_snapshot  # noqa: E402
+from llm_agent import LLMPoolsAgent, snapshot_version  # noqa: E402
+
+QUESTIONS = [
+    "What are the best USDC pools on Arbitrum?",
+    "token ETH en base con TVL mínimo 1M",
+    "Top pools en solana con APY mínimo 10",
+    "protocolo aave-v3 en ethereum",
+]
+
+
+def synthetic_pools(n, seed=0):
+    rng = random.Random(seed)
+    chains = ["Ethereum", "Arbitrum", "Base", "Solana", "Polygon", "BSC", "Optimism"]
+    projects = ["aave-v3", "uniswap-v3", "curve-dex", "pendle", "compound-v3", "meteora-dlmm"]
+    symbols = ["USDC", "ETH", "WETH", "WBTC", "USDC-WETH", "DAI", "SOL", "USDT"]
+    return pd.DataFrame({
+        "chain": [rng.choice(chains) for _ in range(n)],
+        "project": [rng.choice(projects) for _ in range(n)],
+        "symbol": [rng.choice(symbols) for _ in range(n)],
+        "tvlUsd": [rng.uniform(1e4, 1e8) for _ in range(n)],
+        "apy": [rng.uniform(0, 30) for _ in range(n)],
+        "apyBase": [rng.uniform(0, 10) for _ in range(n)],
+        "apyReward": [None] * n,
+        "apyMean30d": [rng.uniform(0, 30) for _ in range(n)],
+        "stablecoin": [rng.random() < 0.3 for _ in range(n)],
+        "ilRisk": ["no"] * n,
+        "exposure": ["single"] * n,
+        "pool": [f"pool-{i:06d}" for i in range(n)],
+        "underlyingTokens": [["0xabc"]] * n,
+        "poolMeta": [None] * n,
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshot", help="Pools snapshot (JSON, Parquet or Feather)")
+    parser.add_argument("--pools", type=int, default=20000, help="Synthetic pools when no snapshot is given")
+    parser.add_argument("--repeats", type=int, default=3, help="Times each question is asked")
+    args = parser.parse_args()
+
+    from langchain_core.language_models.fake import FakeListLLM
+
+    pools = load_pools_snapshot(args.snapshot) if args.snapshot else synthetic_pools(args.pools)
+    llm = FakeListLLM(responses=["Final Answer: fake answer"] * (len(QUESTIONS) * args.repeats))
+    agent = LLMPoolsAgent(llm, agent_type="zero-shot-react-description")
+
+    start = time.perf_counter()
+    version = snapshot_version(pools)
+    version_ms = (time.perf_counter() - start) * 1000
+
+    report = {"pools": len(pools.index), "full_bytes": int(pools.memory_usage(deep=True).sum()),
+              "snapshot_version_ms": round(version_ms, 2), "questions": []}
+    for question in QUESTIONS:
+        view = agent.reduce(pools, agent.criteria(question, pools))
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            agent.ask(question, pools, version)
+            timings.append((time.perf_counter() - start) * 1000)
+        report["questions"].append({
+            "question": question,
+            "view_rows": len(view.index),
+            "view_columns": len(view.columns),
+            "view_bytes": int(view.memory_usage(deep=True).sum()),
+            "first_ms": round(timings[0], 2),
+            "cached_ms": round(min(timings[1:]), 3) if len(timings) > 1 else None,
+        })
+    report["cache"] = agent.stats()
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
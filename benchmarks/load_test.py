@@ -0,0 +1,363 @@
+"""Concurrent-session load test of the chat agent against a local DeFiLlama stand-in.
+
+Starts a local HTTP stub of yields.llama.fi (/pools and /chart/{pool}) with
+configurable payload size and latency, points the agent at it through
+ROCKY_YIELDS_API and simulates N concurrent chat sessions. Each session has
+its own CryptoAgent and goes through a conversation mix of searches,
+refinements, details, charts, comparisons and resets, submitting every
+message through query_jobs exactly like the chat page does.
+
+For every N it reports throughput, latency percentiles (overall and per
+message kind), upstream requests served by the stub and the memory held per
+session (objects retained by each agent, and the process RSS growth), plus
+the agent-side fetch counters (requests, real downloads and requests
+coalesced into a download already in flight) and bytes transferred versus
+saved by compression and 304 responses:
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --sessions 1,10,50,100 --pools 20000 --latency-ms 300
+    python benchmarks/load_test.py --max-age 0 --output load.json   # every search refreshes the feed
+    python benchmarks/load_test.py --max-age 0 --plain-http        # same, without compression or 304s
+"""
+import argparse
+import gc
+import gzip
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Conversation mix: (kind, message); a session walks through it starting at a random offset
+CONVERSATION = [
+    ("search", "mejores pools usdc en arbitrum"),
+    ("refine", "con apy minimo 10"),
+    ("details", "más info de la posición 2"),
+    ("chart", "hazme un gráfico comparativo"),
+    ("search", "token eth en base con tvl minimo 1m"),
+    ("comparison", "compara usdc vs usdt en ethereum"),
+    ("refine", "protocolo aave"),
+    ("details", "detalles de la posición 1"),
+    ("reset", "reset"),
+    ("search", "pools de pendle en ethereum"),
+    ("chart", "muestra un gráfico de la evolución del apy"),
+    ("reset", "reiniciar"),
+]
+
+CHAINS = ["Ethereum", "Arbitrum", "Base", "Solana", "Polygon", "BSC", "Optimism", "Avalanche", "Mantle"]
+PROJECTS = ["aave-v3", "aave-v2", "uniswap-v3", "curve-dex", "pendle", "compound-v3", "lido", "meteora-dlmm"]
+SYMBOLS = ["USDC", "USDT", "ETH", "WETH", "WBTC", "DAI", "SOL", "USDC-WETH", "WSTETH", "USDC-USDT"]
+
+
+def pools_payload(n, seed=0):
+    """Body of /pools with n synthetic pools"""
+    rng = random.Random(seed)
+    pools = [{
+        "chain": rng.choice(CHAINS),
+        "project": rng.choice(PROJECTS),
+        "symbol": rng.choice(SYMBOLS),
+        "tvlUsd": rng.uniform(1e4, 1e8),
+        "apy": rng.uniform(0, 30),
+        "apyBase": rng.uniform(0, 10),
+        "apyReward": None,
+        "apyMean30d": rng.uniform(0, 30),
+        "stablecoin": rng.random() < 0.3,
+        "ilRisk": "no",
+        "exposure": "single",
+        "pool": f"pool-{i:07d}",
+        "underlyingTokens": ["0x" + "%040x" % rng.getrandbits(160)],
+        "poolMeta": None,
+    } for i in range(n)]
+    return json.dumps({"status": "success", "data": pools}).encode()
+
+
+def chart_payload(points):
+    now = datetime.utcnow()
+    return json.dumps({"status": "success", "data": [
+        {"timestamp": (now - timedelta(days=d)).isoformat() + "Z", "apy": 5 + (d % 7), "tvlUsd": 1e6 + d}
+        for d in range(points)
+    ]}).encode()
+
+
+class YieldsStub:
+    """yields.llama.fi stand-in running in a background thread.
+
+    Like the real API it compresses responses (gzip, and br when brotli is
+    installed) for clients that accept it and answers conditional requests
+    (If-None-Match / If-Modified-Since) with 304; plain=True turns both off.
+    """
+
+    def __init__(self, pools=5000, chart_points=90, latency_ms=100, jitter_ms=50, plain=False):
+        self.pools_body = pools_payload(pools)
+        self.chart_body = chart_payload(chart_points)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.plain = plain
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self._encoded = {}
+        self.requests = {"pools": 0, "chart": 0}
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/pools"):
+                    kind, body = "pools", stub.pools_body
+                elif "/chart/" in self.path:
+                    kind, body = "chart", stub.chart_body
+                else:
+                    self.send_error(404)
+                    return
+                time.sleep((stub.latency_ms + random.uniform(0, stub.jitter_ms)) / 1000)
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+
+                if not stub.plain and (self.headers.get("If-None-Match") == etag or
+                                       self.headers.get("If-Modified-Since") == stub.last_modified):
+                    with stub._lock:
+                        stub.requests[kind] += 1
+                        stub.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", stub.last_modified)
+                    self.end_headers()
+                    return
+
+                encoding = None if stub.plain else stub.pick_encoding(self.headers.get("Accept-Encoding", ""))
+                payload = stub.encoded(body, encoding)
+                with stub._lock:
+                    stub.requests[kind] += 1
+                    stub.bytes_sent += len(payload)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                if not stub.plain:
+                    self.send_header("ETag", etag)
+                    self.send_header("Last-Modified", stub.last_modified)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def pick_encoding(accept_encoding):
+        accepted = {value.split(";")[0].strip() for value in accept_encoding.split(",")}
+        if "br" in accepted and brotli is not None:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def encoded(self, body, encoding):
+        """Body compressed with the given encoding (computed once per body)"""
+        if encoding is None:
+            return body
+        key = (id(body), encoding)
+        if key not in self._encoded:
+            self._encoded[key] = brotli.compress(body) if encoding == "br" else gzip.compress(body)
+        return self._encoded[key]
+
+    def take_counters(self):
+        with self._lock:
+            counters = dict(self.requests, not_modified=self.not_modified, bytes=self.bytes_sent)
+            self.requests = {"pools": 0, "chart": 0}
+            self.not_modified = 0
+            self.bytes_sent = 0
+        return counters
+
+
+def rss_bytes():
+    """Resident memory of the process (Linux /proc; 0 elsewhere)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+def deep_sizeof(obj, seen=None):
+    """Bytes held by an object graph (DataFrames by their deep memory usage)"""
+    import pandas as pd
+
+    seen = set() if seen is None else seen
+    if id(obj) in seen or isinstance(obj, (type, type(sys), type(deep_sizeof))):
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)) or type(obj).__name__ == "deque":
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    return size
+
+
+def run_session(agent, rng, messages, think_ms, results, submit_query):
+    offset = rng.randrange(len(CONVERSATION))
+    for i in range(messages):
+        kind, message = CONVERSATION[(offset + i) % len(CONVERSATION)]
+        start = time.perf_counter()
+        try:
+            submit_query(agent, message).result()
+            error = False
+        except Exception:
+            error = True
+        results.append((kind, (time.perf_counter() - start) * 1000, error))
+        if think_ms:
+            time.sleep(rng.uniform(0, 2 * think_ms) / 1000)
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+            "max_ms": round(max(values), 1)}
+
+
+def run_level(n, messages, think_ms, seed, stub, flights, transfer, CryptoAgent, submit_query):
+    gc.collect()
+    rss_before = rss_bytes()
+    agents = [CryptoAgent(owner=f"load-{n}-{i}") for i in range(n)]
+    results = []
+    threads = [
+        threading.Thread(target=run_session,
+                         args=(agent, random.Random(seed + i), messages, think_ms, results, submit_query))
+        for i, agent in enumerate(agents)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    gc.collect()
+    rss_after = rss_bytes()
+    retained = [deep_sizeof(agent) for agent in agents]
+    latencies = [ms for _, ms, _ in results]
+    by_kind = {}
+    for kind, ms, _ in results:
+        by_kind.setdefault(kind, []).append(ms)
+
+    level = {
+        "sessions": n,
+        "messages": len(results),
+        "errors": sum(error for _, _, error in results),
+        "wall_s": round(wall, 2),
+        "throughput_msg_s": round(len(results) / wall, 2),
+        "latency": percentiles(latencies),
+        "latency_by_kind": {kind: percentiles(values) for kind, values in sorted(by_kind.items())},
+        "upstream": stub.take_counters(),
+        "fetches": flights.take_stats(),
+        "transfer": transfer.take_stats(),
+        "rss_mb": round(rss_after / 2**20, 1),
+        "rss_per_session_kb": round((rss_after - rss_before) / n / 1024, 1),
+        "retained_per_session_kb": round(sum(retained) / n / 1024, 1),
+    }
+    del agents
+    return level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", default="1,5,10,25,50", help="Comma-separated concurrent session counts")
+    parser.add_argument("--messages", type=int, default=12, help="Messages per session")
+    parser.add_argument("--think-ms", type=float, default=200, help="Mean pause between messages of a session")
+    parser.add_argument("--pools", type=int, default=5000, help="Pools in the stub /pools payload")
+    parser.add_argument("--chart-points", type=int, default=90, help="Days of history in /chart payloads")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Stub response latency")
+    parser.add_argument("--jitter-ms", type=float, default=50, help="Random extra stub latency")
+    parser.add_argument("--max-age", type=float, default=300,
+                        help="Seconds before the shared pools snapshot is refreshed (0: every search)")
+    parser.add_argument("--plain-http", action="store_true",
+                        help="Stub without compression or conditional requests (to compare transfer)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this file (default: stdout)")
+    args = parser.parse_args()
+
+    stub = YieldsStub(args.pools, args.chart_points, args.latency_ms, args.jitter_ms, args.plain_http)
+    workdir = tempfile.mkdtemp(prefix="rocky-load-")
+
+    # Settings are read at import time, so they go in before importing the agent
+    os.environ["ROCKY_YIELDS_API"] = stub.url
+    os.environ["ROCKY_POOLS_SNAPSHOT"] = os.path.join(workdir, "pools.arrow")
+    os.environ["ROCKY_POOLS_MAX_AGE"] = str(args.max_age)
+    os.environ.setdefault("ROCKY_HISTORY_DB", os.path.join(workdir, "history.sqlite"))
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from crypto_agent import CryptoAgent
+    from defillama import flights, transfer
+    from query_jobs import MAX_WORKERS, submit_query
+
+    # One untimed conversation loads the snapshot and fills the process-wide caches,
+    # so the first level does not carry that one-time cost in its latency and memory
+    warmup = CryptoAgent(owner="load-warmup")
+    for _, message in CONVERSATION[:4]:
+        submit_query(warmup, message).result()
+    warmup_upstream = stub.take_counters()
+    flights.take_stats()
+    transfer.take_stats()
+
+    levels = []
+    for n in [int(n) for n in args.sessions.split(",") if n]:
+        level = run_level(n, args.messages, args.think_ms, args.seed, stub, flights, transfer,
+                          CryptoAgent, submit_query)
+        levels.append(level)
+        print(f"{n:>4} sessions: {level['throughput_msg_s']:>7.1f} msg/s  p50 {level['latency']['p50_ms']:>7.1f} ms  "
+              f"p99 {level['latency']['p99_ms']:>8.1f} ms  {level['retained_per_session_kb']:>8.1f} KB/session  "
+              f"upstream {level['upstream']['pools']}+{level['upstream']['chart']} "
+              f"({level['upstream']['bytes'] / 2**20:.1f} MB, {level['upstream']['not_modified']} not modified)",
+              file=sys.stderr)
+
+    report = {
+        "generated_at": datetime.now().isoformat(timespec="seconds"),
+        "cpus": os.cpu_count(),
+        "query_workers": MAX_WORKERS,
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "payload_bytes": {"pools": len(stub.pools_body), "chart": len(stub.chart_body)},
+        "warmup_upstream": warmup_upstream,
+        "levels": levels,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+# Dimensions over which concentration is measured
+DIMENSIONS = ['wallet', 'chain', 'category', 'protocol']
+
+# Inputs with more rows than this are split across a process pool
+PARALLEL_THRESHOLD = 2_000_000
+
+
+def concentration_level(hhi):
+    """High/Medium/Low label for a concentration index (0-100)"""
+    return np.select([hhi > 50, hhi > 25], ['High', 'Medium'], default='Low')
+
+
+def variation_level(coef_var):
+    """High/Medium/Low label for the position size coefficient of variation (%)"""
+    return np.select([coef_var > 100, coef_var > 50], ['High', 'Medium'], default='Low')
+
+
+def _compute(positions, portfolio_col, dimensions, value_col):
+    """Vectorized metrics for every portfolio in the frame"""
+    values = positions.groupby(portfolio_col, sort=True)[value_col]
+    result = pd.DataFrame({
+        'positions': values.size(),
+        'total_usd': values.sum(),
+    })
+
+    # Coefficient of variation of position sizes (sample std, as pandas does)
+    result['coef_var'] = values.std() / values.mean() * 100
+    result['variation_level'] = variation_level(result['coef_var'].fillna(0).to_numpy())
+
+    for dim in dimensions:
+        if dim not in positions.columns:
+            continue
+        by_item = positions.groupby([portfolio_col, dim], sort=False)[value_col].sum()
+        item_pid = by_item.index.get_level_values(0)
+        # Portfolios that total 0 USD have no shares: their HHI and top item are NaN
+        totals = result['total_usd'].where(result['total_usd'] != 0)
+        shares = by_item / totals.reindex(item_pid).to_numpy()
+
+        # Simplified Herfindahl-Hirschman index on a 0-100 scale
+        hhi = (shares ** 2).groupby(level=0).sum(min_count=1) * 100
+
+        # Top item: first row of every portfolio once sorted by share (ties keep the first item, as idxmax)
+        ranked = shares.dropna().sort_values(ascending=False, kind='stable')
+        first = ~ranked.index.get_level_values(0).duplicated()
+        top = pd.Series(ranked.index.get_level_values(1)[first], index=ranked.index.get_level_values(0)[first])
+
+        result[f'{dim}_count'] = by_item.groupby(level=0).size()
+        result[f'{dim}_hhi'] = hhi
+        result[f'{dim}_top'] = top
+        result[f'{dim}_top_share'] = shares.groupby(level=0).max() * 100
+        result[f'{dim}_level'] = concentration_level(result[f'{dim}_hhi'].to_numpy())
+
+    return result
+
+
+def _compute_chunk(args):
+    return _compute(*args)
+
+
+def compute_concentration(positions, portfolio_col='portfolio_id', dimensions=None,
+                          value_col='usd', workers=None, parallel_threshold=PARALLEL_THRESHOLD):
+    """Concentration metrics per portfolio from a long-format positions table.
+
+    Returns one row per portfolio with positions, total_usd, coef_var and, for
+    every dimension, the item count, HHI, top item, top share (%) and level.
+    Large inputs are partitioned by portfolio and processed in a process pool.
+    """
+    dimensions = list(dimensions or DIMENSIONS)
+
+    if len(positions) <= parallel_threshold or workers == 1:
+        return _compute(positions, portfolio_col, dimensions, value_col)
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        n_chunks = workers
+        codes = pd.factorize(positions[portfolio_col])[0] % n_chunks
+        chunks = [
+            (positions[codes == i], portfolio_col, dimensions, value_col)
+            for i in range(n_chunks)
+        ]
+        parts = list(executor.map(_compute_chunk, [c for c in chunks if len(c[0])]))
+
+    return pd.concat(parts).sort_index()
+
+
+def portfolio_concentration(df, dimensions=None, value_col='usd'):
+    """Metrics for a single portfolio, as a Series"""
+    single = df.assign(_portfolio=0)
+    return _compute(single, '_portfolio', list(dimensions or DIMENSIONS), value_col).iloc[0]
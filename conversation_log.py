@@ -0,0 +1,226 @@
+"""Registro persistente de conversaciones y eventos de sesión.
+
+Las páginas añaden entradas a un buffer en memoria (sin E/S); un hilo las
+escribe por lotes en ficheros JSONL diarios que rotan por tamaño. Los
+ficheros cerrados se compactan a Parquet cuando pyarrow está instalado, y
+las exportaciones se generan leyendo los ficheros por partes.
+
+Varios procesos de Streamlit comparten el directorio: las escrituras, la
+rotación y la compactación se hacen con un bloqueo de fichero (flock) para
+que ninguno rote o compacte un fichero mientras otro le añade entradas.
+"""
+import atexit
+import csv
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+LOG_DIR = os.environ.get("ROCKY_LOG_DIR", os.path.join("data", "logs"))
+
+# Segundos entre escrituras y entradas que fuerzan una escritura anticipada
+FLUSH_SECONDS = float(os.environ.get("ROCKY_LOG_FLUSH_SECONDS", "2"))
+BATCH_SIZE = 500
+
+# Segundos que una exportación espera a que el hilo de escritura vacíe el buffer
+SYNC_TIMEOUT = 10
+
+# Tamaño a partir del cual se rota el fichero JSONL del día
+MAX_FILE_MB = float(os.environ.get("ROCKY_LOG_MAX_MB", "64"))
+
+FIELDS = ["timestamp", "page", "session", "user", "event",
+          "user_message", "assistant_response", "visualization_type"]
+
+PREFIX = "conversaciones-"
+
+
+class ConversationLog:
+    """Buffer de entradas de log con escritura asíncrona a disco"""
+
+    def __init__(self, directory=LOG_DIR, flush_seconds=FLUSH_SECONDS, batch_size=BATCH_SIZE,
+                 max_bytes=MAX_FILE_MB * 1024 * 1024):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_bytes = max_bytes
+        self.written = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._wake = threading.Event()
+        # Peticiones de escritura (eventos) pendientes de la siguiente vuelta del hilo
+        self._waiters = []
+        self._thread = None
+
+    def log(self, **fields):
+        """Añade una entrada al buffer; nunca hace E/S en el hilo que llama"""
+        entry = {field: fields.get(field) for field in FIELDS}
+        entry["timestamp"] = entry["timestamp"] or datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            self._buffer.append(entry)
+            pending = len(self._buffer)
+            self._start()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rocky-conversation-log", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            with self._lock:
+                waiters, self._waiters = self._waiters, []
+            try:
+                self.flush()
+            except OSError:
+                # Disco no disponible: las entradas se reintentan en la siguiente vuelta
+                time.sleep(self.flush_seconds)
+            finally:
+                for waiter in waiters:
+                    waiter.set()
+
+    def sync(self, timeout=SYNC_TIMEOUT):
+        """Pide al hilo de escritura que vacíe el buffer y espera a que termine (sin E/S en este hilo)"""
+        done = threading.Event()
+        with self._lock:
+            if not self._buffer:
+                return True
+            self._waiters.append(done)
+            self._start()
+        self._wake.set()
+        return done.wait(timeout)
+
+    def _active_path(self):
+        return os.path.join(self.directory, f"{PREFIX}{datetime.now().strftime('%Y-%m-%d')}.jsonl")
+
+    def flush(self):
+        """Escribe el buffer en el fichero del día y compacta los ficheros cerrados"""
+        with self._lock:
+            entries, self._buffer = self._buffer, []
+        if not entries:
+            return
+
+        with self._io_lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                lock_file = open(os.path.join(self.directory, "conversaciones.lock"), "a")
+            except OSError:
+                with self._lock:
+                    self._buffer[:0] = entries
+                raise
+            try:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    path = self._active_path()
+                    with open(path, "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(entry, ensure_ascii=False, default=str) + "\n" for entry in entries))
+                except OSError:
+                    with self._lock:
+                        self._buffer[:0] = entries
+                    raise
+                self.written += len(entries)
+
+                if os.path.getsize(path) >= self.max_bytes:
+                    os.replace(path, path[:-len(".jsonl")] + f"-{time.time_ns()}.jsonl")
+                self._compact(keep=path)
+            finally:
+                lock_file.close()
+
+    def _compact(self, keep):
+        """Convierte a Parquet los JSONL que ya no se escriben (días anteriores o rotados).
+
+        Se llama con el bloqueo del directorio tomado.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            return
+
+        for path in glob.glob(os.path.join(self.directory, f"{PREFIX}*.jsonl")):
+            if path == keep:
+                continue
+            with open(path, encoding="utf-8") as f:
+                rows = [{field: None if value is None else str(value) for field, value in json.loads(line).items()}
+                        for line in f if line.strip()]
+            table = pa.Table.from_pylist(rows, schema=pa.schema([(field, pa.string()) for field in FIELDS]))
+            target = path[:-len(".jsonl")] + ".parquet"
+            pq.write_table(table, target + ".tmp")
+            os.replace(target + ".tmp", target)
+            os.remove(path)
+
+    def files(self):
+        """Ficheros de log en orden cronológico"""
+        paths = glob.glob(os.path.join(self.directory, f"{PREFIX}*.jsonl"))
+        paths += glob.glob(os.path.join(self.directory, f"{PREFIX}*.parquet"))
+        return sorted(paths)
+
+    def iter_entries(self, user=None, session=None):
+        """Recorre las entradas guardadas leyendo los ficheros por partes"""
+        self.sync()
+        paths = self.files()
+        for path in paths:
+            if path.endswith(".jsonl") and not os.path.exists(path):
+                # Compactado por otro proceso mientras tanto: se lee su Parquet
+                path = path[:-len(".jsonl")] + ".parquet"
+                if path in paths or not os.path.exists(path):
+                    continue
+            entries = _read_parquet(path) if path.endswith(".parquet") else _read_jsonl(path)
+            for entry in entries:
+                if user is not None and entry.get("user") != user:
+                    continue
+                if session is not None and entry.get("session") != session:
+                    continue
+                yield entry
+
+    def export(self, path, user=None, session=None):
+        """Exporta las entradas a CSV o JSONL (según la extensión) sin cargarlas todas en memoria.
+
+        Devuelve el número de entradas exportadas.
+        """
+        count = 0
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            if path.endswith(".csv"):
+                writer = csv.DictWriter(f, fieldnames=FIELDS)
+                writer.writeheader()
+                for entry in self.iter_entries(user, session):
+                    writer.writerow(entry)
+                    count += 1
+            else:
+                for entry in self.iter_entries(user, session):
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    count += 1
+        return count
+
+
+def _read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _read_parquet(path, batch_size=10_000):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+# Compartido por todas las sesiones (y páginas) del proceso
+conversation_log = ConversationLog()
+
+# Lo que quede en el buffer se escribe al salir
+atexit.register(conversation_log.flush)
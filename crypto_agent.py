@@ -0,0 +1,1201 @@
+import numpy as np
+import pandas as pd
+import re
+import requests
+import random
+from datetime import datetime, timedelta
+from query_trace import Tracer
+from defillama import fetch_chart
+from entity_resolver import resolver_for
+from entity_dictionary import CHAIN_ALIASES, EntityDictionary, dictionary_for
+from pool_diff import pool_feed
+from pools_snapshot import shared_pools
+from result_export import export_to_tempfile
+from watchlists import watchlists
+
+
+# Clase para el agente con memoria
+class CryptoAgent:
+    def __init__(self, snapshot=None, owner=None):
+        # Estado del agente - memoria para almacenar las variables
+        self.state = {
+            "blockchain": None,
+            "token": None,
+            "tvl_min": None,
+            "apy_min": None,
+            "protocol": None
+        }
+
+        # Almacenar las últimas oportunidades encontradas
+        self.last_opportunities = []
+
+        # Protocolos/tokens corregidos en la última búsqueda
+        self.resolution_notes = []
+        self.resolved = {"projects": None, "token": None}
+
+        # Tiempos y bytes de las últimas consultas
+        self.tracer = Tracer()
+
+        # Snapshot fijo de pools (modo batch); si es None se descarga en cada búsqueda
+        self.snapshot = snapshot
+
+        # Dueño de las watchlists guardadas desde este agente (usuario o sesión)
+        self.owner = owner or f"sesion-{id(self):x}"
+
+        # Mapeo de nombres de blockchain para DeFiLlama
+        self.chain_mapping = {
+            "ethereum": "Ethereum",
+            "arbitrum": "Arbitrum",
+            "solana": "Solana",
+            "avalanche": "Avalanche",
+            "polygon": "Polygon",
+            "binance": "BSC",
+            "bsc": "BSC",
+            "optimism": "Optimism",
+            "fantom": "Fantom",
+            "cardano": "Cardano",
+            "base": "Base"
+        }
+
+        # Diccionario mínimo (solo chain_mapping) hasta que se conozca el primer snapshot de pools
+        self.base_entities = EntityDictionary(
+            self.chain_mapping.values(),
+            aliases={**CHAIN_ALIASES, **{key: value.lower() for key, value in self.chain_mapping.items()}},
+            from_snapshot=False
+        )
+
+        # Lista de palabras comunes que no deben ser tratadas como tokens
+        self.common_words = [
+            "a", "al", "algo", "algunas", "algunos", "ante", "antes", "como", "con", "contra",
+            "cual", "cuando", "de", "del", "desde", "donde", "durante", "e", "el", "ella",
+            "ellas", "ellos", "en", "entre", "era", "erais", "eran", "eras", "eres", "es",
+            "esa", "esas", "ese", "eso", "esos", "esta", "estaba", "estabais", "estaban",
+            "estabas", "estad", "estada", "estadas", "estado", "estados", "estamos", "estando",
+            "estar", "estaremos", "estará", "estarán", "estarás", "estaré", "estaréis",
+            "estaría", "estaríais", "estaríamos", "estarían", "estarías", "estas", "este",
+            "estemos", "esto", "estos", "estoy", "estuve", "estuviera", "estuvierais",
+            "estuvieran", "estuvieras", "estuvieron", "estuviese", "estuvieseis", "estuviesen",
+            "estuvieses", "estuvimos", "estuviste", "estuvisteis", "estuviéramos",
+            "estuviésemos", "estuvo", "está", "estábamos", "estáis", "están", "estás", "esté",
+            "estéis", "estén", "estés", "fue", "fuera", "fuerais", "fueran", "fueras",
+            "fueron", "fuese", "fueseis", "fuesen", "fueses", "fui", "fuimos", "fuiste",
+            "fuisteis", "fuéramos", "fuésemos", "ha", "habida", "habidas", "habido", "habidos",
+            "habiendo", "habremos", "habrá", "habrán", "habrás", "habré", "habréis", "habría",
+            "habríais", "habríamos", "habrían", "habrías", "habéis", "había", "habíais",
+            "habíamos", "habían", "habías", "han", "has", "hasta", "hay", "haya", "hayamos",
+            "hayan", "hayas", "hayáis", "he", "hemos", "hube", "hubiera", "hubierais",
+            "hubieran", "hubieras", "hubieron", "hubiese", "hubieseis", "hubiesen", "hubieses",
+            "hubimos", "hubiste", "hubisteis", "hubiéramos", "hubiésemos", "hubo", "la", "las",
+            "le", "les", "lo", "los", "me", "mi", "mis", "mucho", "muchos", "muy", "más",
+            "mí", "mía", "mías", "mío", "míos", "nada", "ni", "no", "nos", "nosotras",
+            "nosotros", "nuestra", "nuestras", "nuestro", "nuestros", "o", "os", "otra",
+            "otras", "otro", "otros", "para", "pero", "poco", "por", "porque", "que",
+            "quien", "quienes", "qué", "se", "sea", "seamos", "sean", "seas", "seremos",
+            "será", "serán", "serás", "seré", "seréis", "sería", "seríais", "seríamos",
+            "serían", "serías", "seáis", "si", "sido", "siendo", "sin", "sobre", "sois",
+            "somos", "son", "soy", "su", "sus", "suya", "suyas", "suyo", "suyos", "sí",
+            "también", "tanto", "te", "tendremos", "tendrá", "tendrán", "tendrás", "tendré",
+            "tendréis", "tendría", "tendríais", "tendríamos", "tendrían", "tendrías", "tened",
+            "tenemos", "tenga", "tengamos", "tengan", "tengas", "tengo", "tengáis", "tenida",
+            "tenidas", "tenido", "tenidos", "teniendo", "tenéis", "tenía", "teníais",
+            "teníamos", "tenían", "tenías", "ti", "tiene", "tienen", "tienes", "todo",
+            "todos", "tu", "tus", "tuve", "tuviera", "tuvierais", "tuvieran", "tuvieras",
+            "tuvieron", "tuviese", "tuvieseis", "tuviesen", "tuvieses", "tuvimos", "tuviste",
+            "tuvisteis", "tuviéramos", "tuviésemos", "tuvo", "tuya", "tuyas", "tuyo", "tuyos",
+            "tú", "un", "una", "uno", "unos", "vosotras", "vosotros", "vuestra", "vuestras",
+            "vuestro", "vuestros", "y", "ya", "yo", "él", "éramos", "ver", "dame", "quiero",
+            "necesito", "haz", "hazme", "mostrar", "muestra", "muestrame", "dime", "cuál",
+            "cuales", "qué", "que", "deseo", "obtener", "conseguir", "listar", "hay"
+        ]
+
+    def process_tvl_value(self, value_str):
+        """Procesa valores de TVL con K y M"""
+        value_str = value_str.strip().lower()
+        if value_str.endswith('k'):
+            return str(float(value_str[:-1]) * 1000)
+        elif value_str.endswith('m'):
+            return str(float(value_str[:-1]) * 1000000)
+        else:
+            return value_str
+
+    def entities(self):
+        """Diccionario de entidades del snapshot actual (o el mínimo de chain_mapping si no se puede cargar)"""
+        pools = self.snapshot if self.snapshot is not None else pool_feed.current
+        if pools is None:
+            # Primera consulta del proceso: se carga ya el snapshot compartido que usará la búsqueda
+            pools, error = self.download_opportunities()
+            if error:
+                return self.base_entities
+        return dictionary_for(pools)
+
+    def detect_all_variables(self, query):
+        """Detecta todas las variables mencionadas en la consulta"""
+        query_lower = query.lower()
+        updates = {}
+
+        # PRIMERO detectar token para evitar conflictos con blockchain
+        # Detectar token (priorizar patrones que mencionan explícitamente "token")
+        token_patterns = [
+            r'token\s+(?:de\s+)?(\w+)',
+            r'el\s+token\s+(?:de\s+)?(\w+)',
+            r'(\w+)\s+token',
+            r'selecciona(?:r)?\s+(?:el\s+)?token\s+(?:de\s+)?(\w+)',
+            r'buscar?\s+(?:el\s+)?token\s+(?:de\s+)?(\w+)',
+            r'encontrar?\s+(?:el\s+)?token\s+(?:de\s+)?(\w+)',
+            r'busca\s+(?:el\s+)?token\s+(?:de\s+)?(\w+)'
+        ]
+
+        for pattern in token_patterns:
+            token_match = re.search(pattern, query_lower)
+            if token_match:
+                token = token_match.group(1)
+                # Verificamos que el token no sea una palabra común y tenga suficiente longitud
+                if token and token not in self.common_words and len(token) > 1:
+                    updates["token"] = token
+                    break
+
+        # Entidades conocidas (chains, protocolos, tokens) en una sola pasada sobre la consulta
+        entities = self.entities()
+        matches = [match for match in entities.match(query_lower)
+                   if match.text not in self.common_words and match.text != updates.get("token")]
+
+        # Luego detectar blockchain, evitando detectar tokens como blockchains
+        for match in matches:
+            if "chain" in match.kinds:
+                updates["blockchain"] = match.kinds["chain"]
+                break
+
+        # Detectar protocolo
+        protocol_patterns = [
+            r'protocol(?:o)?\s+(?:de\s+)?(\w+)',
+            r'(?:en|del|con)\s+protocol(?:o)?\s+(?:de\s+)?(\w+)',
+            r'(?:el|del)\s+protocol(?:o)?\s+(?:de\s+)?(\w+)',
+            r'(\w+)\s+protocol(?:o)?',
+            r'selecciona(?:r)?\s+(?:el\s+)?protocol(?:o)?\s+(?:de\s+)?(\w+)'
+        ]
+
+        for pattern in protocol_patterns:
+            protocol_match = re.search(pattern, query_lower)
+            if protocol_match:
+                protocol = protocol_match.group(1)
+                if protocol not in self.common_words and len(protocol) > 1:
+                    updates["protocol"] = protocol
+                    break
+
+        # Protocolos y tokens nombrados sin 'protocolo'/'token' delante (un nombre de protocolo tiene prioridad)
+        for match in matches:
+            if "chain" in match.kinds or match.text == updates.get("protocol"):
+                continue
+            if "project" in match.kinds:
+                updates.setdefault("protocol", match.kinds["project"])
+            elif "token" in match.kinds:
+                updates.setdefault("token", match.kinds["token"])
+
+        # Detectar blockchain no soportada: palabra en posición de blockchain que no es ninguna entidad conocida
+        blockchain_patterns = [
+            r'blockchain\s+(?:de\s+)?(\w+)',
+            r'en\s+(\w+)\b(?!\s+token)',
+            r'de\s+(?:la\s+)?(?:blockchain|cadena|red)\s+(?:de\s+)?(\w+)',
+            r'(\w+)\s+(?:blockchain|cadena|red)',
+            r'selecciona(?:r)?\s+(?:la\s+)?(?:blockchain|cadena|red)\s+(?:de\s+)?(\w+)'
+        ]
+
+        if "blockchain" not in updates:
+            for pattern in blockchain_patterns:
+                blockchain_match = re.search(pattern, query_lower)
+                if blockchain_match:
+                    chain = blockchain_match.group(1)
+                    if chain in self.common_words or chain in (updates.get("token"), updates.get("protocol")):
+                        continue
+                    if not entities.kinds(chain):
+                        return {"error": f"Blockchain '{chain}' no soportada. Las blockchains disponibles son: {entities.chain_names()}"}
+
+        # Detectar TVL mínimo con soporte para K y M
+        tvl_patterns = [
+            r'tvl\s+(?:min(?:imo)?|mayor|superior)\s+(?:a|de)?\s*(\d+(?:\.\d+)?(?:[km])?)',
+            r'tvl\s+de\s+(\d+(?:\.\d+)?(?:[km])?)',
+            r'tvl\s+minimo\s+de\s+(\d+(?:\.\d+)?(?:[km])?)',
+            r'minimo\s+(?:de\s+)?tvl\s+(?:de\s+)?(\d+(?:\.\d+)?(?:[km])?)',
+            r'tvl\s+min(?:imo)?\s+(\d+(?:\.\d+)?(?:[km])?)'
+        ]
+
+        for pattern in tvl_patterns:
+            tvl_match = re.search(pattern, query_lower)
+            if tvl_match:
+                tvl_value = tvl_match.group(1)
+                updates["tvl_min"] = self.process_tvl_value(tvl_value)
+                break
+
+        # Detectar APY mínimo
+        apy_patterns = [
+            r'apy\s+(?:min(?:imo)?|mayor|superior)\s+(?:a|de)?\s*(\d+(?:\.\d+)?)',
+            r'apy\s+de\s+(\d+(?:\.\d+)?)',
+            r'apy\s+minimo\s+de\s+(\d+(?:\.\d+)?)',
+            r'minimo\s+(?:de\s+)?apy\s+(?:de\s+)?(\d+(?:\.\d+)?)',
+            r'apy\s+min(?:imo)?\s+(\d+(?:\.\d+)?)'
+        ]
+
+        for pattern in apy_patterns:
+            apy_match = re.search(pattern, query_lower)
+            if apy_match:
+                updates["apy_min"] = apy_match.group(1)
+                break
+
+        # Detectar búsqueda libre de token (si no se ha detectado mediante patrones)
+        keys_to_check = ["blockchain", "tvl_min", "apy_min", "protocol", "error", "token"]
+        found_keys = [key for key in keys_to_check if key in updates]
+
+        if len(found_keys) == 0:  # No se detectó ningún parámetro
+            # Verificar si hay palabras clave de búsqueda
+            search_keywords = ["buscar", "encontrar", "busca", "encuentra", "hallar", "mostrar", "ver", "listar"]
+            has_search_keyword = False
+            for keyword in search_keywords:
+                if keyword in query_lower:
+                    has_search_keyword = True
+                    break
+
+            if has_search_keyword:
+                # Eliminar palabras clave y palabras comunes
+                for word in search_keywords + self.common_words:
+                    query_lower = re.sub(r'\b' + word + r'\b', ' ', query_lower)
+
+                # Limpiar y obtener palabras que podrían ser tokens
+                tokens = [t for t in query_lower.strip().split() if len(t) > 1 and t not in self.common_words]
+                if tokens:
+                    updates["token"] = tokens[0]  # Tomar la primera palabra como token
+
+        return updates
+
+    def update_state(self, updates):
+        """Actualiza el estado con las variables detectadas sin retornar mensajes"""
+        if not updates:
+            return None
+
+        # Verificar si hay error
+        if "error" in updates:
+            return updates["error"]
+
+        # Actualizar el estado silenciosamente
+        for key, value in updates.items():
+            self.state[key] = value
+
+        # Retornar cadena vacía para evitar mensajes
+        return ""
+
+    def detect_position_request(self, query):
+        """Detecta si el usuario está pidiendo información detallada sobre una posición específica"""
+        query_lower = query.lower()
+
+        # Eliminar comillas y paréntesis para la detección
+        query_clean = re.sub(r'[\'"\(\)]', '', query_lower)
+
+        # Patrones para detectar consultas sobre posiciones específicas
+        position_patterns = [
+            r'(?:mas|más)\s*info(?:rmacion|rmación)?\s*(?:de|sobre)?\s*(?:la)?\s*(?:posicion|posición)?\s*(\d+)',
+            r'info(?:rmacion|rmación)?\s*(?:de|sobre)?\s*(?:la)?\s*(?:posicion|posición)?\s*(\d+)',
+            r'detalle(?:s)?\s*(?:de|sobre)?\s*(?:la)?\s*(?:posicion|posición)?\s*(\d+)',
+            r'dame\s*(?:mas|más)?\s*(?:de|sobre)?\s*(?:la)?\s*(?:posicion|posición)?\s*(\d+)',
+            r'ver\s*(?:la)?\s*(?:posicion|posición)?\s*(\d+)',
+            r'mostrar\s*(?:la)?\s*(?:posicion|posición)?\s*(\d+)',
+            r'detalles\s*(?:del|de la|de)?\s*(\d+)',
+            r'mas\s*sobre\s*(?:el|la)?\s*(\d+)',
+            r'informacion\s*(?:del|de la)?\s*(\d+)'
+        ]
+
+        for pattern in position_patterns:
+            position_match = re.search(pattern, query_clean)
+            if position_match:
+                try:
+                    position = int(position_match.group(1))
+                    # Ajustar a base 0 para indexar el array
+                    return position - 1
+                except ValueError:
+                    return None
+
+        return None
+
+    def detect_chart_request(self, query):
+        """Detecta si el usuario está pidiendo un gráfico comparativo"""
+        query_lower = query.lower()
+
+        # Patrones para detectar solicitudes de gráficos
+        chart_patterns = [
+            r'(?:haz|crea|genera|muestra|visualiza)(?:me)?\s+(?:un)?\s*(?:grafico|gráfico|chart|visualizacion|visualización)',
+            r'(?:comparar|compara)(?:me)?\s+(?:las)?\s*(?:oportunidades|posiciones|pools)',
+            r'(?:ver|mostrar|visualizar)\s+(?:la)?\s*(?:evolucion|evolución|tendencia|historia)',
+            r'(?:grafico|gráfico|chart)\s+(?:comparativo|de comparacion|comparación)',
+            r'(?:evolución|evolucion)\s+(?:del|de la|de)?\s*apy'
+        ]
+
+        for pattern in chart_patterns:
+            if re.search(pattern, query_lower):
+                return True
+
+        return False
+
+    def detect_comparison(self, query):
+        """Detecta comparaciones del tipo 'USDC en ethereum vs arbitrum vs base'.
+
+        Devuelve None si la consulta no es una comparación, o un diccionario con
+        la dimensión comparada, sus valores y las variables comunes detectadas
+        en el resto de la consulta (o {"error": ...}).
+        """
+        query_lower = query.lower()
+        separator = r'\s+(?:vs\.?|versus|frente\s+a)\s+'
+        comparison_match = re.search(r'([\w-]+)((?:' + separator + r'[\w-]+)+)', query_lower)
+        if not comparison_match:
+            return None
+
+        values = [comparison_match.group(1)] + re.split(separator, comparison_match.group(2))[1:]
+        values = list(dict.fromkeys(values))
+        if len(values) < 2:
+            return None
+
+        # Dimensión comparada: la indica la palabra anterior o, si no, el tipo de los valores
+        before = query_lower[:comparison_match.start()].split()
+        previous_word = before[-1] if before else ""
+        entities = self.entities()
+        kinds = [entities.kinds(value) for value in values]
+        chains = [value for value, value_kinds in zip(values, kinds) if "chain" in value_kinds]
+        if previous_word.startswith("protocol"):
+            dimension = "protocol"
+        elif previous_word == "token":
+            dimension = "token"
+        elif chains and len(chains) < len(values):
+            unsupported = [value for value in values if value not in chains][0]
+            return {"error": f"Blockchain '{unsupported}' no soportada. Las blockchains disponibles son: {entities.chain_names()}"}
+        elif chains:
+            dimension = "blockchain"
+        elif all("project" in value_kinds for value_kinds in kinds):
+            dimension = "protocol"
+        else:
+            dimension = "token"
+
+        # Variables comunes: el resto de la consulta sin la parte comparada
+        # (quitando también la palabra que introduce los valores: 'en', 'token', 'protocolo'...)
+        if previous_word in ("token", "en", "blockchain", "red", "cadena") or previous_word.startswith("protocol"):
+            before = before[:-1]
+        rest = " ".join(before) + " " + query_lower[comparison_match.end():]
+        updates = self.detect_all_variables(rest) if rest.strip() else {}
+        if "error" in updates:
+            return updates
+        updates.pop(dimension, None)
+
+        # Token sin la palabra 'token' delante (ej: 'USDC en ethereum vs arbitrum')
+        if dimension != "token" and "token" not in updates:
+            keywords = ["compara", "comparar", "comparame", "pools", "pool", "oportunidades",
+                        "tvl", "apy", "minimo", "mínimo", "mayor", "superior", "protocolo", "protocol"]
+            for word in rest.split():
+                if word in self.common_words or word in keywords or entities.chain_key(word):
+                    continue
+                if re.fullmatch(r'\d+(?:\.\d+)?[km]?', word) or not re.fullmatch(r'\w+', word):
+                    continue
+                if word != updates.get("protocol"):
+                    updates["token"] = word
+                break
+
+        return {"dimension": dimension, "values": values, "updates": updates}
+
+    def detect_diff_request(self, query):
+        """Detecta preguntas sobre cambios del feed: pools nuevas o mayores subidas/bajadas.
+
+        Ej: 'pools nuevos hoy en solana', 'mayores subidas de APY'.
+        Devuelve None o un diccionario con el tipo de consulta, la chain y desde cuándo.
+        """
+        query_lower = query.lower()
+
+        new_match = re.search(r'(?:pools?|oportunidades|posiciones)\s+(?:nuev[oa]s|recientes)|nuev[oa]s\s+(?:pools?|oportunidades|posiciones)', query_lower)
+        movers_match = re.search(r'(subidas?|aumentos?|bajadas?|ca[ií]das?|descensos?)\s+(?:de(?:l)?\s+)?(apy|tvl)', query_lower)
+        if not new_match and not movers_match:
+            return None
+
+        # Ventana temporal (por defecto, hoy)
+        now = datetime.now()
+        hours_match = re.search(r'(\d+)\s*h(?:oras)?\b', query_lower)
+        if re.search(r'[uú]ltima\s+hora', query_lower):
+            since, label = now - timedelta(hours=1), "en la última hora"
+        elif hours_match:
+            since, label = now - timedelta(hours=int(hours_match.group(1))), f"en las últimas {hours_match.group(1)} horas"
+        elif "semana" in query_lower:
+            since, label = now - timedelta(days=7), "esta semana"
+        else:
+            since, label = now.replace(hour=0, minute=0, second=0, microsecond=0), "hoy"
+
+        chain = None
+        entities = self.entities()
+        for match in entities.match(query_lower):
+            if "chain" in match.kinds:
+                chain = entities.chains[match.kinds["chain"]]
+                break
+
+        request = {"since": since, "label": label, "chain": chain}
+        if new_match:
+            request["kind"] = "new"
+        else:
+            request["kind"] = "movers"
+            request["column"] = "apy" if movers_match.group(2) == "apy" else "tvlUsd"
+            request["ascending"] = not re.match(r'subida|aumento', movers_match.group(1))
+        return request
+
+    def detect_watchlist_command(self, query):
+        """Detecta órdenes sobre watchlists: guardar, eliminar, listar o ver novedades.
+
+        Devuelve (acción, nombre) o None.
+        """
+        query_lower = query.lower()
+
+        save_match = re.search(r'guarda(?:r)?\s+(?:esta\s+|la\s+)?(?:b[uú]squeda|watchlist|criterios)(?:\s+como)?\s+["\']?([\w-]+)', query_lower)
+        if save_match:
+            return "save", save_match.group(1)
+
+        remove_match = re.search(r'(?:elimina|eliminar|quita|quitar|borra|borrar)\s+(?:la\s+)?watchlist\s+["\']?([\w-]+)', query_lower)
+        if remove_match:
+            return "remove", remove_match.group(1)
+
+        if re.search(r'novedades|(?:nuevo|nuevas|nuevos)\s+en\s+(?:mis\s+)?watchlists?', query_lower):
+            return "news", None
+
+        if re.search(r'(?:mis|ver|listar?|mostrar|muestra)\s+(?:las\s+|mis\s+)?watchlists?', query_lower):
+            return "list", None
+
+        return None
+
+    def get_ai_response(self, context):
+        """Genera respuestas conversacionales según el contexto"""
+        search_responses = [
+            "Analizando datos de la blockchain en tiempo real...",
+            "Explorando las oportunidades DeFi disponibles ahora mismo...",
+            "Rastreando los mejores rendimientos en el ecosistema cripto...",
+            "Consultando Smart Contracts en múltiples blockchains...",
+            "Procesando datos on-chain para encontrar las mejores opciones...",
+            "Evaluando pools de liquidez y sus rendimientos actuales...",
+            "Comparando protocolos DeFi según tus criterios...",
+            "Buscando oportunidades que maximicen tu APY con el menor riesgo..."
+        ]
+
+        details_responses = [
+            "Profundizando en los datos de esta posición...",
+            "Analizando métricas detalladas de este protocolo...",
+            "Extrayendo información completa de este Smart Contract...",
+            "Verificando la composición y seguridad de esta pool...",
+            "Calculando estadísticas históricas de rendimiento..."
+        ]
+
+        chart_responses = [
+            "Visualizando tendencias históricas para estas posiciones...",
+            "Generando análisis comparativo de rendimientos en el tiempo...",
+            "Trazando la evolución del APY durante el período seleccionado...",
+            "Creando visualización para evaluar la estabilidad del rendimiento..."
+        ]
+
+        result_comments = [
+            "¡Aquí tienes los resultados encontrados por Orvee Intelligence!",
+            "Orvee Intelligence ha localizado estas oportunidades para ti.",
+            "Resultados analizados y verificados por Orvee Intelligence.",
+            "Mi algoritmo Orvee ha identificado estas posiciones prometedoras.",
+            "Según Orvee Intelligence, estas son las mejores opciones disponibles.",
+            "Orvee ha completado el análisis. Estas son las oportunidades destacadas.",
+            "Resultados procesados. Orvee Intelligence recomienda estas posiciones.",
+            "Análisis DeFi completado por Orvee Intelligence con éxito."
+        ]
+
+        if context == "search":
+            return random.choice(search_responses)
+        elif context == "details":
+            return random.choice(details_responses)
+        elif context == "chart":
+            return random.choice(chart_responses)
+        elif context == "result_comment":
+            return random.choice(result_comments)
+        else:
+            return "Procesando tu solicitud en el ecosistema DeFi..."
+
+    def generate_result_analysis(self, results):
+        """Genera un breve análisis de los resultados encontrados"""
+        # Verificar si results es None
+        if results is None:
+            return ""
+
+        # Verificar si results es un DataFrame vacío
+        if isinstance(results, pd.DataFrame):
+            if results.empty:
+                return ""
+            results_list = results.to_dict('records')
+        else:
+            # Si no es un DataFrame, asumimos que es una lista
+            results_list = results
+
+        # Si results_list está vacío o no es una lista, devolver cadena vacía
+        if not isinstance(results_list, list) or len(results_list) == 0:
+            return ""
+
+        # Analizar los datos para generar comentarios relevantes
+        protocols = []
+        chains = []
+        apys = []
+
+        for r in results_list:
+            if isinstance(r, dict):
+                # Extraer proyecto
+                project = r.get('project', '')
+                if project and project not in protocols:
+                    protocols.append(project)
+
+                # Extraer cadena
+                chain = r.get('chain', '')
+                if chain and chain not in chains:
+                    chains.append(chain)
+
+                # Extraer APY
+                apy_str = str(r.get('apy', '0%'))
+                # Eliminar % y comas, luego convertir a float
+                apy_str = apy_str.replace('%', '').replace(',', '')
+                try:
+                    apys.append(float(apy_str))
+                except ValueError:
+                    pass
+
+        # Verificar si tenemos suficientes datos para análisis
+        if not protocols or not chains or not apys:
+            return ""
+
+        max_apy = max(apys) if apys else 0
+        min_apy = min(apys) if apys else 0
+
+        analyses = [
+            f"He encontrado {len(results_list)} oportunidades con APYs entre {min_apy:.2f}% y {max_apy:.2f}%.",
+            f"Las posiciones destacadas incluyen protocolos como {', '.join(protocols[:3])}.",
+            f"Estas oportunidades están disponibles en {len(chains)} blockchain{'s' if len(chains) > 1 else ''}: {', '.join(chains)}.",
+            "La posición #1 muestra el mejor rendimiento en función de tu búsqueda."
+        ]
+
+        # Generar análisis aleatorio para no ser repetitivo
+        analysis_count = min(2, len(analyses))
+        selected_analyses = random.sample(analyses, analysis_count)
+
+        return " ".join(selected_analyses)
+
+    def safe_dataframe_for_streamlit(self, df):
+        """Convierte los valores problemáticos en el DataFrame para que sea compatible con Arrow/Streamlit"""
+        # Copia para evitar modificar el original
+        df = df.copy()
+
+        # Convertir todos los valores problemáticos a strings
+        for col in df.columns:
+            df[col] = df[col].astype(str)  # Convertir toda la columna a strings
+        return df
+
+    def download_opportunities(self):
+        """Pools de DeFiLlama como DataFrame (snapshot compartido; solo se descarga si ha caducado)"""
+        try:
+            return shared_pools.get(self.tracer), None
+        except RuntimeError as e:
+            return None, str(e)
+        except requests.RequestException as e:
+            return None, f"Error al consultar la API de DeFiLlama: {e}"
+
+    def load_opportunities(self):
+        """Pools actuales (snapshot fijo o descarga); cada snapshot nuevo actualiza el feed y las watchlists"""
+        self.resolution_notes = []
+        if self.snapshot is not None:
+            opportunities = self.snapshot
+        else:
+            opportunities, error = self.download_opportunities()
+            if error:
+                return None, error
+
+        with self.tracer.span("diff"):
+            diff = pool_feed.update(opportunities, None if self.snapshot is not None else shared_pools.taken_at)
+        if diff is not None:
+            with self.tracer.span("watchlists"):
+                watchlists.apply(diff)
+        return opportunities, None
+
+    def search_defi_opportunities(self):
+        """Busca oportunidades DeFi que cumplan con los criterios actuales"""
+        try:
+            opportunities, error = self.load_opportunities()
+            if error:
+                return None, error
+
+            with self.tracer.span("filter"):
+                top_opportunities = self.filter_opportunities(opportunities)
+
+            if len(top_opportunities.index) == 0:  # Usar len() en vez de .empty
+                self.last_opportunities = []
+                return None, "No se encontraron oportunidades que cumplan con los criterios actuales."
+
+            with self.tracer.span("format"):
+                results_df = self.format_opportunities(top_opportunities)
+
+            return results_df, None  # Devolver resultados y None para el error
+
+        except Exception as e:
+            return None, f"Error al buscar oportunidades DeFi: {str(e)}"
+
+    def resolve_protocol(self, opportunities, protocol):
+        """Proyectos del snapshot a los que se refiere el protocolo del usuario ('aave' -> aave-v2, aave-v3)"""
+        projects, exact = resolver_for(opportunities).projects.resolve(protocol)
+        if projects and not exact:
+            self.resolution_notes.append(f"Protocolo '{protocol}' interpretado como: {', '.join(projects[:8])}")
+        return projects
+
+    def resolve_token(self, opportunities, token):
+        """Corrección aproximada de un token que no aparece en ningún símbolo ('usdcc' -> USDC)"""
+        candidates, _ = resolver_for(opportunities).tokens.resolve(token)
+        if candidates and candidates[0].lower() != token.lower():
+            self.resolution_notes.append(f"Token '{token}' interpretado como: {candidates[0]}")
+            return candidates[0]
+        return None
+
+    def with_resolution_notes(self, message):
+        """Añade al mensaje las correcciones de protocolo/token de la última búsqueda"""
+        if not self.resolution_notes:
+            return message
+        return message + "\n\n" + "\n".join(f"_{note}_" for note in self.resolution_notes)
+
+    def matching_rows(self, opportunities, criteria):
+        """Posiciones (np.ndarray) de las pools que cumplen los criterios (mismo formato que self.state).
+
+        Los filtros se combinan como máscaras sobre el DataFrame completo, sin
+        crear copias intermedias de las filas seleccionadas.
+        """
+        # Correcciones de protocolo/token aplicadas en este filtrado (se muestran al usuario)
+        self.resolution_notes = []
+        # Proyectos y token con los que se ha filtrado finalmente (los usan las watchlists)
+        self.resolved = {"projects": None, "token": criteria["token"]}
+        mask = np.ones(len(opportunities.index), dtype=bool)
+
+        def lowered(column):
+            return opportunities[column].str.lower()
+
+        if criteria["blockchain"]:
+            chain_name = self.chain_mapping.get(criteria["blockchain"].lower(), criteria["blockchain"])
+            mask &= (lowered('chain') == chain_name.lower()).to_numpy(dtype=bool, na_value=False)
+
+        if criteria["protocol"]:
+            projects = self.resolve_protocol(opportunities, criteria["protocol"]) or [criteria["protocol"]]
+            self.resolved["projects"] = projects
+            mask &= lowered('project').isin([project.lower() for project in projects]).to_numpy(dtype=bool)
+
+        # Filtrar por símbolo del token
+        if criteria["token"]:
+            symbols = lowered('symbol')
+            matches = symbols.str.contains(criteria["token"].lower(), regex=False).to_numpy(dtype=bool, na_value=False)
+            # Solo se corrige el token si no aparece tal cual (ej: 'usd' sigue cubriendo USDC y USDT)
+            if not (mask & matches).any():
+                token = self.resolve_token(opportunities, criteria["token"])
+                if token:
+                    self.resolved["token"] = token
+                    matches = symbols.str.contains(token.lower(), regex=False).to_numpy(dtype=bool, na_value=False)
+            mask &= matches
+
+        # Filtrar por TVL mínimo
+        if criteria["tvl_min"]:
+            mask &= (opportunities['tvlUsd'] >= float(criteria["tvl_min"])).to_numpy(dtype=bool, na_value=False)
+
+        if criteria["apy_min"]:
+            mask &= (opportunities['apy'] >= float(criteria["apy_min"])).to_numpy(dtype=bool, na_value=False)
+
+        return np.flatnonzero(mask)
+
+    def apply_criteria(self, opportunities, criteria):
+        """Filtra las pools según un conjunto de criterios (mismo formato que self.state)"""
+        return opportunities.iloc[self.matching_rows(opportunities, criteria)]
+
+    def export_matches(self, fmt, name):
+        """Exporta a CSV o Parquet todas las pools que cumplen los criterios actuales, ordenadas por APY.
+
+        Las filas se escriben por bloques directamente desde el snapshot.
+        Devuelve ((ruta, filas exportadas), None) o (None, error).
+        """
+        opportunities, error = self.load_opportunities()
+        if error:
+            return None, error
+        with self.tracer.span("filter"):
+            rows = self.matching_rows(opportunities, self.state)
+            apy = opportunities['apy'].to_numpy(dtype=float, na_value=np.nan)
+            rows = rows[np.argsort(-apy[rows], kind='stable')]
+        with self.tracer.span("export"):
+            return export_to_tempfile(opportunities, fmt, name, rows=rows), None
+
+    def filter_opportunities(self, opportunities):
+        """Aplica los criterios actuales y devuelve las 5 mejores oportunidades por APY"""
+        # Aplicar filtros según las variables de estado
+        filtered_opps = self.apply_criteria(opportunities, self.state)
+
+        # Ordenar por APY descendente
+        filtered_opps = filtered_opps.sort_values(by='apy', ascending=False)
+
+        # Seleccionar las 5 mejores oportunidades
+        return filtered_opps.head(5)
+
+    def format_opportunities(self, top_opportunities):
+        """Guarda las oportunidades y las prepara para mostrarlas en Streamlit"""
+        # Guardar las oportunidades completas para consultas detalladas
+        self.last_opportunities = top_opportunities.to_dict('records')
+
+        # Preparar los datos para mostrar en Streamlit como lista de diccionarios
+        results = []
+        for i, opp in enumerate(self.last_opportunities):
+            result = {
+                "posicion": i + 1,
+                "chain": opp["chain"],
+                "project": opp["project"],
+                "symbol": opp["symbol"],
+                "tvlUsd": f"${opp['tvlUsd']:,.2f}",
+                "apy": f"{opp['apy']:.2f}%",
+                # Convertir valores booleanos a string para evitar errores de PyArrow
+                "ilRisk": str(opp["ilRisk"]),
+                "exposure": str(opp["exposure"]),
+                "pool": str(opp["pool"])  # Añadimos el ID de la pool para poder obtener el gráfico
+            }
+            results.append(result)
+
+        # Convertir a DataFrame y asegurar compatibilidad con Arrow
+        results_df = pd.DataFrame(results)
+        results_df = self.safe_dataframe_for_streamlit(results_df)
+
+        return results_df
+
+    def compare_opportunities(self, opportunities, comparison, top_k=5):
+        """Evalúa todos los grupos de una comparación en una sola pasada.
+
+        Los criterios comunes se aplican una vez; después cada pool recibe el
+        grupo (valor comparado) al que pertenece y se calculan el top-k y las
+        estadísticas de todos los grupos con un único groupby.
+        """
+        dimension = comparison["dimension"]
+        values = comparison["values"]
+
+        # Criterios comunes (sin la dimensión comparada)
+        shared = dict(self.state)
+        shared[dimension] = None
+        candidates = self.apply_criteria(opportunities, shared)
+
+        if dimension == "token":
+            # Un símbolo puede contener varios tokens (pares): una fila por grupo al que pertenece
+            symbols = candidates['symbol'].str.lower()
+            parts = []
+            for i, value in enumerate(values):
+                part = candidates[symbols.str.contains(value.lower(), regex=False)]
+                if len(part.index) == 0:
+                    token = self.resolve_token(opportunities, value)
+                    if token:
+                        part = candidates[symbols.str.contains(token.lower(), regex=False)]
+                parts.append(part.assign(grupo=i))
+            matched = pd.concat(parts)
+        else:
+            if dimension == "blockchain":
+                column = 'chain'
+                entities = self.entities()
+                groups_by_key = {(entities.chain_key(value) or self.chain_mapping.get(value, value)).lower(): i
+                                 for i, value in enumerate(values)}
+            else:
+                # Cada protocolo comparado agrupa todos los proyectos de su familia ('aave' -> aave-v2, aave-v3)
+                column = 'project'
+                groups_by_key = {}
+                for i, value in enumerate(values):
+                    for project in self.resolve_protocol(opportunities, value) or [value]:
+                        groups_by_key.setdefault(project.lower(), i)
+            groups = candidates[column].str.lower().map(groups_by_key)
+            matched = candidates[groups.notna()].assign(grupo=groups[groups.notna()].astype(int))
+
+        # Top-k por grupo y estadísticas en una pasada
+        matched = matched.sort_values(['grupo', 'apy'], ascending=[True, False])
+        grouped = matched.groupby('grupo')
+        top = grouped.head(top_k)
+        stats = pd.DataFrame({
+            "pools": grouped.size(),
+            "tvl_total": grouped['tvlUsd'].sum(),
+            "apy_mediana": grouped['apy'].median(),
+            "apy_max": grouped['apy'].max()
+        }).reindex(range(len(values)))
+        stats["pools"] = stats["pools"].fillna(0).astype(int)
+        stats.index = values
+
+        return top, stats
+
+    def format_comparison(self, top, stats, values):
+        """Tabla combinada: top-k de cada grupo con las estadísticas de su grupo"""
+        results_df = self.format_opportunities(top.drop(columns='grupo'))
+        groups = [values[g] for g in top['grupo']]
+        results_df.insert(1, "grupo", groups)
+        results_df["pools_grupo"] = [str(stats.at[g, "pools"]) for g in groups]
+        results_df["tvl_grupo"] = [f"${stats.at[g, 'tvl_total']:,.2f}" for g in groups]
+        results_df["apy_mediana_grupo"] = [f"{stats.at[g, 'apy_mediana']:.2f}%" for g in groups]
+        return results_df
+
+    def search_comparison(self, comparison):
+        """Busca oportunidades para cada grupo de una comparación"""
+        try:
+            opportunities, error = self.load_opportunities()
+            if error:
+                return None, None, error
+
+            with self.tracer.span("filter"):
+                top, stats = self.compare_opportunities(opportunities, comparison)
+
+            if len(top.index) == 0:
+                self.last_opportunities = []
+                return None, stats, "No se encontraron oportunidades que cumplan con los criterios en ninguno de los grupos."
+
+            with self.tracer.span("format"):
+                results_df = self.format_comparison(top, stats, comparison["values"])
+
+            return results_df, stats, None
+
+        except Exception as e:
+            return None, None, f"Error al comparar oportunidades DeFi: {str(e)}"
+
+    def process_diff_request(self, request, top_k=10):
+        """Responde con las pools nuevas o las mayores variaciones del feed"""
+        try:
+            opportunities, error = self.load_opportunities()
+            if error:
+                return error
+
+            if request["kind"] == "new":
+                changes = pool_feed.new_pools(request["since"])
+            else:
+                changes = pool_feed.movers(request["column"], request["since"])
+
+            if changes is None:
+                return ("Todavía no hay histórico de snapshots para comparar. "
+                        "Los cambios se calculan entre descargas consecutivas del feed de pools; vuelve a preguntar más tarde.")
+
+            with self.tracer.span("filter"):
+                # Pools del diff que ya no están en el snapshot actual (retiradas del feed) no se pueden mostrar
+                current = opportunities.drop_duplicates('pool').set_index('pool')
+                changes = changes[changes.index.isin(current.index)]
+                if request["chain"]:
+                    changes = changes[changes['chain_key'] == request["chain"].lower()]
+                if request["kind"] == "new":
+                    changes = changes.sort_values('apy', ascending=False)
+                else:
+                    changes = changes.sort_values('delta', ascending=request["ascending"])
+                    changes = changes[changes['delta'] < 0] if request["ascending"] else changes[changes['delta'] > 0]
+                changes = changes.head(top_k)
+
+            where = f" en {request['chain']}" if request["chain"] else ""
+            if len(changes.index) == 0:
+                if request["kind"] == "new":
+                    return f"No han aparecido pools nuevas{where} {request['label']}."
+                return f"No hay variaciones{where} {request['label']}."
+
+            with self.tracer.span("format"):
+                pools = current.loc[changes.index].reset_index()
+                results_df = self.format_opportunities(pools)
+                if request["kind"] == "movers":
+                    unit = "%" if request["column"] == "apy" else "$"
+                    if unit == "%":
+                        results_df["cambio"] = [f"{delta:+.2f} pp" for delta in changes['delta']]
+                    else:
+                        results_df["cambio"] = [f"{delta:+,.0f} $" for delta in changes['delta']]
+                    results_df["cambio_%"] = ["n/d" if pd.isna(pct) else f"{pct:+.1f}%" for pct in changes['delta_pct']]
+
+            if request["kind"] == "new":
+                message = f"Pools nuevas{where} {request['label']} (ordenadas por APY):"
+            else:
+                movement = "bajadas" if request["ascending"] else "subidas"
+                column = "APY" if request["column"] == "apy" else "TVL"
+                message = f"Mayores {movement} de {column}{where} {request['label']}:"
+            return message, "results", results_df
+
+        except Exception as e:
+            return f"Error al consultar los cambios del feed: {str(e)}"
+
+    def process_watchlist_command(self, action, name):
+        """Guarda, elimina, lista o revisa las watchlists del dueño del agente"""
+        if action == "remove":
+            if watchlists.remove(self.owner, name):
+                return f"Watchlist '{name}' eliminada."
+            return f"No tienes ninguna watchlist llamada '{name}'."
+
+        if action == "list":
+            saved = watchlists.for_owner(self.owner)
+            if not saved:
+                return "No tienes watchlists guardadas. Usa 'guardar búsqueda como <nombre>' para crear una."
+            rows = [{
+                "watchlist": watchlist.name,
+                "criterios": ", ".join(f"{key}={value}" for key, value in watchlist.criteria.items() if value),
+                "pools": len(watchlist.matches),
+                "nuevas": len(watchlist.pending)
+            } for watchlist in saved]
+            return "Tus watchlists guardadas:", "results", self.safe_dataframe_for_streamlit(pd.DataFrame(rows))
+
+        # Guardar y revisar novedades necesitan el snapshot actual
+        opportunities, error = self.load_opportunities()
+        if error:
+            return error
+
+        if action == "save":
+            if not any(self.state.values()):
+                return "No hay criterios para guardar. Primero realiza una búsqueda."
+            chain = None
+            if self.state["blockchain"]:
+                chain = self.chain_mapping.get(self.state["blockchain"].lower(), self.state["blockchain"])
+            # Protocolo y token se resuelven igual que en la búsqueda y se guardan ya resueltos
+            self.matching_rows(opportunities, self.state)
+            watchlist = watchlists.add(self.owner, name, self.state, chain, self.resolved)
+            return (f"Watchlist '{name}' guardada. Ahora mismo {len(watchlist.matches)} pools cumplen los criterios; "
+                    f"te avisaré de las nuevas cuando preguntes por las novedades.")
+
+        # Novedades desde la última vez que se consultaron
+        news = watchlists.take_new_matches(self.owner)
+        if not news:
+            return "No hay novedades en tus watchlists."
+
+        with self.tracer.span("format"):
+            names = {pool: name for name, pools in news.items() for pool in pools}
+            new_pools = opportunities[opportunities['pool'].isin(names.keys())].drop_duplicates('pool')
+            new_pools = new_pools.assign(watchlist=new_pools['pool'].map(names))
+            new_pools = new_pools.sort_values(['watchlist', 'apy'], ascending=[True, False])
+            results_df = self.format_opportunities(new_pools.drop(columns='watchlist'))
+            results_df.insert(1, "watchlist", new_pools['watchlist'].tolist())
+
+        summary = ", ".join(f"{name} ({len(pools)})" for name, pools in news.items())
+        return f"Nuevas pools en tus watchlists: {summary}", "results", results_df
+
+    def get_position_details(self, position_index):
+        """Obtiene los detalles completos de una posición específica"""
+        if not self.last_opportunities or position_index < 0 or position_index >= len(self.last_opportunities):
+            return None, "Posicion no disponible. Por favor, primero busca oportunidades."
+
+        # Obtener la posición solicitada
+        position = self.last_opportunities[position_index]
+
+        with self.tracer.span("format"):
+            return self.format_position_details(position), None  # Devolver detalles y None para el error
+
+    def format_position_details(self, position):
+        """Formatea todos los campos de una posición como tabla Característica/Valor"""
+        # Formatear todos los datos disponibles
+        formatted_position = {}
+        for key, value in position.items():
+            if key == 'tvlUsd':
+                formatted_position[key] = f"${value:,.2f}"
+            elif key in ['apy', 'apyBase', 'apyReward', 'apyPct1D', 'apyPct7D', 'apyPct30D', 'apyMean30d']:
+                if value is not None:
+                    formatted_position[key] = f"{value:.2f}%"
+                else:
+                    formatted_position[key] = "No disponible"
+            elif key == 'rewardTokens' and value:
+                formatted_position[key] = ", ".join(value) if value else "Ninguno"
+            elif key == 'underlyingTokens' and value:
+                formatted_position[key] = ", ".join(value) if value else "Ninguno"
+            else:
+                formatted_position[key] = str(value)  # Convertir todo a string
+
+        # Convertir a DataFrame para mostrarlo como tabla
+        detail_df = pd.DataFrame([formatted_position])
+        detail_df_transposed = detail_df.T.reset_index()
+        detail_df_transposed.columns = ['Característica', 'Valor']
+
+        # Asegurar compatibilidad con Arrow
+        detail_df_transposed = self.safe_dataframe_for_streamlit(detail_df_transposed)
+
+        return detail_df_transposed
+
+    def generate_comparative_chart(self):
+        """Genera un gráfico comparativo de la evolución del APY para las posiciones encontradas"""
+        if not self.last_opportunities:
+            return None, "No hay posiciones para comparar. Primero realiza una búsqueda."
+
+        try:
+            # Obtener datos históricos de cada posición
+            position_data = []
+            legends = []
+
+            for i, position in enumerate(self.last_opportunities):
+                if 'pool' not in position:
+                    continue
+
+                # Histórico de la pool (compartido con las sesiones que la pidan a la vez: no se modifica)
+                try:
+                    pool_df = fetch_chart(position['pool'], self.tracer)
+                except RuntimeError:
+                    continue
+
+                # Filtrar para los últimos 7 días
+                with self.tracer.span("filter"):
+                    last_7_days = datetime.now() - timedelta(days=7)
+                    pool_df = pool_df[pool_df['timestamp'] >= last_7_days]
+
+                # Si hay datos, añadirlos a la lista
+                if len(pool_df.index) > 0:  # Usar len() en vez de .empty
+                    position_data.append(pool_df)
+                    # Crear leyenda con información de la posición
+                    legend = f"{i+1}: {position['symbol']} ({position['project']} - {position['chain']})"
+                    legends.append(legend)
+
+            if not position_data:
+                return None, "No se pudieron obtener datos históricos para ninguna de las posiciones."
+
+            # Crear figura de Plotly
+            with self.tracer.span("figure"):
+                fig = self.build_comparative_figure(position_data, legends)
+
+            return fig, None
+
+        except Exception as e:
+            return None, f"Error al generar el gráfico comparativo: {str(e)}"
+
+    def build_comparative_figure(self, position_data, legends):
+        """Construye la figura de Plotly con una línea de APY por posición"""
+        # Plotly solo se carga cuando se pide un gráfico
+        import plotly.graph_objects as go
+
+        fig = go.Figure()
+
+        # Añadir línea para cada posición
+        for i, data in enumerate(position_data):
+            fig.add_trace(go.Scatter(
+                x=data['timestamp'],
+                y=data['apy'],
+                mode='lines+markers',
+                name=legends[i],
+                line=dict(width=2),
+                marker=dict(size=6)
+            ))
+
+        # Configurar el diseño del gráfico
+        fig.update_layout(
+            title="Evolución del APY en los últimos 7 días",
+            xaxis_title="Fecha",
+            yaxis_title="APY (%)",
+            legend_title="Posiciones",
+            template="plotly_white",
+            height=600
+        )
+
+        return fig
+
+    def process_query(self, query):
+        """Procesa la consulta del usuario de manera inteligente"""
+        self.tracer.start(query)
+        try:
+            return self._process_query(query)
+        finally:
+            self.tracer.finish()
+
+    def _process_query(self, query):
+        """Cuerpo de process_query, ejecutado dentro de una traza"""
+        query_lower = query.lower()
+
+        # Órdenes sobre watchlists (antes del reseteo: 'borrar watchlist x' no resetea)
+        watchlist_command = self.detect_watchlist_command(query)
+        if watchlist_command is not None:
+            return self.process_watchlist_command(*watchlist_command)
+
+        # Verificar si es una solicitud de reseteo
+        reset_words = ["reset", "resetear", "borrar", "limpiar", "reiniciar"]
+        is_reset = False
+        for word in reset_words:
+            if word in query_lower:
+                is_reset = True
+                break
+
+        if is_reset:
+            self.reset_state()
+            return "Variables reseteadas. Ahora puedes establecer nuevos criterios de búsqueda."
+
+        # Detectar el tipo de consulta (gráfico, detalles de posición o búsqueda)
+        with self.tracer.span("parse"):
+            comparison = self.detect_comparison(query)
+            diff_request = None if comparison is not None else self.detect_diff_request(query)
+            special = comparison is not None or diff_request is not None
+            is_chart = not special and self.detect_chart_request(query)
+            position_index = None if special or is_chart else self.detect_position_request(query)
+            updates = None if special or is_chart or position_index is not None else self.detect_all_variables(query)
+
+        # Comparación entre varios valores de un mismo criterio
+        if comparison is not None:
+            return self.process_comparison(comparison)
+
+        # Cambios del feed entre snapshots
+        if diff_request is not None:
+            return self.process_diff_request(diff_request)
+
+        # Solicitud de gráfico comparativo
+        if is_chart:
+            ai_message = self.get_ai_response("chart")
+            fig, error = self.generate_comparative_chart()
+            if error:
+                return f"{ai_message}\n\n{error}"
+            return f"{ai_message}\n\nGráfico comparativo de APY de las últimas oportunidades:", "chart", fig
+
+        # Verificar si el usuario está pidiendo detalles sobre una posición específica
+        if position_index is not None:
+            ai_message = self.get_ai_response("details")
+            details, error = self.get_position_details(position_index)
+            if error:
+                return f"{ai_message}\n\n{error}"
+            return f"{ai_message}\n\nDetalles de la posición {position_index + 1}:", "details", details
+
+        # Variables mencionadas en la consulta (detectadas arriba)
+        has_error = "error" in updates
+
+        if has_error:
+            return updates["error"]  # Devolver mensaje de error
+
+        # Actualizar estado sin mensajes
+        if updates:
+            self.update_state(updates)
+
+        # Añadir mensaje AI para búsqueda
+        ai_message = self.get_ai_response("search")
+
+        # Buscar y devolver resultados
+        results, error = self.search_defi_opportunities()
+        ai_message = self.with_resolution_notes(ai_message)
+
+        if error:
+            return f"{ai_message}\n\n{error}"
+
+        # Obtener comentario de resultado
+        result_comment = self.get_ai_response("result_comment")
+
+        # Generar análisis de resultados (sin operaciones booleanas con DataFrames)
+        result_analysis = ""
+        if results is not None:
+            if isinstance(results, pd.DataFrame) and len(results.index) > 0:
+                result_analysis = self.generate_result_analysis(results)
+            elif isinstance(results, list) and len(results) > 0:
+                result_analysis = self.generate_result_analysis(results)
+
+        # Combinar mensajes y resultados
+        if result_analysis != "":
+            return f"{ai_message}\n\n{result_comment} {result_analysis}", "results", results
+        else:
+            return f"{ai_message}\n\n{result_comment}", "results", results
+
+    def process_comparison(self, comparison):
+        """Responde a una consulta de comparación con una tabla combinada"""
+        if "error" in comparison:
+            return comparison["error"]
+
+        # Los criterios comunes se guardan como en una búsqueda normal; la dimensión comparada no
+        self.update_state(comparison["updates"])
+
+        ai_message = self.get_ai_response("search")
+        results, stats, error = self.search_comparison(comparison)
+        ai_message = self.with_resolution_notes(ai_message)
+
+        if error:
+            return f"{ai_message}\n\n{error}"
+
+        summary = []
+        for value, row in stats.iterrows():
+            if row["pools"] == 0:
+                summary.append(f"**{value}**: sin resultados")
+            else:
+                summary.append(f"**{value}**: {int(row['pools'])} pools, APY mediano {row['apy_mediana']:.2f}%, máximo {row['apy_max']:.2f}%")
+
+        return f"{ai_message}\n\nComparativa por {comparison['dimension']}:\n\n" + "\n\n".join(summary), "results", results
+
+    def reset_state(self):
+        """Resetea todas las variables a None"""
+        for key in self.state:
+            self.state[key] = None
+        self.last_opportunities = []
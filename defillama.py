@@ -0,0 +1,226 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import requests
+import urllib3
+import pandas as pd
+
+from query_trace import Tracer
+from single_flight import SingleFlight
+
+# DeFiLlama yields API (se puede apuntar a un servidor local de pruebas)
+YIELDS_API = os.environ.get("ROCKY_YIELDS_API", "https://yields.llama.fi").rstrip("/")
+POOLS_URL = f"{YIELDS_API}/pools"
+
+
+def chart_url(pool_id):
+    return f"{YIELDS_API}/chart/{pool_id}"
+
+
+# Codificaciones que se piden a la API: gzip/deflate, y br si está instalado brotli
+# (urllib3 descomprime las mismas que anuncia)
+ACCEPT_ENCODING = urllib3.util.request.ACCEPT_ENCODING
+
+# Segundos máximos de espera al conectar y entre datos recibidos de la API
+REQUEST_TIMEOUT = float(os.environ.get("ROCKY_REQUEST_TIMEOUT", "30"))
+
+# Históricos de pools guardados con sus validadores para revalidarlos con peticiones condicionales
+CHART_CACHE_SIZE = 256
+
+# Descargas concurrentes de la misma URL agrupadas en una sola (contadores en flights.stats())
+flights = SingleFlight()
+
+
+class TransferStats:
+    """Bytes recibidos de la API frente a los ahorrados por compresión y respuestas 304"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_transferred = 0
+        self.bytes_decoded = 0
+        self.bytes_saved = 0
+
+    def record(self, transferred, decoded, saved, not_modified=False):
+        with self._lock:
+            self.requests += 1
+            self.not_modified += int(not_modified)
+            self.bytes_transferred += transferred
+            self.bytes_decoded += decoded
+            self.bytes_saved += saved
+
+    def _counters(self):
+        return {
+            "requests": self.requests,
+            "not_modified": self.not_modified,
+            "bytes_transferred": self.bytes_transferred,
+            "bytes_decoded": self.bytes_decoded,
+            "bytes_saved": self.bytes_saved,
+        }
+
+    def stats(self):
+        with self._lock:
+            return self._counters()
+
+    def take_stats(self):
+        """Contadores desde la última llamada (y los pone a cero)"""
+        with self._lock:
+            stats = self._counters()
+            self._reset()
+        return stats
+
+
+transfer = TransferStats()
+
+
+def _get(url, tracer, validators=None):
+    """GET comprimido y, con validadores de una respuesta anterior, condicional.
+
+    Registra en el tracer y en `transfer` los bytes recibidos (comprimidos) y
+    los ahorrados: la diferencia con el cuerpo descomprimido o, en un 304, el
+    tamaño del cuerpo que ya se tenía.
+    """
+    validators = validators or {}
+    headers = {"Accept-Encoding": ACCEPT_ENCODING}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+
+    with tracer.span("download"):
+        response = requests.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+        body = response.content
+    try:
+        transferred = response.raw.tell()
+    except AttributeError:
+        transferred = len(body)
+
+    if response.status_code == 304:
+        saved = validators.get("body_bytes", 0)
+        transfer.record(transferred, 0, saved, not_modified=True)
+    else:
+        saved = max(len(body) - transferred, 0)
+        transfer.record(transferred, len(body), saved)
+    tracer.add_bytes("download", transferred)
+    tracer.add_bytes("saved", saved)
+    return response
+
+
+def _validators(response):
+    """ETag/Last-Modified de una respuesta y el tamaño del cuerpo (para contar lo ahorrado en un 304)"""
+    validators = {"body_bytes": len(response.content)}
+    if response.headers.get("ETag"):
+        validators["etag"] = response.headers["ETag"]
+    if response.headers.get("Last-Modified"):
+        validators["last_modified"] = response.headers["Last-Modified"]
+    return validators
+
+
+def _parse(response, tracer):
+    """Campo 'data' de una respuesta de la API; lanza RuntimeError si no es correcta"""
+    if response.status_code != 200:
+        raise RuntimeError(f"Error al consultar la API de DeFiLlama: {response.status_code}")
+
+    with tracer.span("json_parse"):
+        data = response.json()
+
+    if data.get("status") != "success" or "data" not in data:
+        raise RuntimeError("Error en la respuesta de la API de DeFiLlama")
+    return data["data"]
+
+
+def _fetch_pools(url, tracer, validators=None):
+    response = _get(url, tracer, validators)
+    if response.status_code == 304 and validators:
+        return None, validators
+    data = _parse(response, tracer)
+    with tracer.span("dataframe"):
+        return pd.DataFrame(data), _validators(response)
+
+
+def fetch_pools(url=POOLS_URL, tracer=None):
+    """Descarga el snapshot de pools de DeFiLlama como DataFrame.
+
+    Lanza una excepción si la API no responde correctamente. Con un tracer
+    se registran los tiempos de descarga y procesado y los bytes recibidos.
+    Las llamadas simultáneas a la misma URL comparten una sola descarga.
+    """
+    tracer = tracer or Tracer()
+    pools, _ = flights.do(url, lambda shared: _fetch_pools(url, shared), kind="pools", tracer=tracer)
+    return pools
+
+
+def fetch_pools_if_modified(url=POOLS_URL, tracer=None, validators=None):
+    """Como fetch_pools, pero condicional respecto a los validadores de la descarga anterior.
+
+    Devuelve (pools, validadores); pools es None si la API responde 304 (el
+    snapshot que se tiene sigue vigente y no se descarga ni se procesa nada).
+    """
+    tracer = tracer or Tracer()
+    validators = validators or {}
+    key = (url, validators.get("etag"), validators.get("last_modified"))
+    return flights.do(key, lambda shared: _fetch_pools(url, shared, validators), kind="pools", tracer=tracer)
+
+
+_charts = OrderedDict()
+_charts_lock = threading.Lock()
+
+
+def _fetch_chart(url, tracer):
+    with _charts_lock:
+        cached = _charts.get(url)
+    validators, chart = cached if cached else (None, None)
+
+    response = _get(url, tracer, validators)
+    if response.status_code == 304 and cached:
+        with _charts_lock:
+            if url in _charts:
+                _charts.move_to_end(url)
+        return chart
+
+    data = _parse(response, tracer)
+    with tracer.span("dataframe"):
+        chart = pd.DataFrame(data)
+        # Timestamps sin zona horaria
+        chart['timestamp'] = pd.to_datetime(chart['timestamp']).dt.tz_localize(None)
+
+    validators = _validators(response)
+    if "etag" in validators or "last_modified" in validators:
+        with _charts_lock:
+            _charts[url] = (validators, chart)
+            _charts.move_to_end(url)
+            while len(_charts) > CHART_CACHE_SIZE:
+                _charts.popitem(last=False)
+    return chart
+
+
+def fetch_chart(pool_id, tracer=None):
+    """Histórico de APY/TVL de una pool como DataFrame (compartido: no modificarlo).
+
+    Lanza RuntimeError si la API no responde correctamente. Las llamadas
+    simultáneas para la misma pool comparten una sola descarga, y un
+    histórico ya descargado se revalida con una petición condicional.
+    """
+    tracer = tracer or Tracer()
+    url = chart_url(pool_id)
+    return flights.do(url, lambda shared: _fetch_chart(url, shared), kind="chart", tracer=tracer)
+
+
+def load_pools_snapshot(path):
+    """Carga un snapshot de pools guardado (JSON de la API, Parquet o Feather)"""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.endswith(".feather") or path.endswith(".arrow"):
+        return pd.read_feather(path)
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data["data"]
+    return pd.DataFrame(data)
@@ -0,0 +1,249 @@
+"""Diccionario de entidades (chains, protocolos y tokens) generado del snapshot de pools.
+
+Todos los nombres y alias se compilan en un autómata Aho-Corasick, de modo
+que cada mensaje se recorre una sola vez carácter a carácter: el coste de la
+detección depende de la longitud del mensaje, no del número de entidades.
+"""
+import re
+import threading
+from collections import deque
+
+# Alias habituales -> nombre de la chain en DeFiLlama (en minúsculas)
+# (los tickers como 'avax' o 'bnb' no se incluyen: se interpretan como tokens)
+CHAIN_ALIASES = {
+    "binance": "bsc",
+    "bnb chain": "bsc",
+    "bnb smart chain": "bsc",
+    "avalanche c-chain": "avalanche",
+    "polygon pos": "polygon",
+    "op mainnet": "optimism",
+    "ethereum mainnet": "ethereum",
+    "arbitrum one": "arbitrum",
+}
+
+# Vocabulario de las consultas que nunca se interpreta como entidad
+# (hay símbolos y proyectos que coinciden con él: 'TOP', 'YIELD', 'POOL'...)
+QUERY_WORDS = {
+    "apy", "tvl", "token", "tokens", "pool", "pools", "protocolo", "protocolos", "protocol",
+    "blockchain", "blockchains", "cadena", "red", "chain", "chains", "top", "best", "mejor",
+    "mejores", "yield", "yields", "minimo", "mínimo", "mayor", "superior", "buscar", "busca",
+    "encontrar", "encuentra", "mostrar", "ver", "listar", "hallar", "compara", "comparar",
+    "vs", "versus", "frente", "nuevo", "nuevos", "nueva", "nuevas", "hoy", "semana", "hora",
+    "horas", "subidas", "bajadas", "stable", "stables", "watchlist", "novedades", "posicion",
+    "posición", "grafico", "gráfico", "historial", "reset", "reiniciar", "oportunidades",
+    "the", "what", "which", "are", "is", "on", "in", "with", "for", "and", "of", "to", "me",
+    "show", "find", "give", "high", "highest", "low", "new", "all", "any", "most", "min", "max",
+}
+
+# Longitud mínima de un símbolo o proyecto para entrar en el diccionario
+MIN_ENTITY_LENGTH = 2
+
+
+class AhoCorasick:
+    """Autómata multi-patrón: encuentra todas las apariciones de todos los patrones en una pasada"""
+
+    def __init__(self, patterns):
+        # patterns: {texto: payload}
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [()]
+        for pattern, payload in patterns.items():
+            node = 0
+            for char in pattern:
+                next_node = self.goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][char] = next_node
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append(())
+                node = next_node
+            self.out[node] = ((len(pattern), payload),)
+
+        # Enlaces de fallo por anchura; cada nodo hereda las salidas de su enlace
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and char not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(char, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def __len__(self):
+        return len(self.goto)
+
+    def iter(self, text):
+        """(inicio, fin, payload) de cada aparición, en orden de fin"""
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in out[state]:
+                yield position + 1 - length, position + 1, payload
+
+
+def _is_word_char(char):
+    return char.isalnum()
+
+
+class EntityMatch:
+    """Entidad encontrada en un mensaje; `kinds` es {tipo: nombre canónico}"""
+
+    def __init__(self, start, end, text, kinds):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.kinds = kinds
+
+    def __repr__(self):
+        return f"EntityMatch({self.text!r}, {self.kinds})"
+
+
+class EntityDictionary:
+    """Chains, protocolos y tokens conocidos, con sus alias, compilados en un autómata.
+
+    Las claves canónicas son los nombres del feed en minúsculas ('bsc',
+    'aave-v3', 'usdc'); un protocolo también se reconoce por su familia
+    ('aave' o 'aave v3') y con espacios en vez de guiones.
+    """
+
+    def __init__(self, chains, projects=(), symbols=(), aliases=CHAIN_ALIASES, from_snapshot=True):
+        self.from_snapshot = from_snapshot
+        self.chains = {}
+        self.projects = set()
+        self.tokens = set()
+        patterns = {}
+
+        def add(text, kind, value):
+            text = " ".join(text.lower().split())
+            if len(text) < MIN_ENTITY_LENGTH or text in QUERY_WORDS:
+                return
+            patterns.setdefault(text, {}).setdefault(kind, value)
+
+        for chain in chains:
+            if isinstance(chain, str) and chain.strip():
+                key = chain.lower()
+                self.chains[key] = chain
+                add(key, "chain", key)
+        for alias, key in aliases.items():
+            if key in self.chains:
+                add(alias, "chain", key)
+
+        for project in projects:
+            if isinstance(project, str) and project.strip():
+                key = project.lower()
+                self.projects.add(key)
+                add(key, "project", key)
+                spaced = re.sub(r'[-_]+', ' ', key)
+                add(spaced, "project", key)
+                # Familia: 'aave' para aave-v2/aave-v3 (la resuelve después entity_resolver)
+                family = spaced.split(" ")[0]
+                if len(family) > 3:
+                    add(family, "project", family)
+
+        for symbol in symbols:
+            if isinstance(symbol, str):
+                for part in re.split(r'[-/ _+]+', symbol.lower()):
+                    if part and not part.isdigit():
+                        self.tokens.add(part)
+                        add(part, "token", part)
+
+        self.automaton = AhoCorasick(patterns)
+
+    def match(self, text):
+        """Entidades del texto (ya en minúsculas): las más largas, sin solaparse y en límites de palabra"""
+        found = []
+        for start, end, kinds in self.automaton.iter(text):
+            if start > 0 and _is_word_char(text[start - 1]):
+                continue
+            if end < len(text) and _is_word_char(text[end]):
+                continue
+            found.append((start, -end, kinds))
+        found.sort(key=lambda item: (item[0], item[1]))
+
+        matches = []
+        last_end = 0
+        for start, neg_end, kinds in found:
+            if start < last_end:
+                continue
+            matches.append(EntityMatch(start, -neg_end, text[start:-neg_end], kinds))
+            last_end = -neg_end
+        return matches
+
+    def chain_key(self, word):
+        """Clave de la chain a la que se refiere una palabra o alias (None si no es una chain)"""
+        word = " ".join(word.lower().split())
+        if word in self.chains:
+            return word
+        key = CHAIN_ALIASES.get(word)
+        return key if key in self.chains else None
+
+    def kinds(self, word):
+        """Tipos de entidad de una palabra completa ({tipo: clave}); {} si no es una entidad"""
+        word = " ".join(word.lower().split())
+        matches = self.match(word)
+        if len(matches) == 1 and matches[0].text == word:
+            return matches[0].kinds
+        return {}
+
+    def chain_names(self, limit=20):
+        """Chains conocidas para los mensajes de error (las primeras `limit` y cuántas más hay)"""
+        names = sorted(self.chains)
+        if len(names) <= limit:
+            return ", ".join(names)
+        return ", ".join(names[:limit]) + f" y {len(names) - limit} más"
+
+
+_dictionary = None
+_dictionary_key = None
+_dictionary_pools = None
+_building = None
+_lock = threading.Lock()
+
+
+def _build(key, chains, projects, symbols):
+    """Compilación en segundo plano; si falla se sigue con el diccionario anterior"""
+    global _dictionary, _dictionary_key, _dictionary_pools, _building
+    try:
+        dictionary = EntityDictionary(chains, projects, symbols)
+        with _lock:
+            _dictionary, _dictionary_key = dictionary, key
+    except Exception:
+        with _lock:
+            # El siguiente snapshot vuelve a intentarlo
+            _dictionary_pools = None
+        raise
+    finally:
+        with _lock:
+            _building = None
+
+
+def dictionary_for(pools):
+    """Diccionario del snapshot; solo se recompila si cambian las chains, proyectos o símbolos distintos.
+
+    La primera compilación es síncrona y bajo el lock, de modo que las
+    llamadas concurrentes esperan a que termine; las siguientes se hacen en un
+    hilo y, mientras tanto, se sigue usando el diccionario anterior (al que
+    solo le faltan las entidades recién aparecidas).
+    """
+    global _dictionary, _dictionary_key, _dictionary_pools, _building
+    with _lock:
+        if pools is _dictionary_pools:
+            return _dictionary
+        chains = pools['chain'].dropna().unique()
+        projects = pools['project'].dropna().unique()
+        symbols = pools['symbol'].dropna().unique()
+        key = (hash(tuple(sorted(chains))), hash(tuple(sorted(projects))), hash(tuple(sorted(symbols))))
+        if _dictionary is None:
+            _dictionary, _dictionary_key = EntityDictionary(chains, projects, symbols), key
+        elif key != _dictionary_key and key != _building:
+            _building = key
+            threading.Thread(target=_build, args=(key, chains, projects, symbols),
+                             name="rocky-entity-dictionary", daemon=True).start()
+        _dictionary_pools = pools
+        return _dictionary
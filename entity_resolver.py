@@ -0,0 +1,146 @@
+import re
+import threading
+
+import numpy as np
+
+# Candidatos que se reordenan con distancia de edición tras el filtro por trigramas
+RERANK_CANDIDATES = 20
+
+# Puntuación mínima para aceptar una corrección aproximada
+MIN_FUZZY_SCORE = 0.6
+
+
+def normalize_name(text):
+    """Minúsculas con separadores (-, _, /, espacios) unificados en un espacio"""
+    return " ".join(re.split(r'[^a-z0-9.+]+', str(text).lower())).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_similarity(a, b):
+    """1 - distancia de Levenshtein normalizada por la longitud mayor"""
+    if a == b:
+        return 1.0
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return 1 - previous[-1] / max(len(a), len(b))
+
+
+class TrigramIndex:
+    """Índice invertido de trigramas sobre un conjunto de nombres distintos.
+
+    Una búsqueda cuenta los trigramas compartidos con todos los nombres con
+    un bincount sobre las listas de posting, y solo los mejores candidatos se
+    reordenan con distancia de edición.
+    """
+
+    def __init__(self, values):
+        self.values = sorted({value for value in values if isinstance(value, str) and value.strip()})
+        self.keys = [normalize_name(value) for value in self.values]
+
+        postings = {}
+        sizes = []
+        for position, key in enumerate(self.keys):
+            grams = trigrams(key)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        self.sizes = np.array(sizes, dtype=np.int32)
+
+        # Familias por primera palabra: 'aave' -> aave-v2, aave-v3, ...
+        self.exact = {}
+        self.families = {}
+        for value, key in zip(self.values, self.keys):
+            self.exact.setdefault(key, value)
+            self.families.setdefault(key.split(" ")[0], []).append(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def search(self, word, limit=5):
+        """Candidatos ordenados [(valor, puntuación 0-1)] para una palabra del usuario"""
+        query = normalize_name(word)
+        if not query or not self.values:
+            return []
+        grams = trigrams(query)
+        lists = [self.postings[gram] for gram in grams if gram in self.postings]
+        if not lists:
+            return []
+
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.values))
+        candidates = np.nonzero(counts)[0]
+        dice = 2 * counts[candidates] / (len(grams) + self.sizes[candidates])
+        best = candidates[np.argsort(-dice, kind='stable')[:RERANK_CANDIDATES]]
+
+        ranked = []
+        for position in best:
+            key = self.keys[position]
+            score = edit_similarity(query, key)
+            # Coincidencia con la primera palabra del nombre (ej: 'uniswap' en 'uniswap v3')
+            score = max(score, edit_similarity(query, key.split(" ")[0]) * 0.95)
+            ranked.append((self.values[position], round(score, 3)))
+        ranked.sort(key=lambda item: -item[1])
+        return ranked[:limit]
+
+    def resolve(self, word):
+        """Nombres a los que se refiere la palabra del usuario.
+
+        Devuelve (nombres, exacto): el nombre exacto si existe, todos los de
+        su familia si la palabra es la primera del nombre ('aave'), o la
+        mejor corrección aproximada si supera MIN_FUZZY_SCORE.
+        """
+        query = normalize_name(word)
+        if query in self.exact:
+            return [self.exact[query]], True
+        if query in self.families:
+            return list(self.families[query]), False
+        ranked = self.search(word, limit=1)
+        if ranked and ranked[0][1] >= MIN_FUZZY_SCORE:
+            best = normalize_name(ranked[0][0]).split(" ")[0]
+            # Si la corrección es la primera palabra, se toma la familia completa
+            if edit_similarity(query, best) >= MIN_FUZZY_SCORE and best in self.families:
+                return list(self.families[best]), False
+            return [ranked[0][0]], False
+        return [], False
+
+
+class EntityResolver:
+    """Índices de protocolos (project) y tokens (componentes de symbol) de un snapshot"""
+
+    def __init__(self, projects, symbols):
+        self.projects = TrigramIndex(projects)
+        tokens = set()
+        for symbol in symbols:
+            if isinstance(symbol, str):
+                tokens.update(part for part in re.split(r'[-/ _+]+', symbol) if part)
+        self.tokens = TrigramIndex(tokens)
+
+
+_resolver = None
+_resolver_key = None
+_resolver_pools = None
+_lock = threading.Lock()
+
+
+def resolver_for(pools):
+    """Resolver del snapshot; solo se reconstruye si cambian los protocolos o símbolos distintos"""
+    global _resolver, _resolver_key, _resolver_pools
+    with _lock:
+        if pools is _resolver_pools:
+            return _resolver
+        projects = pools['project'].dropna().unique()
+        symbols = pools['symbol'].dropna().unique()
+        key = (hash(tuple(sorted(projects))), hash(tuple(sorted(symbols))))
+        if key != _resolver_key:
+            _resolver = EntityResolver(projects, symbols)
+            _resolver_key = key
+        _resolver_pools = pools
+        return _resolver
@@ -0,0 +1,177 @@
+"""Agente LLM (LangChain pandas agent) sobre una vista reducida del feed de pools.
+
+En vez de pasar el DataFrame completo de DeFiLlama al agente, cada consulta
+se interpreta primero con el parser de reglas de CryptoAgent y el agente
+recibe solo las columnas relevantes y las filas candidatas. Las respuestas
+se cachean por (consulta normalizada, versión del snapshot).
+
+El LLM se inyecta, así que se puede probar con un modelo falso local:
+
+    from langchain_core.language_models.fake import FakeListLLM
+    agent = LLMPoolsAgent(FakeListLLM(responses=["Final Answer: ..."]), agent_type="zero-shot-react-description")
+"""
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+import pandas as pd
+
+from crypto_agent import CryptoAgent
+
+# Columnas que se pasan al agente (el resto del feed no aporta a las respuestas)
+LLM_COLUMNS = ['chain', 'project', 'symbol', 'tvlUsd', 'apy', 'apyBase', 'apyReward',
+               'apyMean30d', 'stablecoin', 'ilRisk', 'exposure', 'pool']
+
+# Filas candidatas como máximo (mitad por APY, mitad por TVL)
+MAX_ROWS = int(os.environ.get("ROCKY_LLM_MAX_ROWS", "200"))
+
+# Respuestas y agentes construidos que se conservan
+CACHE_SIZE = int(os.environ.get("ROCKY_LLM_CACHE_SIZE", "256"))
+AGENT_CACHE_SIZE = 16
+
+PROMPT_TEMPLATE = """
+Based on the DeFi Llama yields data, {query}.
+
+The dataframe is already pre-filtered to the pools relevant to this question.
+When analyzing this data:
+1. If the query mentions a token, chain, protocol, APY or TVL, filter accordingly
+2. For 'best' or 'top' queries, sort by APY in descending order
+3. Always limit results to 5 entries unless otherwise specified
+4. Format amounts with $ and % signs appropriately
+5. Provide specific investment insights and strategies when possible
+"""
+
+
+def normalize_query(query):
+    """Consulta en minúsculas, sin acentos, signos ni espacios repetidos"""
+    query = unicodedata.normalize('NFKD', query.lower())
+    query = "".join(c for c in query if not unicodedata.combining(c))
+    return " ".join(re.findall(r'[\w.%$-]+', query))
+
+
+def snapshot_version(pools):
+    """Hash del contenido relevante de un snapshot de pools"""
+    columns = [column for column in ('pool', 'apy', 'tvlUsd') if column in pools.columns]
+    return int(pd.util.hash_pandas_object(pools[columns], index=False).sum())
+
+
+class LRUCache:
+    """Diccionario LRU acotado y thread-safe con contadores de aciertos"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def build_pandas_agent(llm, view, agent_type=None):
+    """Agente pandas de LangChain sobre la vista reducida"""
+    from langchain_experimental.agents import create_pandas_dataframe_agent
+
+    if agent_type is None:
+        from langchain.agents.agent_types import AgentType
+        agent_type = AgentType.OPENAI_FUNCTIONS
+
+    return create_pandas_dataframe_agent(
+        llm,
+        view,
+        verbose=False,
+        agent_type=agent_type,
+        handle_parsing_errors=True,
+        allow_dangerous_code=True
+    )
+
+
+class LLMPoolsAgent:
+    """Responde consultas con un LLM sobre vistas reducidas del feed, con caché de respuestas"""
+
+    def __init__(self, llm, agent_type=None, max_rows=MAX_ROWS, cache_size=CACHE_SIZE, agent_factory=build_pandas_agent):
+        self.llm = llm
+        self.agent_type = agent_type
+        self.max_rows = max_rows
+        self.agent_factory = agent_factory
+        self.answers = LRUCache(cache_size)
+        self.agents = LRUCache(AGENT_CACHE_SIZE)
+
+    def parser(self, pools=None):
+        """CryptoAgent nuevo para cada llamada: solo se usan su parser de reglas y sus filtros.
+
+        El agente guarda estado por consulta (resolution_notes), así que no se
+        comparte entre los hilos que atienden consultas a la vez. Con pools,
+        las entidades se detectan sobre ese snapshot.
+        """
+        return CryptoAgent(snapshot=pools)
+
+    def criteria(self, query, pools=None):
+        """Criterios detectados por el parser de reglas (las blockchains no soportadas se ignoran)"""
+        parser = self.parser(pools)
+        updates = parser.detect_all_variables(query)
+        criteria = {key: None for key in parser.state}
+        criteria.update({key: value for key, value in updates.items() if key in criteria})
+        return criteria
+
+    def reduce(self, pools, criteria):
+        """Columnas relevantes y filas candidatas según los criterios"""
+        candidates = self.parser(pools).apply_criteria(pools, criteria)
+        if len(candidates.index) == 0:
+            # Criterios demasiado estrictos para el parser: el LLM decide sobre el feed completo
+            candidates = pools
+
+        columns = [column for column in LLM_COLUMNS if column in candidates.columns]
+        if len(candidates.index) > self.max_rows:
+            half = self.max_rows // 2
+            top = pd.concat([candidates.nlargest(half, 'apy'), candidates.nlargest(self.max_rows, 'tvlUsd')])
+            candidates = top[~top.index.duplicated()].head(self.max_rows)
+        return candidates[columns].reset_index(drop=True)
+
+    def ask(self, query, pools, version=None):
+        """Respuesta del LLM a la consulta; se reutiliza si ya se respondió con este snapshot"""
+        if version is None:
+            version = snapshot_version(pools)
+        key = (normalize_query(query), version)
+        answer = self.answers.get(key)
+        if answer is not None:
+            return answer
+
+        criteria = self.criteria(query, pools)
+        view_key = (tuple(sorted(criteria.items())), version)
+        agent = self.agents.get(view_key)
+        if agent is None:
+            agent = self.agent_factory(self.llm, self.reduce(pools, criteria), self.agent_type)
+            self.agents.put(view_key, agent)
+
+        result = agent.invoke({"input": PROMPT_TEMPLATE.format(query=query)})
+        answer = result["output"] if isinstance(result, dict) else str(result)
+        self.answers.put(key, answer)
+        return answer
+
+    def stats(self):
+        return {
+            "answers": len(self.answers),
+            "answer_hits": self.answers.hits,
+            "answer_misses": self.answers.misses,
+            "agents": len(self.agents),
+        }
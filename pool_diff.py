@@ -0,0 +1,200 @@
+import os
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# Columnas de cada pool que se siguen entre snapshots
+TRACKED_COLUMNS = ['chain', 'project', 'symbol', 'tvlUsd', 'apy']
+
+# Diffs que se conservan en memoria (con una descarga cada 5 minutos, un día)
+MAX_DIFFS = int(os.environ.get("ROCKY_DIFF_HISTORY", "288"))
+
+
+class SnapshotDiff:
+    """Cambios entre dos snapshots consecutivos del feed de pools.
+
+    Las pools se guardan como códigos enteros (posición en PoolFeed.ids) y
+    los deltas en float32, solo para las pools que han cambiado.
+    """
+
+    def __init__(self, taken_at, previous_at, added, removed, changed,
+                 apy_delta, apy_rel, tvl_delta, tvl_rel):
+        self.taken_at = taken_at
+        self.previous_at = previous_at
+        self.added = added
+        self.removed = removed
+        self.changed = changed
+        self.apy_delta = apy_delta
+        self.apy_rel = apy_rel
+        self.tvl_delta = tvl_delta
+        self.tvl_rel = tvl_rel
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.changed)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (
+            self.added, self.removed, self.changed, self.apy_delta, self.apy_rel, self.tvl_delta, self.tvl_rel
+        ))
+
+
+def _relative(delta, previous):
+    """Delta relativo (%); NaN cuando el valor anterior es 0 o no existe"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rel = np.where(previous != 0, delta / np.abs(previous) * 100, np.nan)
+    return rel.astype(np.float32)
+
+
+class PoolFeed:
+    """Último snapshot de pools del proceso y los diffs entre snapshots consecutivos.
+
+    Se guarda una sola copia reducida del feed (TRACKED_COLUMNS más claves en
+    minúsculas) compartida por todas las sesiones, en vez de una por sesión.
+    """
+
+    def __init__(self, max_diffs=MAX_DIFFS):
+        self.ids = pd.Index([], dtype=object)
+        self.current = None
+        self.taken_at = None
+        # Hora del primer snapshot: los cambios solo se conocen a partir de él
+        self.first_taken_at = None
+        self.diffs = deque(maxlen=max_diffs)
+        self._last_snapshot = None
+        self._lock = threading.Lock()
+
+    def _codes(self, pools):
+        """Código entero de cada id de pool; los ids nuevos se añaden al diccionario"""
+        codes = self.ids.get_indexer(pools)
+        unknown = codes == -1
+        if unknown.any():
+            new_ids = pd.Index(pools[unknown]).unique()
+            self.ids = self.ids.append(new_ids)
+            codes[unknown] = self.ids.get_indexer(pools[unknown])
+        return codes
+
+    def _reduce(self, snapshot):
+        """Columnas seguidas del snapshot, ordenadas por código de pool"""
+        pools = snapshot.drop_duplicates('pool')
+        codes = self._codes(pools['pool'].to_numpy(dtype=object))
+        frame = pd.DataFrame({
+            "code": codes,
+            "chain": pools['chain'].to_numpy(dtype=object),
+            "project": pools['project'].to_numpy(dtype=object),
+            "symbol": pools['symbol'].to_numpy(dtype=object),
+            "tvlUsd": pools['tvlUsd'].to_numpy(dtype=float),
+            "apy": pools['apy'].to_numpy(dtype=float),
+        }, index=pd.Index(pools['pool'].to_numpy(dtype=object), name='pool'))
+        frame = frame.assign(
+            chain_key=frame['chain'].str.lower().astype(object),
+            project_key=frame['project'].str.lower().astype(object),
+            symbol_key=frame['symbol'].str.lower().astype(object)
+        )
+        return frame.sort_values('code')
+
+    def update(self, snapshot, taken_at=None):
+        """Registra un snapshot nuevo y devuelve su diff con el anterior.
+
+        Devuelve None para el primer snapshot o si es el mismo DataFrame que
+        el último (snapshot fijo del modo batch).
+        """
+        with self._lock:
+            if snapshot is self._last_snapshot:
+                return None
+            self._last_snapshot = snapshot
+
+            current = self._reduce(snapshot)
+            taken_at = taken_at or datetime.now()
+            previous, previous_at = self.current, self.taken_at
+            self.current, self.taken_at = current, taken_at
+            if previous is None:
+                self.first_taken_at = taken_at
+                return None
+
+            # Alineación por código de pool (ambos lados ordenados)
+            cur_codes = current['code'].to_numpy()
+            prev_codes = previous['code'].to_numpy()
+            common, cur_pos, prev_pos = np.intersect1d(cur_codes, prev_codes, assume_unique=True, return_indices=True)
+            added = np.setdiff1d(cur_codes, prev_codes, assume_unique=True).astype(np.int32)
+            removed = np.setdiff1d(prev_codes, cur_codes, assume_unique=True).astype(np.int32)
+
+            def aligned(column):
+                return current[column].to_numpy()[cur_pos], previous[column].to_numpy()[prev_pos]
+
+            cur_apy, prev_apy = aligned('apy')
+            cur_tvl, prev_tvl = aligned('tvlUsd')
+            changed = ~(((cur_apy == prev_apy) | (np.isnan(cur_apy) & np.isnan(prev_apy)))
+                        & ((cur_tvl == prev_tvl) | (np.isnan(cur_tvl) & np.isnan(prev_tvl))))
+            for column in ('chain', 'project', 'symbol'):
+                a, b = aligned(column)
+                changed |= (a != b) & ~(pd.isna(a) & pd.isna(b))
+
+            apy_delta = (cur_apy - prev_apy)[changed]
+            tvl_delta = (cur_tvl - prev_tvl)[changed]
+            diff = SnapshotDiff(
+                taken_at, previous_at, added, removed, common[changed].astype(np.int32),
+                apy_delta.astype(np.float32), _relative(apy_delta, prev_apy[changed]),
+                tvl_delta.astype(np.float32), _relative(tvl_delta, prev_tvl[changed])
+            )
+            # Los diffs vacíos no se guardan para que la ventana cubra más tiempo
+            if len(diff):
+                self.diffs.append(diff)
+            return diff
+
+    def _since(self, since):
+        """Diffs desde `since` y snapshot actual; (None, None) si aún no se ha comparado ningún snapshot"""
+        with self._lock:
+            if self.current is None or self.taken_at == self.first_taken_at:
+                return None, None
+            return [diff for diff in self.diffs if since is None or diff.taken_at >= since], self.current
+
+    def new_pools(self, since=None):
+        """Pools del snapshot actual que han aparecido desde `since` (None si no hay histórico)"""
+        diffs, current = self._since(since)
+        if current is None:
+            return None
+        if not diffs:
+            return current.iloc[:0]
+        added = np.concatenate([diff.added for diff in diffs])
+        return current[current['code'].isin(added)]
+
+    def movers(self, column='apy', since=None):
+        """Pools actuales con su cambio neto (absoluto y %) en `column` ('apy' o 'tvlUsd') desde `since`.
+
+        Los deltas de diffs consecutivos se suman con bincount sobre los
+        códigos de pool, sin reconstruir snapshots intermedios.
+        """
+        diffs, current = self._since(since)
+        if current is None:
+            return None
+        if not diffs:
+            return current.iloc[:0].assign(delta=[], delta_pct=[])
+        deltas = 'apy_delta' if column == 'apy' else 'tvl_delta'
+        codes = np.concatenate([diff.changed for diff in diffs])
+        values = np.concatenate([getattr(diff, deltas) for diff in diffs]).astype(float)
+        # Los NaN (valor ausente en algún snapshot) no cuentan en el cambio neto
+        valid = ~np.isnan(values)
+        net = np.bincount(codes[valid], weights=values[valid], minlength=len(self.ids))
+        touched = np.bincount(codes[valid], minlength=len(self.ids)) > 0
+
+        current_codes = current['code'].to_numpy()
+        moved = current[touched[current_codes]]
+        delta = net[moved['code'].to_numpy()]
+        start = moved[column].to_numpy(dtype=float) - delta
+        return moved.assign(delta=delta, delta_pct=_relative(delta, start).astype(float))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pools": 0 if self.current is None else len(self.current.index),
+                "diffs": len(self.diffs),
+                "diff_bytes": sum(diff.nbytes for diff in self.diffs),
+                "first_diff_at": self.diffs[0].taken_at if self.diffs else None,
+            }
+
+
+# Compartido por todas las sesiones del proceso
+pool_feed = PoolFeed()
@@ -0,0 +1,121 @@
+import re
+import numpy as np
+import pandas as pd
+
+# Wrapped and bridged tokens are matched as their underlying asset
+SYMBOL_ALIASES = {
+    "WETH": "ETH",
+    "WBTC": "BTC",
+    "WSOL": "SOL",
+    "WMATIC": "MATIC",
+    "WAVAX": "AVAX",
+    "WBNB": "BNB",
+    "USDC.E": "USDC",
+}
+
+# Position chain names that differ from the DeFiLlama ones
+CHAIN_ALIASES = {
+    "binance": "bsc",
+    "bnb": "bsc",
+    "avax": "avalanche",
+    "matic": "polygon",
+}
+
+_VERSION_SUFFIX = re.compile(r'-v\d+$')
+
+
+def normalize_chain(chains):
+    chains = chains.astype(str).str.strip().str.lower()
+    return chains.replace(CHAIN_ALIASES)
+
+
+def normalize_project(projects):
+    """'Uniswap V3' -> 'uniswap-v3', matching the DeFiLlama project slugs"""
+    return projects.astype(str).str.strip().str.lower().str.replace(r'[\s_]+', '-', regex=True)
+
+
+def project_family(projects):
+    """'uniswap-v3' -> 'uniswap', 'meteora-dlmm' -> 'meteora'"""
+    return projects.str.replace(_VERSION_SUFFIX, '', regex=True).str.split('-').str[0]
+
+
+def normalize_symbol(symbols):
+    """Order-independent symbol key: 'ETH/cmETH' and 'CMETH-WETH' both become 'CMETH-ETH'"""
+    # Normalize each distinct symbol once and broadcast back through the codes
+    codes, uniques = pd.factorize(symbols.astype(str))
+    parts = pd.Series(uniques).str.upper().str.split(r'[-/\s+]+', regex=True)
+    keys = parts.map(lambda p: '-'.join(sorted(SYMBOL_ALIASES.get(s, s) for s in p if s)))
+    return pd.Series(keys.to_numpy()[codes], index=symbols.index)
+
+
+class PoolIndex:
+    """Normalized (chain, project, symbol) index over one pools snapshot.
+
+    Built once per snapshot. Each key keeps the pool with the highest TVL, which
+    is taken as the most likely pool for a position. Positions that do not match
+    on the exact project slug fall back to the project family (version suffix
+    and qualifiers stripped).
+    """
+
+    COLUMNS = ['pool', 'project', 'apy', 'apyMean30d']
+
+    def __init__(self, pools, version=None):
+        self.version = version
+        keys = pd.DataFrame({
+            'chain_key': normalize_chain(pools['chain']),
+            'project_key': normalize_project(pools['project']),
+            'symbol_key': normalize_symbol(pools['symbol']),
+            'tvlUsd': pools['tvlUsd'].astype(float),
+        })
+        keys['family_key'] = project_family(keys['project_key'])
+        for col in self.COLUMNS:
+            keys[col] = pools[col] if col in pools.columns else np.nan
+
+        ranked = keys.sort_values('tvlUsd', ascending=False, kind='stable')
+        self.exact = ranked.drop_duplicates(['chain_key', 'project_key', 'symbol_key']).drop(columns=['family_key'])
+        self.family = ranked.drop_duplicates(['chain_key', 'family_key', 'symbol_key']).drop(columns=['project_key'])
+
+    def match(self, positions):
+        """Pool, current APY, 30d mean APY and projected annual yield per position.
+
+        Returns a DataFrame aligned with the positions index; unmatched
+        positions get NaN.
+        """
+        # Match each distinct (chain, protocol, token) once and broadcast to the positions
+        key_columns = ['chain', 'protocol', 'token']
+        combined = np.zeros(len(positions), dtype=np.int64)
+        for col in key_columns:
+            col_codes, col_uniques = pd.factorize(positions[col])
+            combined = combined * (len(col_uniques) + 1) + col_codes + 1
+        _, first, codes = np.unique(combined, return_index=True, return_inverse=True)
+        combos = positions[key_columns].iloc[first]
+
+        keys = pd.DataFrame({
+            'chain_key': normalize_chain(combos['chain']).to_numpy(),
+            'project_key': normalize_project(combos['protocol']).to_numpy(),
+            'symbol_key': normalize_symbol(combos['token']).to_numpy(),
+        })
+        keys['family_key'] = project_family(keys['project_key'])
+
+        exact = keys.merge(self.exact, how='left', on=['chain_key', 'project_key', 'symbol_key'])
+        family = keys.merge(self.family, how='left', on=['chain_key', 'family_key', 'symbol_key'])
+
+        use_family = exact['pool'].isna().to_numpy()
+        matched = exact[self.COLUMNS].copy()
+        matched.loc[use_family, self.COLUMNS] = family.loc[use_family, self.COLUMNS].to_numpy()
+
+        result = matched.iloc[codes].rename(columns={'project': 'pool_project'})
+        result['apy'] = result['apy'].astype(float)
+        result['apyMean30d'] = result['apyMean30d'].astype(float)
+        result['projected_yield'] = positions['usd'].to_numpy() * result['apy'].to_numpy() / 100
+        result.index = positions.index
+        return result
+
+
+def weighted_apy(positions, matched):
+    """USD-weighted APY of the positions that matched a pool"""
+    has_apy = matched['apy'].notna()
+    usd = positions.loc[has_apy, 'usd']
+    if usd.sum() <= 0:
+        return None
+    return float((usd * matched.loc[has_apy, 'apy']).sum() / usd.sum())
@@ -0,0 +1,212 @@
+"""Snapshot de pools compartido por todos los procesos de Streamlit de una máquina.
+
+El último feed de DeFiLlama se escribe una sola vez en un fichero Arrow IPC
+(Feather v2, sin compresión) y cada proceso lo abre con memory-map en solo
+lectura: los buffers viven en la page cache y se comparten entre procesos.
+Las actualizaciones escriben un fichero temporal y lo sustituyen con
+os.replace, así que los lectores ven siempre un snapshot completo (los que
+ya tenían mapeado el anterior lo siguen usando hasta que lo sueltan).
+
+Un proceso recién arrancado encuentra el fichero y queda listo sin descargar.
+
+Junto al snapshot se guardan los validadores HTTP (ETag/Last-Modified) de la
+descarga que lo generó; al caducar se renueva con una petición condicional y,
+si la API responde 304, solo se marca como comprobado (sin descargar ni
+procesar el feed).
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from defillama import fetch_pools_if_modified, flights
+from query_trace import Tracer
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+SNAPSHOT_PATH = os.environ.get("ROCKY_POOLS_SNAPSHOT", os.path.join("data", "pools.arrow"))
+
+# Antigüedad a partir de la cual el snapshot se vuelve a descargar
+MAX_AGE_SECONDS = float(os.environ.get("ROCKY_POOLS_MAX_AGE", "300"))
+
+# Espera tras una descarga fallida antes de volver a intentarlo (se sirve el snapshot anterior)
+RETRY_SECONDS = 30
+
+
+def _to_table(pools):
+    """Tabla Arrow del feed; las columnas con tipos mezclados se guardan como texto"""
+    import pyarrow as pa
+
+    arrays = []
+    for column in pools.columns:
+        try:
+            arrays.append(pa.array(pools[column], from_pandas=True))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            values = pools[column]
+            arrays.append(pa.array(values.where(values.isna(), values.astype(str)), type=pa.string(), from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=[str(column) for column in pools.columns])
+
+
+def write_snapshot(pools, path=SNAPSHOT_PATH):
+    """Escribe el snapshot de forma atómica (fichero temporal + os.replace)"""
+    import pyarrow as pa
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    table = _to_table(pools)
+    try:
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return os.path.getsize(path)
+
+
+def read_snapshot(path=SNAPSHOT_PATH):
+    """DataFrame sobre el fichero mapeado en memoria.
+
+    Todas las columnas usan pd.ArrowDtype, de modo que siguen apuntando a
+    los buffers del mapeo (texto y columnas con nulos incluidos) en vez de
+    copiarse a objetos Python o arrays numpy en cada proceso.
+    """
+    import pyarrow as pa
+
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+class SharedSnapshot:
+    """Snapshot de pools del proceso, leído del fichero compartido y renovado cuando caduca"""
+
+    def __init__(self, path=SNAPSHOT_PATH, max_age=MAX_AGE_SECONDS, fetch=fetch_pools_if_modified):
+        self.path = path
+        # Validadores de la descarga del snapshot; su fecha de modificación es la de la última comprobación
+        self.meta_path = path + ".meta.json"
+        self.max_age = max_age
+        self.fetch = fetch
+        self.frame = None
+        self.taken_at = None
+        self.downloads = 0
+        self.not_modified = 0
+        self.loads = 0
+        self._stamp = None
+        self._retry_at = 0
+        self._lock = threading.Lock()
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _checked_at(self, stamp):
+        """Última vez que se descargó o se revalidó el snapshot (segundos epoch)"""
+        try:
+            return max(stamp[1] / 1e9, os.stat(self.meta_path).st_mtime)
+        except FileNotFoundError:
+            return stamp[1] / 1e9
+
+    def _is_fresh(self, stamp):
+        return stamp is not None and time.time() - self._checked_at(stamp) < self.max_age
+
+    def _read_validators(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_validators(self, validators):
+        """Guarda los validadores de forma atómica (y con ello la fecha de la comprobación)"""
+        tmp_path = f"{self.meta_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(validators, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _refresh(self, tracer):
+        """Revalida o descarga el feed y sustituye el fichero; solo un proceso a la vez lo hace"""
+        lock_file = open(self.path + ".lock", "a")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Otro proceso lo está renovando: se usa el fichero actual o se espera al primero
+                    if self._file_stamp() is not None:
+                        return
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Puede que otro proceso lo haya renovado mientras se esperaba
+                if self._is_fresh(self._file_stamp()):
+                    return
+
+            # Petición condicional solo si existe el snapshot al que se refieren los validadores
+            validators = self._read_validators() if self._file_stamp() is not None else {}
+            pools, validators = self.fetch(tracer=tracer, validators=validators)
+            if pools is None:
+                self.not_modified += 1
+            else:
+                with tracer.span("snapshot_write"):
+                    size = write_snapshot(pools, self.path)
+                tracer.add_bytes("snapshot", size)
+                self.downloads += 1
+            self._write_validators(validators)
+        finally:
+            lock_file.close()
+
+    def get(self, tracer=None):
+        """Pools actuales; descarga solo si el fichero compartido no existe o ha caducado.
+
+        Las sesiones que lo encuentran caducado a la vez esperan a una única
+        renovación. Si la descarga falla y hay un snapshot anterior, se sigue
+        usando este.
+        """
+        tracer = tracer or Tracer()
+        stamp = self._file_stamp()
+        if not self._is_fresh(stamp) and (stamp is None or time.time() >= self._retry_at):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            try:
+                flights.do(("snapshot", self.path), self._refresh, kind="snapshot", tracer=tracer)
+            except Exception:
+                if stamp is None:
+                    raise
+                self._retry_at = time.time() + RETRY_SECONDS
+
+        with self._lock:
+            stamp = self._file_stamp()
+            if stamp != self._stamp:
+                with tracer.span("snapshot"):
+                    self.frame = read_snapshot(self.path)
+                self._stamp = stamp
+                self.taken_at = datetime.fromtimestamp(stamp[1] / 1e9)
+                self.loads += 1
+            return self.frame
+
+    @property
+    def version(self):
+        return None if self.taken_at is None else self.taken_at.isoformat()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "taken_at": self.version,
+            "downloads": self.downloads,
+            "not_modified": self.not_modified,
+            "loads": self.loads,
+            "file_bytes": self._stamp[2] if self._stamp else 0,
+        }
+
+
+# Compartido por todas las sesiones del proceso (y, a través del fichero, por todos los procesos)
+shared_pools = SharedSnapshot()
@@ -0,0 +1,151 @@
+import os
+import sqlite3
+import datetime
+import threading
+from contextlib import closing
+import pandas as pd
+
+# SQLite file holding the snapshot history and its daily rollups
+HISTORY_DB = os.environ.get("ROCKY_HISTORY_DB", "data/history.sqlite")
+
+# Dimensions rolled up per day ('total' is the whole portfolio)
+ROLLUP_DIMENSIONS = ['wallet', 'chain', 'category', 'protocol']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    taken_at TEXT NOT NULL,
+    day TEXT NOT NULL,
+    positions INTEGER NOT NULL,
+    total_usd REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshot_positions (
+    snapshot_id INTEGER NOT NULL REFERENCES snapshots(id),
+    wallet TEXT, chain TEXT, category TEXT, protocol TEXT, token TEXT,
+    usd REAL
+);
+CREATE TABLE IF NOT EXISTS daily_rollups (
+    user TEXT NOT NULL,
+    day TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    item TEXT NOT NULL,
+    last_usd REAL NOT NULL,
+    min_usd REAL NOT NULL,
+    max_usd REAL NOT NULL,
+    sum_usd REAL NOT NULL,
+    samples INTEGER NOT NULL,
+    last_snapshot INTEGER NOT NULL,
+    PRIMARY KEY (user, dimension, day, item)
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_user_day ON snapshots(user, day);
+"""
+
+UPSERT_ROLLUP = """
+INSERT INTO daily_rollups (user, day, dimension, item, last_usd, min_usd, max_usd, sum_usd, samples, last_snapshot)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1, ?)
+ON CONFLICT (user, dimension, day, item) DO UPDATE SET
+    last_usd = excluded.last_usd,
+    min_usd = MIN(min_usd, excluded.min_usd),
+    max_usd = MAX(max_usd, excluded.max_usd),
+    sum_usd = sum_usd + excluded.sum_usd,
+    samples = samples + 1,
+    last_snapshot = excluded.last_snapshot
+"""
+
+# Items of the day missing from the latest snapshot count as 0 USD in it
+ZERO_MISSING = """
+UPDATE daily_rollups SET
+    last_usd = 0,
+    min_usd = MIN(min_usd, 0),
+    max_usd = MAX(max_usd, 0),
+    samples = samples + 1,
+    last_snapshot = ?
+WHERE user = ? AND day = ? AND last_snapshot != ?
+"""
+
+
+class SnapshotStore:
+    """Append-only portfolio snapshot history with incrementally updated daily rollups.
+
+    Each appended snapshot updates only the rollup rows of its own day (one
+    upsert per dimension item), so reading the history for a date range never
+    touches the raw snapshots.
+    """
+
+    def __init__(self, path=None, dimensions=None):
+        self.path = path or HISTORY_DB
+        self.dimensions = list(dimensions or ROLLUP_DIMENSIONS)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # closing() closes the connection; the connection's own context manager only commits
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def append(self, user, positions, taken_at=None):
+        """Records a snapshot of a user's positions and folds it into the daily rollups"""
+        taken_at = taken_at or datetime.datetime.now()
+        day = taken_at.date().isoformat()
+        total = float(positions['usd'].sum())
+
+        rows = []
+        for dim in self.dimensions:
+            if dim not in positions.columns:
+                continue
+            for item, usd in positions.groupby(dim)['usd'].sum().items():
+                rows.append((dim, str(item), float(usd)))
+        rows.append(('total', 'total', total))
+
+        columns = ['wallet', 'chain', 'category', 'protocol', 'token', 'usd']
+        records = positions.reindex(columns=columns)
+        records = records.astype(object).where(records.notna(), None)
+
+        with self._lock, closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO snapshots (user, taken_at, day, positions, total_usd) VALUES (?, ?, ?, ?, ?)",
+                (user, taken_at.isoformat(), day, len(positions), total)
+            )
+            snapshot_id = cursor.lastrowid
+            conn.executemany(
+                "INSERT INTO snapshot_positions VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(snapshot_id, *values) for values in records.itertuples(index=False, name=None)]
+            )
+            conn.executemany(
+                UPSERT_ROLLUP,
+                [(user, day, dim, item, usd, usd, usd, usd, snapshot_id) for dim, item, usd in rows]
+            )
+            conn.execute(ZERO_MISSING, (snapshot_id, user, day, snapshot_id))
+        return snapshot_id
+
+    def rollups(self, user, dimension, start, end):
+        """Daily rollups of one dimension between two dates (inclusive).
+
+        Returns a DataFrame with day, item, last_usd, min_usd, max_usd,
+        mean_usd and samples columns.
+        """
+        with closing(self._connect()) as conn:
+            result = pd.read_sql_query(
+                "SELECT day, item, last_usd, min_usd, max_usd, sum_usd / samples AS mean_usd, samples "
+                "FROM daily_rollups WHERE user = ? AND dimension = ? AND day BETWEEN ? AND ? "
+                "ORDER BY day, item",
+                conn,
+                params=(user, dimension, str(start), str(end))
+            )
+        result['day'] = pd.to_datetime(result['day'])
+        return result
+
+    def date_range(self, user):
+        """First and last day with snapshots for a user, or None"""
+        with closing(self._connect()) as conn:
+            first, last = conn.execute(
+                "SELECT MIN(day), MAX(day) FROM daily_rollups WHERE user = ? AND dimension = 'total'",
+                (user,)
+            ).fetchone()
+        if first is None:
+            return None
+        return datetime.date.fromisoformat(first), datetime.date.fromisoformat(last)
@@ -0,0 +1,142 @@
+import threading
+import numpy as np
+from collections import OrderedDict
+
+# Columns that get a selectbox in the Positions tab
+FILTER_COLUMNS = ['wallet', 'chain', 'category', 'protocol']
+
+
+class FilteredView:
+    """Result of a filter: row positions (in original order) and their USD total"""
+
+    def __init__(self, rows, total_usd):
+        self.rows = rows
+        self.total_usd = total_usd
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class PortfolioIndex:
+    """Precomputed filter index over a portfolio DataFrame.
+
+    Every value of the selector columns gets a packed row bitmap, and the USD
+    column gets a sorted index so the range slider is resolved by binary search.
+    Filtered views are memoized by their filter tuple (the index is shared by
+    every session of a user, so the memo is guarded by a lock).
+    """
+
+    def __init__(self, df, columns=None, value_column='usd', cache_size=64):
+        self.columns = list(columns or FILTER_COLUMNS)
+        self.value_column = value_column
+        self.n_rows = len(df)
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Per-value bitmaps: {column: {value: packed bits}}
+        self.bitmaps = {}
+        self.options = {}
+        for col in self.columns:
+            self.bitmaps[col] = self._build_bitmaps(df[col].to_numpy())
+            self.options[col] = sorted(self.bitmaps[col].keys())
+
+        # Sorted USD index for range queries
+        self.usd = df[value_column].to_numpy(dtype=float)
+        self.usd_order = np.argsort(self.usd, kind='stable')
+        self.usd_sorted = self.usd[self.usd_order]
+
+    def _build_bitmaps(self, values):
+        """Builds one packed bitmap per distinct value with a single sort"""
+        codes, uniques = _factorize(values)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+
+        bitmaps = {}
+        for code, value in enumerate(uniques):
+            bits = np.zeros(self.n_rows, dtype=bool)
+            bits[order[bounds[code]:bounds[code + 1]]] = True
+            bitmaps[value] = np.packbits(bits)
+        return bitmaps
+
+    @property
+    def nbytes(self):
+        """Memory held by the bitmaps and the USD index"""
+        bitmap_bytes = sum(b.nbytes for col in self.bitmaps.values() for b in col.values())
+        return bitmap_bytes + self.usd.nbytes + self.usd_order.nbytes + self.usd_sorted.nbytes
+
+    @property
+    def min_usd(self):
+        return float(self.usd_sorted[0]) if self.n_rows else 0.0
+
+    @property
+    def max_usd(self):
+        return float(self.usd_sorted[-1]) if self.n_rows else 0.0
+
+    def _usd_bitmap(self, usd_min, usd_max):
+        """Rows with usd in [usd_min, usd_max], found by binary search"""
+        start = np.searchsorted(self.usd_sorted, usd_min, side='left')
+        end = np.searchsorted(self.usd_sorted, usd_max, side='right')
+        bits = np.zeros(self.n_rows, dtype=bool)
+        bits[self.usd_order[start:end]] = True
+        return np.packbits(bits)
+
+    def filter(self, selections=None, usd_range=None):
+        """Returns the FilteredView for {column: value} selections and a USD range.
+
+        A selection of None or 'All' means no filter on that column.
+        """
+        selections = selections or {}
+        key = tuple(selections.get(col) for col in self.columns)
+        if usd_range is not None:
+            key += (float(usd_range[0]), float(usd_range[1]))
+
+        with self._lock:
+            view = self._cache.get(key)
+            if view is not None:
+                self._cache.move_to_end(key)
+                return view
+
+        combined = None
+        for col in self.columns:
+            value = selections.get(col)
+            if value is None or value == 'All':
+                continue
+            bitmap = self.bitmaps[col].get(value)
+            if bitmap is None:
+                combined = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+                break
+            combined = bitmap if combined is None else combined & bitmap
+
+        if usd_range is not None and (usd_range[0] > self.min_usd or usd_range[1] < self.max_usd):
+            usd_bits = self._usd_bitmap(usd_range[0], usd_range[1])
+            combined = usd_bits if combined is None else combined & usd_bits
+
+        if combined is None:
+            rows = np.arange(self.n_rows)
+        else:
+            rows = np.flatnonzero(np.unpackbits(combined, count=self.n_rows))
+
+        view = FilteredView(rows, float(self.usd[rows].sum()))
+        with self._lock:
+            self._cache[key] = view
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return view
+
+
+def _factorize(values):
+    """Integer codes and the distinct values they map to"""
+    uniques, codes = np.unique(values.astype(str), return_inverse=True)
+    return codes, uniques.tolist()
+
+
+def page_slice(df, view, page, page_size):
+    """Materializes only the rows of the requested page (1-based)"""
+    start = (page - 1) * page_size
+    return df.iloc[view.rows[start:start + page_size]]
+
+
+def page_count(view, page_size):
+    return max(1, -(-len(view) // page_size))
@@ -0,0 +1,211 @@
+import os
+import sys
+import threading
+import pandas as pd
+from collections import OrderedDict
+
+# Directory with one Parquet file per user ({user}.parquet)
+PORTFOLIO_DIR = os.environ.get("ROCKY_PORTFOLIO_DIR", "data/portfolios")
+
+# Memory ceiling of the shared portfolio cache, in MB
+CACHE_MAX_MB = float(os.environ.get("ROCKY_PORTFOLIO_CACHE_MB", "512"))
+
+# Demo portfolio served to users without their own partition
+DEMO_PORTFOLIO = [
+    {
+        "id": 1,
+        "wallet": "Wallet #1",
+        "chain": "base",
+        "protocol": "Uniswap V3",
+        "token": "ODOS",
+        "usd": 21.91
+    },
+    {
+        "id": 2,
+        "wallet": "Wallet #1",
+        "chain": "mantle",
+        "protocol": "Pendle V2",
+        "token": "ETH/cmETH",
+        "usd": 554.81
+    },
+    {
+        "id": 3,
+        "wallet": "Wallet #2",
+        "chain": "base",
+        "protocol": "aave",
+        "token": "USDT",
+        "usd": 2191
+    },
+    {
+        "id": 4,
+        "wallet": "Wallet #3",
+        "chain": "solana",
+        "protocol": "meteora",
+        "token": "JLP/SOL",
+        "usd": 551
+    },
+    {
+        "id": 5,
+        "wallet": "Wallet #1",
+        "chain": "ethereum",
+        "protocol": "Aave V3",
+        "token": "ETH",
+        "usd": 3.50
+    },
+]
+
+
+def read_user_portfolio(user, portfolio_dir=None):
+    """Reads the portfolio partition of a user, falling back to the demo portfolio"""
+    path = os.path.join(portfolio_dir or PORTFOLIO_DIR, f"{user}.parquet")
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    return pd.DataFrame(DEMO_PORTFOLIO)
+
+
+def sizeof(obj):
+    """Approximate memory footprint of a cached object in bytes"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    return sys.getsizeof(obj)
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = None
+        self.data_bytes = 0
+        # {name: (version, result, nbytes)}
+        self.aggregates = {}
+        self.nbytes = 0
+
+
+class PortfolioCache:
+    """Process-level LRU cache of per-user portfolios and their aggregates.
+
+    Shared by every Streamlit session in the process, so concurrent sessions of
+    the same user share one copy. Entries are evicted least recently used
+    first once the total size goes over max_bytes; when the user being served
+    is the only one left, its aggregates are dropped (they are recomputed on
+    demand) and only the portfolio itself is kept.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.dropped_aggregates = 0
+
+    def _entry(self, user):
+        with self._lock:
+            entry = self._entries.get(user)
+            if entry is None:
+                entry = _Entry()
+                self._entries[user] = entry
+            self._entries.move_to_end(user)
+            return entry
+
+    def _resize(self, user, entry, delta):
+        with self._lock:
+            entry.nbytes += delta
+            if self._entries.get(user) is entry:
+                self.total_bytes += delta
+            self._evict(keep=user)
+
+    def _evict(self, keep):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            user, entry = next(iter(self._entries.items()))
+            if user == keep:
+                self._entries.move_to_end(user)
+                user, entry = next(iter(self._entries.items()))
+            del self._entries[user]
+            self.total_bytes -= entry.nbytes
+            self.evictions += 1
+
+        # Only the user being served is left: its aggregates go before the portfolio does
+        entry = self._entries.get(keep)
+        if self.total_bytes > self.max_bytes and entry is not None:
+            for name in list(entry.aggregates):
+                _, _, nbytes = entry.aggregates.pop(name)
+                entry.nbytes -= nbytes
+                self.total_bytes -= nbytes
+                self.dropped_aggregates += 1
+
+    def get(self, user, loader):
+        """Portfolio of a user, loaded once with loader(user) and shared afterwards"""
+        entry = self._entry(user)
+        with entry.lock:
+            if entry.data is not None:
+                self.hits += 1
+                return entry.data
+            self.misses += 1
+            entry.data = loader(user)
+            entry.data_bytes = sizeof(entry.data)
+        self._resize(user, entry, entry.data_bytes)
+        return entry.data
+
+    def aggregate(self, user, name, func, loader, version=None):
+        """Result of func(portfolio) for a user, computed once and cached with the portfolio.
+
+        Only one result is kept per name: when `version` changes (e.g. a new
+        pools snapshot) the previous result is replaced, not kept alongside.
+        """
+        data = self.get(user, loader)
+        entry = self._entry(user)
+        with entry.lock:
+            cached = entry.aggregates.get(name)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+            result = func(data)
+            nbytes = sizeof(result)
+            # Swapped under the cache lock so eviction never sees a half-updated size
+            with self._lock:
+                previous = entry.aggregates.get(name)
+                entry.aggregates[name] = (version, result, nbytes)
+                delta = nbytes - (previous[2] if previous is not None else 0)
+                entry.nbytes += delta
+                if self._entries.get(user) is entry:
+                    self.total_bytes += delta
+                self._evict(keep=user)
+        return result
+
+    def drop_aggregate(self, user, name):
+        """Removes one cached aggregate of a user (it is recomputed on the next request)"""
+        with self._lock:
+            entry = self._entries.get(user)
+            if entry is None:
+                return
+            cached = entry.aggregates.pop(name, None)
+            if cached is not None:
+                entry.nbytes -= cached[2]
+                self.total_bytes -= cached[2]
+
+    def invalidate(self, user):
+        """Drops a user's portfolio and aggregates (e.g. after new data arrives)"""
+        with self._lock:
+            entry = self._entries.pop(user, None)
+            if entry is not None:
+                self.total_bytes -= entry.nbytes
+
+    def stats(self):
+        return {
+            "users": len(self._entries),
+            "total_mb": self.total_bytes / 1e6,
+            "max_mb": self.max_bytes / 1e6,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "dropped_aggregates": self.dropped_aggregates,
+        }
+
+
+# Shared by every session of this process
+portfolio_cache = PortfolioCache(int(CACHE_MAX_MB * 1e6))
@@ -0,0 +1,177 @@
+import os
+import threading
+import numpy as np
+import pandas as pd
+import requests
+
+# Local price snapshot (CSV, Parquet or JSON with token, chain, price columns)
+PRICES_PATH = os.environ.get("ROCKY_PRICES_PATH")
+
+# Local stand-in price service returning {"prices": [{"token", "chain", "price"}, ...]}
+PRICES_URL = os.environ.get("ROCKY_PRICES_URL")
+
+# Dimensions for which the revaluation delta is reported
+DELTA_DIMENSIONS = ['wallet', 'chain', 'category']
+
+
+def load_prices(path=None, url=None):
+    """Loads the price table from a file or the local price service.
+
+    Returns a DataFrame with token, chain and price columns, where an empty
+    chain means the price applies on every chain, or None if no source is
+    configured.
+    """
+    path = path or PRICES_PATH
+    url = url or PRICES_URL
+
+    if path:
+        if path.endswith('.parquet'):
+            prices = pd.read_parquet(path)
+        elif path.endswith('.json'):
+            prices = pd.read_json(path)
+        else:
+            prices = pd.read_csv(path)
+    elif url:
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        prices = pd.DataFrame(response.json()["prices"])
+    else:
+        return None
+
+    if 'chain' not in prices.columns:
+        prices['chain'] = None
+    # Re-listed tokens can appear more than once: the last row wins
+    return prices[['token', 'chain', 'price']].drop_duplicates(['token', 'chain'], keep='last')
+
+
+def prices_version(prices):
+    """Content hash of a price table, used as cache key for repriced portfolios"""
+    return int(pd.util.hash_pandas_object(prices, index=False).sum())
+
+
+class Repricer:
+    """Revalues portfolio positions against price snapshots.
+
+    Positions are joined to prices on token (case-insensitive), with a
+    chain-specific price taking precedence over a chain-less one. Token and
+    chain codes are computed once, so a revaluation is a couple of array
+    lookups. Positions without an 'amount' column get one inferred from their
+    usd value and the first price seen; positions that never get a price keep
+    their static usd value.
+    """
+
+    def __init__(self, positions, dimensions=None):
+        self.positions = positions
+        self.dimensions = [d for d in (dimensions or DELTA_DIMENSIONS) if d in positions.columns]
+        self._lock = threading.Lock()
+
+        self.token_codes, tokens = pd.factorize(positions['token'].astype(str).str.upper())
+        self.chain_codes, chains = pd.factorize(positions['chain'].astype(str).str.lower())
+        self.tokens = pd.Index(tokens)
+        self.chains = pd.Index(chains)
+        self.pair_keys = self.token_codes.astype(np.int64) * len(self.chains) + self.chain_codes
+
+        # Positions grouped by token code, to find the ones a price change touches
+        self._token_order = np.argsort(self.token_codes, kind='stable')
+        self._token_bounds = np.searchsorted(self.token_codes[self._token_order], np.arange(len(self.tokens) + 1))
+
+        self._dim_codes = {dim: pd.factorize(positions[dim]) for dim in self.dimensions}
+
+        self.static_usd = positions['usd'].to_numpy(dtype=float)
+        self.amount = positions['amount'].to_numpy(dtype=float) if 'amount' in positions.columns else None
+        self.price = np.full(len(positions), np.nan)
+        self.usd = self.static_usd.copy()
+
+        self._generic = np.full(len(self.tokens), np.nan)
+        self._pair_keys = np.empty(0, dtype=np.int64)
+        self._pair_prices = np.empty(0)
+        self.last_delta = None
+
+    def _price_arrays(self, prices):
+        """Per-token generic prices and sorted (token, chain) specific prices"""
+        token_idx = self.tokens.get_indexer(prices['token'].astype(str).str.upper())
+        chain = prices['chain']
+        has_chain = chain.notna().to_numpy() & (chain.astype(str).str.len() > 0).to_numpy()
+        chain_idx = self.chains.get_indexer(chain.astype(str).str.lower())
+        price = prices['price'].to_numpy(dtype=float)
+
+        generic = np.full(len(self.tokens), np.nan)
+        sel = (token_idx >= 0) & ~has_chain
+        generic[token_idx[sel]] = price[sel]
+
+        sel = (token_idx >= 0) & has_chain & (chain_idx >= 0)
+        keys = token_idx[sel].astype(np.int64) * len(self.chains) + chain_idx[sel]
+        order = np.argsort(keys, kind='stable')
+        keys, pair_prices = keys[order], price[sel][order]
+        # One price per (token, chain): duplicates (also differing only in case) keep the last row
+        last = np.ones(len(keys), dtype=bool)
+        last[:-1] = keys[1:] != keys[:-1]
+        return generic, keys[last], pair_prices[last]
+
+    def _lookup(self, rows, generic, pair_keys, pair_prices):
+        """Price of the given position rows"""
+        price = generic[self.token_codes[rows]]
+        if len(pair_keys):
+            keys = self.pair_keys[rows]
+            idx = np.minimum(np.searchsorted(pair_keys, keys), len(pair_keys) - 1)
+            found = pair_keys[idx] == keys
+            price[found] = pair_prices[idx[found]]
+        return price
+
+    def _changed_tokens(self, generic, pair_keys, pair_prices):
+        """Token codes whose generic or chain-specific price differs from the current one"""
+        changed = ~((generic == self._generic) | (np.isnan(generic) & np.isnan(self._generic)))
+        old = pd.Series(self._pair_prices, index=self._pair_keys)
+        new = pd.Series(pair_prices, index=pair_keys)
+        both = old.index.union(new.index)
+        pair_changed = ~old.reindex(both).fillna(-1).eq(new.reindex(both).fillna(-1))
+        pair_tokens = both[pair_changed.to_numpy()].to_numpy() // len(self.chains)
+        changed[pair_tokens] = True
+        return np.flatnonzero(changed)
+
+    def revalue(self, prices):
+        """Applies a price snapshot and returns the repriced positions frame.
+
+        Only positions whose token price changed are recomputed. The USD change
+        per dimension is kept in last_delta as {dimension: Series}.
+        """
+        with self._lock:
+            generic, pair_keys, pair_prices = self._price_arrays(prices)
+            tokens = self._changed_tokens(generic, pair_keys, pair_prices)
+            rows = np.concatenate(
+                [self._token_order[self._token_bounds[t]:self._token_bounds[t + 1]] for t in tokens]
+            ) if len(tokens) else np.empty(0, dtype=np.intp)
+
+            new_price = self._lookup(rows, generic, pair_keys, pair_prices)
+            if self.amount is None:
+                self.amount = np.full(len(self.positions), np.nan)
+            missing = np.isnan(self.amount[rows]) & ~np.isnan(new_price) & (new_price > 0)
+            self.amount[rows[missing]] = self.static_usd[rows[missing]] / new_price[missing]
+
+            new_usd = np.where(np.isnan(new_price) | np.isnan(self.amount[rows]),
+                               self.static_usd[rows], self.amount[rows] * new_price)
+            delta = new_usd - self.usd[rows]
+
+            self.price[rows] = new_price
+            self.usd[rows] = new_usd
+            self._generic, self._pair_keys, self._pair_prices = generic, pair_keys, pair_prices
+
+            self.last_delta = {
+                dim: pd.Series(
+                    np.bincount(codes[rows], weights=delta, minlength=len(uniques)),
+                    index=uniques
+                ).sort_values(key=np.abs, ascending=False)
+                for dim, (codes, uniques) in self._dim_codes.items()
+            }
+            return self.frame()
+
+    @property
+    def nbytes(self):
+        """Memory held by the position-level arrays"""
+        arrays = [self.token_codes, self.chain_codes, self.pair_keys, self._token_order,
+                  self.static_usd, self.price, self.usd]
+        return sum(a.nbytes for a in arrays)
+
+    def frame(self):
+        """Positions with the current usd, price and amount columns"""
+        return self.positions.assign(usd=self.usd.copy(), price=self.price.copy(), amount=self.amount.copy())
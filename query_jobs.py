@@ -0,0 +1,111 @@
+import itertools
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from query_trace import QueryCancelled
+
+# Hilos compartidos por todas las sesiones del proceso
+MAX_WORKERS = 8
+
+# Etapa que se muestra en el chat según el span abierto del agente
+STAGE_LABELS = {
+    "parse": "Interpretando la consulta",
+    "download": "Descargando datos de DeFiLlama",
+    "json_parse": "Procesando la respuesta",
+    "dataframe": "Procesando la respuesta",
+    "coalesced": "Esperando una descarga en curso",
+    "snapshot_write": "Guardando el snapshot compartido",
+    "snapshot": "Cargando el snapshot de pools",
+    "filter": "Filtrando oportunidades",
+    "format": "Preparando resultados",
+    "export": "Exportando resultados",
+    "figure": "Generando gráfico",
+}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="rocky-query")
+_ids = itertools.count(1)
+
+# Un agente solo procesa una consulta a la vez (su estado no es thread-safe)
+_agent_locks = weakref.WeakKeyDictionary()
+_agent_locks_guard = threading.Lock()
+
+
+def _agent_lock(agent):
+    with _agent_locks_guard:
+        lock = _agent_locks.get(agent)
+        if lock is None:
+            lock = _agent_locks[agent] = threading.Lock()
+        return lock
+
+
+class QueryJob:
+    """Consulta del agente ejecutándose en segundo plano.
+
+    La cancelación es cooperativa: la consulta se detiene al entrar en el
+    siguiente span del tracer, y el estado del agente se restaura.
+    """
+
+    def __init__(self, agent, query):
+        self.id = next(_ids)
+        self.agent = agent
+        self.query = query
+        self.submitted_at = time.time()
+        self.cancel_event = threading.Event()
+        self.running = False
+        self.future = None
+
+    def _run(self):
+        with _agent_lock(self.agent):
+            if self.cancel_event.is_set():
+                return None
+            agent = self.agent
+            saved_state = dict(agent.state)
+            saved_opportunities = agent.last_opportunities
+            agent.tracer.cancel_event = self.cancel_event
+            self.running = True
+            try:
+                return agent.process_query(self.query)
+            except QueryCancelled:
+                agent.state = saved_state
+                agent.last_opportunities = saved_opportunities
+                return None
+            finally:
+                self.running = False
+                agent.tracer.cancel_event = None
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.future.cancel()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self):
+        """Respuesta del agente, o None si la consulta se canceló"""
+        if self.future.cancelled():
+            return None
+        return self.future.result()
+
+    @property
+    def stage(self):
+        if not self.running:
+            return "En cola"
+        span = self.agent.tracer.current_span
+        return STAGE_LABELS.get(span, "Procesando")
+
+    @property
+    def elapsed(self):
+        return time.time() - self.submitted_at
+
+
+def submit_query(agent, query):
+    """Lanza process_query en segundo plano y devuelve el QueryJob"""
+    job = QueryJob(agent, query)
+    job.future = _executor.submit(job._run)
+    return job
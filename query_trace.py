@@ -0,0 +1,135 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+# Número de consultas recientes que se conservan
+MAX_TRACES = 20
+
+
+class QueryCancelled(BaseException):
+    """Se lanza al entrar en un span cuando la consulta en curso fue cancelada.
+
+    Hereda de BaseException para que los `except Exception` del agente no la
+    conviertan en un mensaje de error.
+    """
+
+
+class QueryTrace:
+    """Tiempos (spans con nombre) y contadores de bytes de una consulta"""
+
+    def __init__(self, query):
+        self.query = query
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.spans = []
+        self.bytes = {}
+        self.total_ms = None
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.spans.append({
+                "name": name,
+                "start_ms": round((start - self._t0) * 1000, 3),
+                "duration_ms": round((end - start) * 1000, 3)
+            })
+
+    def add_bytes(self, name, count):
+        self.bytes[name] = self.bytes.get(name, 0) + count
+
+    def finish(self):
+        self.total_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def merge(self, other):
+        """Añade los spans (en la escala de tiempo de esta traza) y los bytes de otra traza"""
+        offset = (other._t0 - self._t0) * 1000
+        for span in other.spans:
+            self.spans.append(dict(span, start_ms=round(span["start_ms"] + offset, 3)))
+        for name, count in other.bytes.items():
+            self.add_bytes(name, count)
+
+    def durations(self):
+        """Milisegundos totales por nombre de span"""
+        totals = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0) + span["duration_ms"]
+        return totals
+
+    def to_dict(self):
+        return {
+            "query": self.query,
+            "started_at": self.started_at,
+            "total_ms": self.total_ms,
+            "spans": self.spans,
+            "bytes": self.bytes
+        }
+
+
+class Tracer:
+    """Guarda las trazas de las últimas consultas procesadas por el agente"""
+
+    def __init__(self, max_traces=MAX_TRACES):
+        self.traces = deque(maxlen=max_traces)
+        self.current = None
+        # Span abierto en este momento (etapa de la consulta) y señal de cancelación
+        self.current_span = None
+        self.cancel_event = None
+
+    def start(self, query):
+        self.current = QueryTrace(query)
+        self.traces.append(self.current)
+        return self.current
+
+    @contextmanager
+    def span(self, name):
+        """Span sobre la consulta en curso (no hace nada si no hay ninguna)"""
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise QueryCancelled()
+        if self.current is None:
+            yield
+            return
+        previous, self.current_span = self.current_span, name
+        try:
+            with self.current.span(name):
+                yield
+        finally:
+            self.current_span = previous
+
+    def add_bytes(self, name, count):
+        if self.current is not None:
+            self.current.add_bytes(name, count)
+
+    def finish(self):
+        if self.current is not None:
+            self.current.finish()
+
+    def merge(self, trace):
+        """Incorpora a la consulta en curso una traza registrada aparte (ej: una descarga compartida)"""
+        if self.current is not None and trace is not None:
+            self.current.merge(trace)
+
+    def breakdown(self):
+        """DataFrame con una fila por consulta y una columna (ms) por span"""
+        rows = []
+        for trace in reversed(self.traces):
+            row = {"consulta": trace.query, "total_ms": trace.total_ms}
+            row.update(trace.durations())
+            row.update({f"bytes_{name}": count for name, count in trace.bytes.items()})
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    def to_jsonl(self):
+        return "".join(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n" for trace in self.traces)
+
+    def export(self, path):
+        """Añade las trazas actuales a un fichero JSONL"""
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(self.to_jsonl())
@@ -0,0 +1,174 @@
+import os
+import time
+import threading
+import tracemalloc
+from collections import deque
+
+# Profile every rerun of every session (otherwise admins enable it per session)
+PROFILE_ALL = os.environ.get("ROCKY_PROFILE", "0") == "1"
+
+# Reruns kept for the rolling histogram (shared by all sessions of the process)
+HISTORY_SIZE = 500
+
+# A profile not recorded after this long (the rerun was interrupted) no longer counts as active
+STALE_SECONDS = 120
+
+
+class RerunProfile:
+    """Consecutive sections of one script rerun with wall time and allocated memory.
+
+    tracemalloc is process-wide: a section only gets an allocation figure when
+    no other profile started or was running while it ran (allocated_kb is None
+    otherwise).
+    """
+
+    def __init__(self, user, profiler):
+        self.user = user
+        self.profiler = profiler
+        self.started_at = time.time()
+        self.sections = []
+        self._t0 = time.perf_counter()
+        self._current = None
+
+    @property
+    def allocations_available(self):
+        return all(section["allocated_kb"] is not None for section in self.sections)
+
+    def mark(self, name):
+        """Closes the running section and starts a new one called name"""
+        self._close()
+        generation = self.profiler.exclusive_generation()
+        if generation is not None:
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        else:
+            memory = 0
+        self._current = (name, time.perf_counter(), memory, generation)
+
+    def _close(self):
+        if self._current is None:
+            return
+        name, start, memory, generation = self._current
+        end = time.perf_counter()
+        allocated = None
+        if generation is not None and self.profiler.exclusive_generation() == generation:
+            allocated = (tracemalloc.get_traced_memory()[1] - memory) / 1024
+        self.sections.append({
+            "section": name,
+            "start_ms": (start - self._t0) * 1000,
+            "duration_ms": (end - start) * 1000,
+            "allocated_kb": allocated
+        })
+        self._current = None
+
+    def finish(self):
+        self._close()
+        self.total_ms = (time.perf_counter() - self._t0) * 1000
+
+
+class _NullProfile:
+    """Stand-in used when profiling is off, so marks cost nothing"""
+
+    def mark(self, name):
+        pass
+
+    def finish(self):
+        pass
+
+
+class RerunProfiler:
+    """Collects rerun profiles from every session and keeps a rolling window"""
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.history = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+        # Profiles of reruns in progress by session; tracing runs while there is at least one
+        self._active = {}
+        self._generation = 0
+        self._owns_tracing = False
+
+    def _prune(self):
+        """Forgets profiles of reruns that never got recorded; stops tracing if none is left"""
+        stale = time.time() - STALE_SECONDS
+        self._active = {key: profile for key, profile in self._active.items() if profile.started_at >= stale}
+        # Allocation tracing slows every session: it stops with the last profiled rerun
+        if not self._active and self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+
+    def exclusive_generation(self):
+        """Token that stays the same while a single profile is active (None if there are several)"""
+        with self._lock:
+            if len(self._active) != 1 or not tracemalloc.is_tracing():
+                return None
+            return self._generation
+
+    def start(self, user, enabled, session=None):
+        """Profile for the current rerun (a no-op stand-in when not enabled).
+
+        A new rerun of a session replaces its previous profile if that rerun
+        was interrupted before being recorded.
+        """
+        if not (enabled or PROFILE_ALL):
+            if self._active:
+                with self._lock:
+                    self._active.pop(session, None)
+                    self._prune()
+            return _NullProfile()
+        profile = RerunProfile(user, self)
+        with self._lock:
+            self._active.pop(session, None)
+            self._prune()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._owns_tracing = True
+            self._active[session if session is not None else id(profile)] = profile
+            self._generation += 1
+        return profile
+
+    def _release(self, profile):
+        with self._lock:
+            for key, active in list(self._active.items()):
+                if active is profile:
+                    del self._active[key]
+            self._prune()
+
+    def record(self, profile):
+        if isinstance(profile, RerunProfile):
+            profile.finish()
+            self._release(profile)
+            with self._lock:
+                self.history.append(profile)
+
+    def last(self, user=None):
+        with self._lock:
+            for profile in reversed(self.history):
+                if user is None or profile.user == user:
+                    return profile
+        return None
+
+    def section_stats(self):
+        """p50/p95/max wall time and mean allocation per section over the window"""
+        import pandas as pd
+
+        with self._lock:
+            rows = [s for profile in self.history for s in profile.sections]
+        if not rows:
+            return pd.DataFrame()
+        frame = pd.DataFrame(rows)
+        grouped = frame.groupby("section", sort=False)
+        return pd.DataFrame({
+            "reruns": grouped.size(),
+            "p50_ms": grouped["duration_ms"].median(),
+            "p95_ms": grouped["duration_ms"].quantile(0.95),
+            "max_ms": grouped["duration_ms"].max(),
+            "mean_alloc_kb": grouped["allocated_kb"].mean()
+        }).round(2).reset_index()
+
+    def totals(self):
+        with self._lock:
+            return [profile.total_ms for profile in self.history]
+
+
+# Shared by every session of this process
+rerun_profiler = RerunProfiler()
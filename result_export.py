@@ -0,0 +1,152 @@
+"""Exportación por partes de resultados completos a CSV o Parquet.
+
+Las filas se toman directamente del DataFrame de origen (snapshot de pools o
+portfolio cacheado) por posiciones y se escriben en bloques de CHUNK_ROWS:
+nunca se construye una copia completa del resultado ni una versión en texto,
+y en Parquet las columnas conservan su tipo.
+"""
+import os
+import tempfile
+
+import pandas as pd
+
+# Filas por bloque escrito
+CHUNK_ROWS = int(os.environ.get("ROCKY_EXPORT_CHUNK_ROWS", "50000"))
+
+# Formato -> (tipo MIME, extensión)
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+
+def iter_chunks(frame, rows=None, columns=None, chunk_rows=CHUNK_ROWS):
+    """Bloques del DataFrame con las filas (posiciones) y columnas pedidas"""
+    if columns is not None:
+        positions = [frame.columns.get_loc(column) for column in columns]
+    else:
+        positions = slice(None)
+    total = len(frame.index) if rows is None else len(rows)
+    for start in range(0, total, chunk_rows):
+        if rows is None:
+            yield frame.iloc[start:start + chunk_rows, positions]
+        else:
+            yield frame.iloc[rows[start:start + chunk_rows], positions]
+
+
+def _arrow_schema(frame, columns, as_text=()):
+    """Esquema Arrow inferido por columna; las columnas con tipos mezclados se exportan como texto"""
+    import pyarrow as pa
+
+    fields = []
+    as_text = set(as_text)
+    for column in columns:
+        values = frame[column]
+        if column in as_text:
+            fields.append(pa.field(str(column), pa.string()))
+            continue
+        if values.dtype != object:
+            fields.append(pa.field(str(column), pa.array(values.iloc[:0], from_pandas=True).type))
+            continue
+        # Columnas object: el tipo se deduce de una muestra de valores no nulos
+        try:
+            value_type = pa.array(values.dropna().iloc[:1000], from_pandas=True).type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            value_type = pa.null()
+        if pa.types.is_null(value_type):
+            value_type = pa.string()
+            as_text.add(column)
+        fields.append(pa.field(str(column), value_type))
+    return pa.schema(fields), as_text
+
+
+class _MixedColumn(Exception):
+    """Un bloque tiene en la columna valores que no encajan con el tipo deducido de la muestra"""
+
+    def __init__(self, column):
+        super().__init__(column)
+        self.column = column
+
+
+def _write_parquet_chunks(chunks, path, schema, columns, as_text):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in chunks:
+            arrays = []
+            for column, field in zip(columns, schema):
+                values = chunk[column]
+                if column in as_text:
+                    values = values.where(values.isna(), values.astype(str))
+                try:
+                    arrays.append(pa.array(values, type=field.type, from_pandas=True))
+                except (pa.ArrowInvalid, pa.ArrowTypeError, OverflowError):
+                    if column in as_text:
+                        raise
+                    raise _MixedColumn(column)
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(chunk.index)
+    return count
+
+
+def _write_parquet(frame, path, rows, columns, chunk_rows):
+    """Escribe el Parquet en un fichero temporal y lo mueve al final.
+
+    Si un bloque posterior no encaja con el tipo deducido de la muestra, la
+    columna pasa a exportarse como texto y se vuelve a escribir desde el
+    principio (como pools_snapshot._to_table con las columnas mezcladas).
+    """
+    tmp_path = f"{path}.tmp"
+    as_text = set()
+    try:
+        while True:
+            schema, as_text = _arrow_schema(frame, columns, as_text)
+            chunks = iter_chunks(frame, rows, columns, chunk_rows)
+            try:
+                count = _write_parquet_chunks(chunks, tmp_path, schema, columns, as_text)
+            except _MixedColumn as e:
+                as_text.add(e.column)
+                continue
+            os.replace(tmp_path, path)
+            return count
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def export_rows(frame, path, rows=None, columns=None, fmt=None, chunk_rows=CHUNK_ROWS):
+    """Escribe las filas indicadas (todas si rows es None) en CSV o Parquet por bloques.
+
+    El formato se deduce de la extensión si no se indica. Devuelve el número
+    de filas exportadas.
+    """
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "csv")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    columns = list(frame.columns if columns is None else columns)
+    if fmt == "parquet":
+        return _write_parquet(frame, path, rows, columns, chunk_rows)
+
+    chunks = iter_chunks(frame, rows, columns, chunk_rows)
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(f, header=header, index=False)
+            header = False
+            count += len(chunk.index)
+        if header:
+            pd.DataFrame(columns=columns).to_csv(f, index=False)
+    return count
+
+
+def export_to_tempfile(frame, fmt, name, rows=None, columns=None):
+    """Exporta a un fichero temporal con nombre estable (se sobrescribe en cada exportación).
+
+    Devuelve (ruta, filas exportadas).
+    """
+    path = os.path.join(tempfile.gettempdir(), f"{name}{FORMATS[fmt][1]}")
+    count = export_rows(frame, path, rows=rows, columns=columns, fmt=fmt)
+    return path, count
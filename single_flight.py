@@ -0,0 +1,99 @@
+"""Agrupación de descargas concurrentes idénticas (single-flight).
+
+Cuando varias sesiones piden la misma URL a la vez, solo la primera hace la
+petición; el resto espera a que termine y recibe el mismo resultado ya
+procesado (o la misma excepción). Las peticiones que llegan después de que
+la descarga haya terminado inician una nueva: no es una caché.
+
+La función se ejecuta con un tracer propio, sin la señal de cancelación de
+la sesión que la inicia: cancelar una consulta no aborta una descarga de la
+que dependen otras. Sus spans y bytes se copian después a la traza de esa
+sesión.
+
+Los resultados se comparten entre sesiones, así que no deben modificarse.
+"""
+import threading
+
+from query_trace import Tracer
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Ejecuta una sola vez cada clave en curso y reparte el resultado entre quienes la piden"""
+
+    def __init__(self):
+        self._flights = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _count(self, kind, name):
+        counters = self._counters.setdefault(kind, {"requests": 0, "downloads": 0, "coalesced": 0})
+        counters[name] += 1
+
+    def do(self, key, fn, kind="default", tracer=None):
+        """Resultado de fn(tracer) para la clave; si ya hay una llamada en curso con la misma clave, se espera a esa.
+
+        `kind` agrupa los contadores (ej: 'pools', 'chart'). fn recibe un
+        tracer nuevo, no cancelable; con un tracer, lo que registre se añade a
+        la consulta en curso y la espera de una descarga ajena se registra
+        como span 'coalesced'.
+        """
+        with self._lock:
+            self._count(kind, "requests")
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._count(kind, "downloads")
+            else:
+                flight.waiters += 1
+                self._count(kind, "coalesced")
+
+        if not leader:
+            if tracer is not None:
+                with tracer.span("coalesced"):
+                    flight.done.wait()
+            else:
+                flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        shared = Tracer(max_traces=1)
+        shared.start(kind)
+        try:
+            flight.result = fn(shared)
+        except BaseException as e:
+            # Incluidas las que no son Exception: quien espera no debe recibir un resultado vacío
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+            if tracer is not None:
+                tracer.merge(shared.current)
+        return flight.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._flights)
+
+    def stats(self):
+        """Contadores por tipo: peticiones, descargas reales y peticiones agrupadas en otra descarga"""
+        with self._lock:
+            return {kind: dict(counters) for kind, counters in self._counters.items()}
+
+    def take_stats(self):
+        """Contadores desde la última llamada (y los pone a cero)"""
+        with self._lock:
+            stats = {kind: dict(counters) for kind, counters in self._counters.items()}
+            self._counters = {}
+        return stats
@@ -0,0 +1,58 @@
+import importlib.util
+import os
+import random
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Settings are read at import time: everything the app writes goes to a scratch
+# directory and the yields API points at an address nothing listens on
+_scratch = tempfile.mkdtemp(prefix="rocky-tests-")
+os.environ.setdefault("ROCKY_HISTORY_DB", os.path.join(_scratch, "history.sqlite"))
+os.environ.setdefault("ROCKY_POOLS_SNAPSHOT", os.path.join(_scratch, "pools.arrow"))
+os.environ.setdefault("ROCKY_LOG_DIR", os.path.join(_scratch, "logs"))
+os.environ.setdefault("ROCKY_YIELDS_API", "http://127.0.0.1:9")
+
+
+def synthetic_pools(n, seed=0):
+    """Pools frame with the columns of the DeFiLlama feed"""
+    rng = random.Random(seed)
+    chains = ["Ethereum", "Arbitrum", "Base", "Solana", "Polygon", "BSC", "Optimism"]
+    projects = ["aave-v3", "uniswap-v3", "curve-dex", "pendle", "compound-v3", "meteora-dlmm"]
+    symbols = ["USDC", "ETH", "WETH", "WBTC", "USDC-WETH", "DAI", "SOL", "USDT"]
+    return pd.DataFrame({
+        "chain": [rng.choice(chains) for _ in range(n)],
+        "project": [rng.choice(projects) for _ in range(n)],
+        "symbol": [rng.choice(symbols) for _ in range(n)],
+        "tvlUsd": [rng.uniform(1e4, 1e8) for _ in range(n)],
+        "apy": [rng.uniform(0, 30) for _ in range(n)],
+        "apyBase": [rng.uniform(0, 10) for _ in range(n)],
+        "apyReward": [None] * n,
+        "apyMean30d": [rng.uniform(0, 30) for _ in range(n)],
+        "stablecoin": [rng.random() < 0.3 for _ in range(n)],
+        "ilRisk": ["no"] * n,
+        "exposure": ["single"] * n,
+        "pool": [f"pool-{i:06d}" for i in range(n)],
+        "underlyingTokens": [["0xabc"]] * n,
+        "poolMeta": [None] * n,
+    })
+
+
+@pytest.fixture
+def make_pools():
+    """Factory of synthetic pools frames: make_pools(n, seed=0)"""
+    return synthetic_pools
+
+
+@pytest.fixture(scope="session")
+def load_test():
+    """benchmarks/load_test.py (DeFiLlama API stub), loaded without adding benchmarks/ to sys.path"""
+    spec = importlib.util.spec_from_file_location("load_test", os.path.join(ROOT, "benchmarks", "load_test.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,31 @@
+"""Batch runs of the chat agent"""
+import pytest
+
+from agent_batch import run_batch
+
+QUERIES = [
+    {"id": 1, "query": "pools de usdc en arbitrum", "session": "a"},
+    # Same id as the first one, in another session
+    {"id": 1, "query": "token eth en base", "session": "b"},
+    # No id and no session
+    {"query": "protocolo aave en ethereum"},
+    {"id": 7, "query": "apy minimo 10", "session": "a"},
+    {"query": "token sol en solana"},
+    {"id": 7, "query": "token wbtc", "session": "c"},
+]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_results_follow_the_input_order(make_pools, workers):
+    results, stats = run_batch(QUERIES, make_pools(2000), workers=workers)
+    assert stats["queries"] == len(QUERIES)
+    assert [record["query"] for record in results] == [item["query"] for item in QUERIES]
+    assert [record["id"] for record in results] == [item.get("id") for item in QUERIES]
+    assert all(record["type"] == "results" for record in results)
+
+
+def test_sessions_keep_their_criteria(make_pools):
+    results, _ = run_batch(QUERIES, make_pools(2000), workers=2)
+    # The second query of session 'a' still filters on arbitrum and usdc
+    chains = {row["chain"] for row in results[3]["data"]}
+    assert chains == {"Arbitrum"}
@@ -0,0 +1,69 @@
+"""Vectorized concentration metrics against a per-portfolio pandas reference"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from concentration import compute_concentration, portfolio_concentration
+
+DIMENSIONS = ['chain', 'protocol']
+
+
+def positions_frame(n=400, portfolios=30, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'portfolio_id': rng.integers(0, portfolios, n),
+        'chain': rng.choice(['Ethereum', 'Arbitrum', 'Base', 'Solana'], n),
+        'protocol': rng.choice(['aave-v3', 'uniswap-v3', 'pendle'], n),
+        'usd': rng.uniform(1, 1000, n).round(2),
+    })
+    # An emptied portfolio (every position at 0 USD) next to a regular one
+    zeroed = pd.DataFrame({'portfolio_id': [portfolios] * 2, 'chain': ['Base', 'Solana'],
+                           'protocol': ['pendle', 'pendle'], 'usd': [0.0, 0.0]})
+    return pd.concat([frame, zeroed], ignore_index=True)
+
+
+def naive(positions):
+    rows = {}
+    for pid, group in positions.groupby('portfolio_id'):
+        total = group['usd'].sum()
+        row = {'positions': len(group.index), 'total_usd': total}
+        for dim in DIMENSIONS:
+            by_item = group.groupby(dim)['usd'].sum()
+            shares = by_item / total if total else by_item * np.nan
+            row[f'{dim}_count'] = len(by_item.index)
+            row[f'{dim}_hhi'] = (shares ** 2).sum() * 100 if total else np.nan
+            row[f'{dim}_top'] = shares.idxmax() if total else np.nan
+            row[f'{dim}_top_share'] = shares.max() * 100
+        rows[pid] = row
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+
+@pytest.mark.parametrize('workers, threshold', [(1, None), (2, 0)])
+def test_matches_naive_groupby(workers, threshold):
+    positions = positions_frame()
+    kwargs = {} if threshold is None else {'parallel_threshold': threshold}
+    result = compute_concentration(positions, dimensions=DIMENSIONS, workers=workers, **kwargs)
+    expected = naive(positions)
+
+    assert list(result.index) == list(expected.index)
+    for column in expected.columns:
+        if column.endswith('_top'):
+            assert result[column].fillna('-').tolist() == expected[column].fillna('-').tolist()
+        else:
+            np.testing.assert_allclose(result[column].to_numpy(dtype=float),
+                                       expected[column].to_numpy(dtype=float), rtol=1e-9, err_msg=column)
+
+
+def test_zero_total_portfolio_does_not_break_the_batch():
+    positions = pd.DataFrame({'portfolio_id': [1, 1, 2], 'chain': ['a', 'b', 'a'], 'usd': [10., 5., 0.]})
+    result = compute_concentration(positions, dimensions=['chain'])
+    assert result.loc[1, 'chain_top'] == 'a'
+    assert result.loc[1, 'chain_hhi'] == pytest.approx((4 / 9 + 1 / 9) * 100)
+    assert np.isnan(result.loc[2, 'chain_hhi'])
+    assert pd.isna(result.loc[2, 'chain_top'])
+
+
+def test_top_item_ties_keep_the_first_item():
+    metrics = portfolio_concentration(pd.DataFrame({'chain': ['b', 'a'], 'usd': [5., 5.]}), dimensions=['chain'])
+    assert metrics['chain_top'] == 'b'
+    assert metrics['chain_hhi'] == pytest.approx(50)
@@ -0,0 +1,76 @@
+"""Conditional revalidation of the shared pools snapshot against the load-test API stub"""
+import os
+import time
+from email.utils import formatdate
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import defillama  # noqa: E402
+from pools_snapshot import SharedSnapshot  # noqa: E402
+from query_trace import Tracer  # noqa: E402
+
+
+@pytest.fixture
+def stub(load_test):
+    stub = load_test.YieldsStub(pools=500, latency_ms=0, jitter_ms=0)
+    yield stub
+    stub.server.shutdown()
+
+
+def shared_snapshot(stub, path):
+    def fetch(tracer, validators):
+        return defillama.fetch_pools_if_modified(f"{stub.url}/pools", tracer, validators)
+    return SharedSnapshot(path=str(path), max_age=0.05, fetch=fetch)
+
+
+def query(snapshot):
+    tracer = Tracer()
+    tracer.start("pools")
+    return snapshot.get(tracer), tracer.current.bytes
+
+
+def test_expired_snapshot_is_revalidated_with_a_304(stub, tmp_path):
+    snapshot = shared_snapshot(stub, tmp_path / "pools.arrow")
+    first, first_bytes = query(snapshot)
+    assert len(first.index) == 500
+    assert first_bytes["download"] > 0 and first_bytes["snapshot"] > 0
+    stamp = snapshot._file_stamp()
+    validators = snapshot._read_validators()
+    assert validators["etag"] and validators["last_modified"]
+    checked_at = os.stat(snapshot.meta_path).st_mtime_ns
+    stub.take_counters()
+
+    time.sleep(0.1)
+    second, second_bytes = query(snapshot)
+
+    # The stub saw a conditional request and answered 304 without a body
+    assert stub.take_counters() == {"pools": 1, "chart": 0, "not_modified": 1, "bytes": 0}
+    assert second_bytes.get("download", 0) == 0
+    assert second_bytes["saved"] == validators["body_bytes"]
+    assert "snapshot" not in second_bytes
+    # The snapshot file was neither rewritten nor reloaded; the check was recorded
+    assert snapshot._file_stamp() == stamp
+    assert second is first
+    assert snapshot._read_validators() == validators
+    assert os.stat(snapshot.meta_path).st_mtime_ns > checked_at
+    assert snapshot.stats()["downloads"] == 1
+    assert snapshot.stats()["not_modified"] == 1
+    assert snapshot.stats()["loads"] == 1
+
+
+def test_changed_feed_is_downloaded_again(stub, load_test, tmp_path):
+    snapshot = shared_snapshot(stub, tmp_path / "pools.arrow")
+    first, _ = query(snapshot)
+    stub.pools_body = load_test.pools_payload(600)
+    stub.last_modified = formatdate(time.time() + 1, usegmt=True)
+    stub.take_counters()
+
+    time.sleep(0.1)
+    second, second_bytes = query(snapshot)
+    assert stub.take_counters()["not_modified"] == 0
+    assert second_bytes["download"] > 0
+    assert len(second.index) == 600
+    assert snapshot.stats()["downloads"] == 2
+    assert snapshot._read_validators()["last_modified"] == stub.last_modified
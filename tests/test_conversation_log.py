@@ -0,0 +1,51 @@
+"""Conversation log shared by several processes"""
+import multiprocessing
+import threading
+
+import pytest
+
+from conversation_log import ConversationLog
+
+
+def write_entries(directory, worker, count):
+    log = ConversationLog(directory=directory, flush_seconds=0.01, batch_size=5, max_bytes=2000)
+    for i in range(count):
+        log.log(page="test", session=f"s{worker}", user="u", event=f"{worker}-{i}")
+        if i % 7 == 0:
+            log.flush()
+    log.flush()
+
+
+def test_concurrent_processes_lose_no_entries(tmp_path):
+    pytest.importorskip("pyarrow")
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=write_entries, args=(str(tmp_path), worker, 200)) for worker in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    log = ConversationLog(directory=str(tmp_path))
+    events = [entry["event"] for entry in log.iter_entries()]
+    assert len(events) == len(set(events)) == 800
+    # Files were rotated and compacted while the other processes kept appending
+    assert any(path.endswith(".parquet") for path in log.files())
+
+
+def test_export_leaves_the_flush_to_the_writer_thread(tmp_path, monkeypatch):
+    log = ConversationLog(directory=str(tmp_path), flush_seconds=60)
+    flushed_by = []
+    flush = log.flush
+
+    def recording_flush():
+        flushed_by.append(threading.current_thread().name)
+        flush()
+
+    monkeypatch.setattr(log, "flush", recording_flush)
+    for i in range(3):
+        log.log(page="test", session="s", user="u", user_message=f"m{i}")
+
+    path = str(tmp_path / "export.jsonl")
+    assert log.export(path, session="s") == 3
+    assert flushed_by == ["rocky-conversation-log"]
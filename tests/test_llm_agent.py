@@ -0,0 +1,100 @@
+"""Parsing path of the LLM pandas agent, with a fake local LLM"""
+import threading
+
+import pytest
+
+from llm_agent import LLMPoolsAgent, normalize_query
+
+FakeListLLM = pytest.importorskip("langchain_core.language_models.fake").FakeListLLM
+
+
+class FakeAgent:
+    """Stand-in for the LangChain pandas agent: answers with the fake LLM and keeps its view"""
+
+    def __init__(self, llm, view):
+        self.llm = llm
+        self.view = view
+
+    def invoke(self, inputs):
+        return {"output": self.llm.invoke(inputs["input"])}
+
+
+def make_agent(responses=10, max_rows=200):
+    views = []
+
+    def factory(llm, view, agent_type):
+        views.append(view)
+        return FakeAgent(llm, view)
+
+    llm = FakeListLLM(responses=[f"answer {i}" for i in range(responses)])
+    return LLMPoolsAgent(llm, max_rows=max_rows, agent_factory=factory), views
+
+
+@pytest.fixture
+def pools(make_pools):
+    return make_pools(5000)
+
+
+def test_normalize_query():
+    assert normalize_query("  Mejores  pools en Arbitrum?! ") == "mejores pools en arbitrum"
+
+
+def test_criteria_from_rule_parser(pools):
+    agent, _ = make_agent()
+    criteria = agent.criteria("token USDC en arbitrum con apy minimo 10", pools)
+    assert criteria["blockchain"] == "arbitrum"
+    assert criteria["token"].lower() == "usdc"
+    assert float(criteria["apy_min"]) == 10
+    assert criteria["protocol"] is None
+
+
+def test_view_only_has_candidate_rows_and_llm_columns(pools):
+    agent, views = make_agent(max_rows=50)
+    agent.ask("token USDC en arbitrum", pools)
+    view = views[0]
+    assert 0 < len(view.index) <= 50
+    assert set(view["chain"].str.lower()) == {"arbitrum"}
+    assert view["symbol"].str.contains("USDC").all()
+    assert "underlyingTokens" not in view.columns
+
+
+def test_protocol_family_resolved_like_the_chat(pools):
+    agent, views = make_agent()
+    agent.ask("protocolo aave", pools)
+    assert set(views[0]["project"]) == {"aave-v3"}
+
+
+def test_answers_and_agents_are_cached(pools):
+    agent, views = make_agent()
+    first = agent.ask("token ETH en base", pools, version=1)
+    # Same question, differently written: cached answer, no new agent or LLM call
+    assert agent.ask("Token  eth en BASE", pools, version=1) == first
+    assert len(views) == 1
+    # New snapshot version: new view and a fresh answer
+    assert agent.ask("token ETH en base", pools, version=2) != first
+    assert len(views) == 2
+    assert agent.stats()["answer_hits"] == 1
+
+
+def test_concurrent_queries_get_their_own_criteria(pools):
+    agent, views = make_agent(responses=100)
+    chains = ["arbitrum", "base", "solana", "ethereum", "polygon", "optimism"]
+    errors = []
+
+    def ask(chain):
+        try:
+            for _ in range(5):
+                agent.ask(f"pools usdc en {chain}", pools, version=chain)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=ask, args=(chain,)) for chain in chains]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    seen = {view["chain"].str.lower().unique()[0] for view in views}
+    assert seen == set(chains)
+    assert all(view["chain"].str.lower().nunique() == 1 for view in views)
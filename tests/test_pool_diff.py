@@ -0,0 +1,109 @@
+"""Feed diffs against a snapshot-by-snapshot pandas comparison"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import crypto_agent
+from crypto_agent import CryptoAgent
+from pool_diff import PoolFeed
+
+START = datetime(2026, 1, 1)
+
+
+def snapshots(steps=4, pools=200, seed=0):
+    """Consecutive snapshots: every step some pools disappear, some appear and some change APY/TVL"""
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'pool': [f'p{i}' for i in range(pools)],
+        'chain': rng.choice(['Ethereum', 'Arbitrum', 'Base'], pools),
+        'project': rng.choice(['aave-v3', 'pendle'], pools),
+        'symbol': rng.choice(['USDC', 'ETH'], pools),
+        'tvlUsd': rng.uniform(1e4, 1e7, pools).round(0),
+        'apy': rng.uniform(0, 20, pools).round(3),
+        'ilRisk': 'no',
+        'exposure': 'single',
+    })
+    result = [frame]
+    next_id = pools
+    for _ in range(steps - 1):
+        frame = frame.drop(rng.choice(frame.index, 10, replace=False))
+        changed = rng.choice(frame.index, 30, replace=False)
+        frame.loc[changed, 'apy'] = (frame.loc[changed, 'apy'] + rng.normal(0, 2, 30)).round(3)
+        frame.loc[changed, 'tvlUsd'] = (frame.loc[changed, 'tvlUsd'] * rng.uniform(0.5, 1.5, 30)).round(0)
+        new = result[0].sample(10, random_state=int(rng.integers(1 << 30))).assign(
+            pool=[f'p{i}' for i in range(next_id, next_id + 10)])
+        next_id += 10
+        frame = pd.concat([frame, new], ignore_index=True)
+        result.append(frame)
+    return result
+
+
+def feed_of(frames):
+    feed = PoolFeed()
+    for step, frame in enumerate(frames):
+        feed.update(frame, START + timedelta(hours=step))
+    return feed
+
+
+@pytest.mark.parametrize('since_step', [1, 2, 3])
+def test_new_pools_match_naive_set_difference(since_step):
+    frames = snapshots()
+    feed = feed_of(frames)
+    current = set(frames[-1]['pool'])
+    expected = set()
+    for before, after in zip(frames[since_step - 1:-1], frames[since_step:]):
+        expected |= set(after['pool']) - set(before['pool'])
+
+    new = feed.new_pools(START + timedelta(hours=since_step))
+    assert set(new.index) == expected & current
+
+
+@pytest.mark.parametrize('column', ['apy', 'tvlUsd'])
+def test_movers_match_naive_step_deltas(column):
+    frames = snapshots()
+    feed = feed_of(frames)
+    net = {}
+    for before, after in zip(frames, frames[1:]):
+        joined = after.set_index('pool')[['apy', 'tvlUsd']].join(
+            before.set_index('pool')[['apy', 'tvlUsd']], rsuffix='_before', how='inner')
+        moved = (joined['apy'] != joined['apy_before']) | (joined['tvlUsd'] != joined['tvlUsd_before'])
+        for pool, delta in (joined[column] - joined[f'{column}_before'])[moved].items():
+            net[pool] = net.get(pool, 0.0) + delta
+    current = frames[-1].set_index('pool')[column]
+    expected = pd.Series(net)[lambda s: s.index.isin(current.index)].sort_index()
+
+    movers = feed.movers(column).sort_index()
+    assert list(movers.index) == list(expected.index)
+    np.testing.assert_allclose(movers['delta'], expected, rtol=1e-5, atol=1e-2 if column == 'tvlUsd' else 1e-4)
+    start = current[expected.index] - expected
+    pct = np.where(start != 0, expected / start.abs() * 100, np.nan)
+    np.testing.assert_allclose(movers['delta_pct'], pct, rtol=1e-3)
+
+
+def test_no_history_yet():
+    feed = feed_of(snapshots()[:1])
+    assert feed.new_pools() is None
+    assert feed.movers() is None
+
+
+def test_diff_answer_skips_pools_missing_from_the_current_snapshot(monkeypatch):
+    frames = snapshots(steps=2)
+    # The shared feed moved on (another session refreshed it) while this agent still has
+    # a snapshot without some of the new pools
+    feed = feed_of(frames)
+    monkeypatch.setattr(crypto_agent, 'pool_feed', feed)
+    new = feed.new_pools()
+    gone = list(new.index[:3])
+    stale = frames[-1][~frames[-1]['pool'].isin(gone)]
+    agent = CryptoAgent(snapshot=stale)
+    monkeypatch.setattr(agent, 'load_opportunities', lambda: (stale, None))
+
+    request = {'kind': 'new', 'since': None, 'chain': None, 'label': 'hoy'}
+    message, kind, results = agent.process_diff_request(request, top_k=50)
+    assert kind == 'results'
+    assert len(results.index) == len(new.index) - len(gone)
+
+    request = {'kind': 'movers', 'column': 'apy', 'ascending': False, 'since': None, 'chain': None, 'label': 'hoy'}
+    assert agent.process_diff_request(request)[1] == 'results'
@@ -0,0 +1,45 @@
+"""Shared pools snapshot file"""
+import pandas as pd
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+
+from pools_snapshot import read_snapshot, write_snapshot  # noqa: E402
+
+
+def pools_frame():
+    return pd.DataFrame({
+        "pool": ["a", "b", "c"],
+        "chain": ["Ethereum", None, "Base"],
+        "tvlUsd": [1e6, 2e6, 3e6],
+        "apy": [5.0, None, 7.5],
+        "stablecoin": [True, False, True],
+        "underlyingTokens": [["0x1"], None, ["0x2", "0x3"]],
+        # Mixed types are stored as text
+        "poolMeta": ["x", 1, None],
+    })
+
+
+def test_columns_are_arrow_backed_views_of_the_mapping(tmp_path):
+    path = str(tmp_path / "pools.arrow")
+    size = write_snapshot(pd.concat([pools_frame()] * 10000, ignore_index=True), path)
+
+    allocated = pa.total_allocated_bytes()
+    frame = read_snapshot(path)
+    # Text, nullable and nested columns are not copied: the buffers are the memory-mapped file
+    assert all(isinstance(dtype, pd.ArrowDtype) for dtype in frame.dtypes)
+    assert pa.total_allocated_bytes() - allocated < 1024 < size // 100
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "pools.arrow")
+    write_snapshot(pools_frame(), path)
+    frame = read_snapshot(path)
+
+    assert frame["pool"].tolist() == ["a", "b", "c"]
+    assert frame["chain"].isna().tolist() == [False, True, False]
+    assert frame["apy"].to_numpy(dtype=float, na_value=float("nan"))[2] == 7.5
+    assert frame["tvlUsd"].sum() == 6e6
+    assert frame["poolMeta"].tolist()[:2] == ["x", "1"]
+    assert frame["underlyingTokens"].iloc[2] == ["0x2", "0x3"]
+    assert frame["chain"].str.lower().tolist()[0] == "ethereum"
@@ -0,0 +1,75 @@
+"""Snapshot history and its incremental daily rollups"""
+import datetime
+import sqlite3
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_history import SnapshotStore
+
+DAY = datetime.datetime(2026, 3, 2, 9)
+
+
+def positions(rows):
+    return pd.DataFrame(rows, columns=['wallet', 'chain', 'category', 'protocol', 'token', 'usd'])
+
+
+SNAPSHOTS = [
+    positions([('w1', 'base', 'Stablecoin', 'aave', 'USDC', 100.0), ('w2', 'solana', 'Altcoin', 'jup', 'JUP', 50.0)]),
+    positions([('w1', 'base', 'Stablecoin', 'aave', 'USDC', 120.0), ('w2', 'solana', 'Altcoin', 'jup', 'JUP', 40.0)]),
+    # The solana position is closed later in the day
+    positions([('w1', 'base', 'Stablecoin', 'aave', 'USDC', 130.0)]),
+]
+
+
+def naive_rollup(snapshots, dimension):
+    """Per-item last/min/max/mean over the day's snapshots, with absent items at 0 USD"""
+    frames = [snapshot.groupby(dimension)['usd'].sum() for snapshot in snapshots]
+    values = pd.concat(frames, axis=1).fillna(0.0)
+    # Items only count from the first snapshot they appear in
+    first = {item: next(i for i, frame in enumerate(frames) if item in frame.index) for item in values.index}
+    rows = []
+    for item, series in values.iterrows():
+        seen = series.iloc[first[item]:]
+        rows.append((item, seen.iloc[-1], seen.min(), seen.max(), seen.mean(), len(seen)))
+    return pd.DataFrame(rows, columns=['item', 'last_usd', 'min_usd', 'max_usd', 'mean_usd', 'samples'])
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SnapshotStore(path=str(tmp_path / 'history.sqlite'))
+    for hour, snapshot in enumerate(SNAPSHOTS):
+        store.append('alice', snapshot, taken_at=DAY + datetime.timedelta(hours=hour))
+    return store
+
+
+@pytest.mark.parametrize('dimension', ['chain', 'wallet', 'total'])
+def test_rollups_match_naive_daily_aggregation(store, dimension):
+    result = store.rollups('alice', dimension, DAY.date(), DAY.date())
+    frames = SNAPSHOTS if dimension != 'total' else [s.assign(total='total') for s in SNAPSHOTS]
+    expected = naive_rollup(frames, dimension)
+    assert list(result['item']) == list(expected['item'])
+    for column in ['last_usd', 'min_usd', 'max_usd', 'mean_usd', 'samples']:
+        np.testing.assert_allclose(result[column], expected[column], err_msg=column)
+
+
+def test_closed_position_drops_to_zero(store):
+    chain = store.rollups('alice', 'chain', DAY.date(), DAY.date()).set_index('item')
+    assert chain.loc['solana', 'last_usd'] == 0
+    assert store.date_range('alice') == (DAY.date(), DAY.date())
+
+
+def test_connections_are_closed(tmp_path, monkeypatch):
+    store = SnapshotStore(path=str(tmp_path / 'history.sqlite'))
+    opened = []
+    connect = store._connect
+    monkeypatch.setattr(store, '_connect', lambda: opened.append(connect()) or opened[-1])
+
+    store.append('bob', SNAPSHOTS[0], taken_at=DAY)
+    store.rollups('bob', 'chain', DAY.date(), DAY.date())
+    store.date_range('bob')
+    assert len(opened) == 3
+    for conn in opened:
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
@@ -0,0 +1,95 @@
+"""Bitmap filter index against plain pandas masks"""
+import itertools
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from portfolio_index import PortfolioIndex, page_count, page_slice
+
+
+def portfolio(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'wallet': rng.choice(['w1', 'w2', 'w3'], n),
+        'chain': rng.choice(['base', 'ethereum', 'solana'], n),
+        'category': rng.choice(['Stablecoin', 'Bluechip', 'Altcoin'], n),
+        'protocol': rng.choice(['aave', 'uniswap', 'pendle', None], n),
+        'usd': rng.uniform(0, 1000, n).round(2),
+    })
+    # Repeated USD values on the range boundaries
+    frame.loc[frame.index[:20], 'usd'] = 250.0
+    return frame
+
+
+def naive(df, selections, usd_range):
+    mask = pd.Series(True, index=df.index)
+    for column, value in selections.items():
+        if value is not None and value != 'All':
+            mask &= df[column].astype(str) == value
+    if usd_range is not None and (usd_range[0] > df['usd'].min() or usd_range[1] < df['usd'].max()):
+        mask &= df['usd'].between(*usd_range)
+    return np.flatnonzero(mask.to_numpy())
+
+
+SELECTIONS = [
+    {},
+    {'chain': 'base'},
+    {'chain': 'base', 'wallet': 'w2', 'category': 'All'},
+    {'protocol': 'None'},
+    {'protocol': 'aave', 'chain': 'solana', 'wallet': 'w1', 'category': 'Bluechip'},
+    {'chain': 'polygon'},
+]
+RANGES = [None, (0, 1000), (250.0, 250.0), (100, 250.0), (999.99, 2000)]
+
+
+@pytest.mark.parametrize('selections, usd_range', list(itertools.product(SELECTIONS, RANGES)))
+def test_filter_matches_pandas(selections, usd_range):
+    df = portfolio()
+    index = PortfolioIndex(df)
+    view = index.filter(selections, usd_range)
+    expected = naive(df, selections, usd_range)
+    np.testing.assert_array_equal(view.rows, expected)
+    assert view.total_usd == pytest.approx(df['usd'].to_numpy()[expected].sum())
+    # Memoized: the same view object comes back
+    assert index.filter(dict(selections), usd_range) is view
+
+
+def test_empty_portfolio():
+    index = PortfolioIndex(portfolio().iloc[:0])
+    view = index.filter({'chain': 'base'}, (0, 10))
+    assert len(view) == 0 and view.total_usd == 0
+    assert index.min_usd == index.max_usd == 0.0
+    assert page_count(view, 10) == 1
+
+
+def test_pages_cover_the_view():
+    df = portfolio()
+    view = PortfolioIndex(df).filter({'wallet': 'w1'})
+    pages = [page_slice(df, view, page, 40) for page in range(1, page_count(view, 40) + 1)]
+    assert pd.concat(pages).index.tolist() == df.index[view.rows].tolist()
+
+
+def test_concurrent_filters_share_the_memo():
+    df = portfolio()
+    index = PortfolioIndex(df, cache_size=4)
+    errors = []
+
+    def run(offset):
+        try:
+            for i in range(200):
+                selections = SELECTIONS[(i + offset) % len(SELECTIONS)]
+                usd_range = RANGES[(i * 3 + offset) % len(RANGES)]
+                np.testing.assert_array_equal(index.filter(selections, usd_range).rows,
+                                              naive(df, selections, usd_range))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(offset,)) for offset in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(index._cache) <= 4
@@ -0,0 +1,40 @@
+"""Shared per-user portfolio cache"""
+import numpy as np
+import pandas as pd
+
+from portfolio_store import PortfolioCache, sizeof
+
+
+def loader(user):
+    return pd.DataFrame({'token': ['ETH', 'USDC'] * 50, 'usd': np.arange(100, dtype=float)})
+
+
+def test_new_versions_replace_the_aggregate():
+    cache = PortfolioCache(max_bytes=10 ** 9)
+    for version in range(20):
+        priced = cache.aggregate('alice', 'priced', lambda d: d.assign(usd=d['usd'] * version), loader,
+                                 version=version)
+        assert priced['usd'].iloc[1] == version
+    entry = cache._entries['alice']
+    assert list(cache._entries) == ['alice']
+    assert list(entry.aggregates) == ['priced']
+    assert cache.total_bytes == entry.data_bytes + sizeof(priced)
+    assert cache.stats()['misses'] == 1
+
+
+def test_same_version_is_a_hit():
+    cache = PortfolioCache(max_bytes=10 ** 9)
+    calls = []
+    for _ in range(3):
+        cache.aggregate('bob', 'total', lambda d: calls.append(1) or d['usd'].sum(), loader, version='v1')
+    assert len(calls) == 1
+
+
+def test_ceiling_holds_for_a_single_user():
+    data_bytes = sizeof(loader('carol'))
+    cache = PortfolioCache(max_bytes=data_bytes + 100)
+    cache.aggregate('carol', 'copy', lambda d: d.copy(), loader)
+    assert cache.total_bytes <= cache.max_bytes
+    assert cache.stats()['dropped_aggregates'] == 1
+    cache.drop_aggregate('carol', 'missing')
+    assert cache.total_bytes == data_bytes
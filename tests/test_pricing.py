@@ -0,0 +1,86 @@
+"""Incremental repricing against a full per-position revaluation"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from pricing import Repricer, load_prices
+
+POSITIONS = pd.DataFrame({
+    'wallet': ['w1', 'w1', 'w2', 'w2', 'w3', 'w3'],
+    'chain': ['ethereum', 'base', 'Base', 'solana', 'ethereum', 'base'],
+    'category': ['Bluechip', 'Bluechip', 'Stablecoin', 'Altcoin', 'Stablecoin', 'Altcoin'],
+    'token': ['ETH', 'eth', 'USDC', 'JUP', 'USDC', 'ODOS'],
+    'usd': [3000.0, 1500.0, 100.0, 50.0, 200.0, 20.0],
+})
+
+
+def prices(rows):
+    return pd.DataFrame(rows, columns=['token', 'chain', 'price'])
+
+
+SNAPSHOTS = [
+    prices([('ETH', None, 3000.0), ('USDC', None, 1.0), ('JUP', None, 0.5)]),
+    # ETH on base gets its own price; JUP unchanged; ODOS appears
+    prices([('ETH', None, 3000.0), ('ETH', 'base', 2990.0), ('USDC', None, 1.0), ('JUP', None, 0.5),
+            ('ODOS', None, 0.1)]),
+    # Duplicated rows (re-listed tokens): the last one wins
+    prices([('ETH', None, 3100.0), ('ETH', 'base', 2990.0), ('ETH', 'BASE', 3095.0), ('USDC', None, 1.0),
+            ('USDC', None, 0.999), ('JUP', None, 0.5), ('ODOS', None, 0.1)]),
+]
+
+
+def effective_prices(snapshot):
+    """Price of every position: chain-specific first, then the chain-less one (last row wins)"""
+    snapshot = snapshot.assign(token=snapshot['token'].str.upper(), chain=snapshot['chain'].str.lower())
+    specific = snapshot.dropna(subset=['chain']).drop_duplicates(['token', 'chain'], keep='last')
+    generic = snapshot[snapshot['chain'].isna()].drop_duplicates('token', keep='last').set_index('token')['price']
+    keys = POSITIONS.assign(token=POSITIONS['token'].str.upper(), chain=POSITIONS['chain'].str.lower())
+    price = keys.merge(specific, on=['token', 'chain'], how='left')['price']
+    return price.fillna(keys['token'].map(generic)).to_numpy(dtype=float)
+
+
+def naive_usd(snapshots):
+    amount = np.full(len(POSITIONS.index), np.nan)
+    static = POSITIONS['usd'].to_numpy()
+    for snapshot in snapshots:
+        price = effective_prices(snapshot)
+        first = np.isnan(amount) & (price > 0)
+        amount[first] = static[first] / price[first]
+    return np.where(np.isnan(price) | np.isnan(amount), static, amount * price)
+
+
+def test_revaluation_matches_naive_after_every_snapshot():
+    repricer = Repricer(POSITIONS)
+    for step in range(len(SNAPSHOTS)):
+        frame = repricer.revalue(SNAPSHOTS[step])
+        np.testing.assert_allclose(frame['usd'], naive_usd(SNAPSHOTS[:step + 1]))
+
+
+def test_only_tokens_with_a_new_price_are_changed():
+    repricer = Repricer(POSITIONS)
+    repricer.revalue(SNAPSHOTS[0])
+    changed = repricer._changed_tokens(*repricer._price_arrays(SNAPSHOTS[1]))
+    assert sorted(repricer.tokens[changed]) == ['ETH', 'ODOS']
+    repricer.revalue(SNAPSHOTS[1])
+
+    changed = repricer._changed_tokens(*repricer._price_arrays(SNAPSHOTS[2]))
+    assert sorted(repricer.tokens[changed]) == ['ETH', 'USDC']
+    repricer.revalue(SNAPSHOTS[2])
+
+    assert len(repricer._changed_tokens(*repricer._price_arrays(SNAPSHOTS[2]))) == 0
+
+
+def test_delta_per_dimension():
+    repricer = Repricer(POSITIONS)
+    before = repricer.revalue(SNAPSHOTS[1])['usd']
+    after = repricer.revalue(SNAPSHOTS[2])['usd']
+    expected = (after - before).groupby(POSITIONS['wallet']).sum()
+    assert repricer.last_delta['wallet'].sort_index().to_dict() == pytest.approx(expected.to_dict())
+
+
+def test_load_prices_drops_duplicate_rows(tmp_path):
+    path = tmp_path / 'prices.csv'
+    SNAPSHOTS[2].to_csv(path, index=False)
+    loaded = load_prices(str(path))
+    assert not loaded.duplicated(['token', 'chain']).any()
+    assert loaded.set_index('token').loc['USDC', 'price'] == 0.999
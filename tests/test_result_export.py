@@ -0,0 +1,45 @@
+"""Chunked CSV/Parquet export"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from result_export import export_rows
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_parquet_column_with_a_different_type_in_a_later_chunk(tmp_path):
+    # The sample (first 1000 values) says int64; later chunks hold text and floats
+    meta = [7] * 1500 + ["v2"] * 300 + [1.5] * 200
+    frame = pd.DataFrame({"apy": np.arange(2000, dtype=float), "meta": pd.Series(meta, dtype=object)})
+    path = str(tmp_path / "pools.parquet")
+
+    assert export_rows(frame, path, chunk_rows=500) == 2000
+    table = pq.read_table(path)
+    assert table.num_rows == 2000
+    assert str(table.schema.field("meta").type) == "string"
+    assert table.column("meta").to_pylist()[1499:1501] == ["7", "v2"]
+    assert str(table.schema.field("apy").type) == "double"
+    assert not (tmp_path / "pools.parquet.tmp").exists()
+
+
+def test_parquet_keeps_types_and_row_order(tmp_path):
+    frame = pd.DataFrame({
+        "pool": [f"p{i}" for i in range(10)],
+        "tokens": [["0xa", "0xb"]] * 10,
+        "tvlUsd": np.linspace(0, 9, 10),
+    })
+    path = str(tmp_path / "rows.parquet")
+    rows = np.array([9, 2, 5])
+
+    assert export_rows(frame, path, rows=rows, chunk_rows=2) == 3
+    result = pq.read_table(path).to_pandas()
+    assert list(result["pool"]) == ["p9", "p2", "p5"]
+    assert list(result["tokens"].iloc[0]) == ["0xa", "0xb"]
+
+
+def test_csv_header_without_rows(tmp_path):
+    frame = pd.DataFrame({"pool": ["a"], "apy": [1.0]})
+    path = str(tmp_path / "empty.csv")
+    assert export_rows(frame, path, rows=np.array([], dtype=int)) == 0
+    assert open(path).read().strip() == "pool,apy"
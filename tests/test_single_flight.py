@@ -0,0 +1,77 @@
+"""Coalesced downloads shared between sessions"""
+import threading
+import time
+
+import pytest
+
+from query_trace import QueryCancelled, Tracer
+from single_flight import SingleFlight
+
+
+def run_with_waiter(flights, fn):
+    """Runs fn as the leader of a flight that a second caller joins while it is running"""
+    started, release = threading.Event(), threading.Event()
+    outcome = {}
+
+    def leader_fn(shared):
+        started.set()
+        release.wait(5)
+        return fn(shared)
+
+    def call(name, fn):
+        try:
+            outcome[name] = flights.do("key", fn, kind="test")
+        except BaseException as e:
+            outcome[name] = e
+
+    leader = threading.Thread(target=call, args=("leader", leader_fn))
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call, args=("waiter", lambda shared: "second download"))
+    waiter.start()
+    while flights.stats()["test"]["coalesced"] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+    return outcome
+
+
+def test_waiters_get_the_leader_result():
+    flights = SingleFlight()
+    outcome = run_with_waiter(flights, lambda shared: "data")
+    assert outcome["leader"] == outcome["waiter"] == "data"
+    assert flights.stats()["test"] == {"requests": 2, "downloads": 1, "coalesced": 1}
+    assert flights.in_flight() == 0
+
+
+def test_waiters_get_base_exceptions_too():
+    flights = SingleFlight()
+
+    def cancelled(shared):
+        raise QueryCancelled()
+
+    outcome = run_with_waiter(flights, cancelled)
+    assert isinstance(outcome["leader"], QueryCancelled)
+    assert isinstance(outcome["waiter"], QueryCancelled)
+    assert flights.in_flight() == 0
+
+
+def test_shared_work_ignores_the_leader_cancellation_and_is_merged():
+    flights = SingleFlight()
+    tracer = Tracer()
+    tracer.start("query")
+    tracer.cancel_event = threading.Event()
+
+    def download(shared):
+        tracer.cancel_event.set()
+        with shared.span("download"):
+            shared.add_bytes("download", 123)
+        return "data"
+
+    assert flights.do("key", download, kind="test", tracer=tracer) == "data"
+    assert [span["name"] for span in tracer.current.spans] == ["download"]
+    assert tracer.current.bytes == {"download": 123}
+    with pytest.raises(QueryCancelled):
+        with tracer.span("next"):
+            pass
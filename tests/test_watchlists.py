@@ -0,0 +1,53 @@
+"""Watchlists match the same pools as the agent's search"""
+import pandas as pd
+import pytest
+
+from crypto_agent import CryptoAgent
+from pool_diff import PoolFeed
+from watchlists import WatchlistRegistry
+
+
+@pytest.fixture
+def pools(make_pools):
+    pools = make_pools(3000)
+    # A second aave project so the family name covers more than one
+    pools.loc[pools.index[::7], "project"] = "aave-v2"
+    return pools
+
+
+def search(pools, **criteria):
+    agent = CryptoAgent(snapshot=pools)
+    agent.state.update(criteria)
+    rows = agent.matching_rows(pools, agent.state)
+    return agent, set(pools["pool"].to_numpy()[rows])
+
+
+@pytest.mark.parametrize("criteria", [
+    {"protocol": "aave"},
+    {"protocol": "uniswp", "blockchain": "arbitrum"},
+    {"token": "usdcc", "apy_min": 5},
+    {"token": "usd", "protocol": "curve-dex"},
+])
+def test_saved_watchlist_matches_the_search(pools, criteria):
+    agent, expected = search(pools, **criteria)
+    feed = PoolFeed()
+    feed.update(pools)
+    registry = WatchlistRegistry(feed)
+    chain = agent.chain_mapping.get(criteria["blockchain"]) if criteria.get("blockchain") else None
+
+    watchlist = registry.add("owner", "w", agent.state, chain, agent.resolved)
+    assert expected
+    assert watchlist.matches == expected
+
+
+def test_new_pools_of_a_resolved_family_are_notified(pools):
+    agent, _ = search(pools, protocol="aave")
+    feed = PoolFeed()
+    feed.update(pools, taken_at=1)
+    registry = WatchlistRegistry(feed)
+    registry.add("owner", "w", agent.state, None, agent.resolved)
+
+    new = pools.iloc[:2].assign(pool=["new-v2", "new-other"], project=["aave-v2", "pendle"])
+    diff = feed.update(pd.concat([pools, new], ignore_index=True), taken_at=2)
+    registry.apply(diff)
+    assert registry.take_new_matches("owner") == {"w": ["new-v2"]}
@@ -0,0 +1,214 @@
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from pool_diff import pool_feed
+
+# Criterios que se guardan de CryptoAgent.state
+CRITERIA = ['blockchain', 'token', 'tvl_min', 'apy_min', 'protocol']
+
+
+class Watchlist:
+    """Criterios guardados por un usuario y las pools que los cumplen"""
+
+    def __init__(self, id, owner, name, criteria, chain, resolved=None):
+        self.id = id
+        self.owner = owner
+        self.name = name
+        self.criteria = {key: criteria.get(key) for key in CRITERIA}
+        # Nombre de la chain tal como aparece en DeFiLlama (ya resuelto por el agente)
+        self.chain = chain
+        # Proyectos y token tal como los resolvió el agente al guardar (CryptoAgent.resolved):
+        # 'aave' cubre aave-v2 y aave-v3, 'usdcc' se guarda como USDC
+        resolved = resolved or {}
+        protocol = self.criteria["protocol"]
+        self.projects = resolved.get("projects") or ([protocol] if protocol else None)
+        self.token = resolved.get("token") or self.criteria["token"]
+        self.created_at = time.time()
+        self.matches = set()
+        # Pools nuevas que todavía no se han notificado
+        self.pending = set()
+
+
+class WatchlistRegistry:
+    """Watchlists de todas las sesiones, reevaluadas de forma incremental.
+
+    Con cada snapshot nuevo solo se evalúan las pools añadidas, modificadas o
+    eliminadas según el diff del feed (pool_diff), cruzadas únicamente con las watchlists
+    de su misma chain (o sin chain).
+    """
+
+    def __init__(self, feed):
+        # Feed de pools del que se toman el snapshot actual y los diffs
+        self.feed = feed
+        self.watchlists = {}
+        self.by_owner = {}
+        # pool -> ids de las watchlists que la cumplen
+        self.by_pool = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def _frame(self, watchlists):
+        """Watchlists como DataFrame con los criterios normalizados"""
+        return pd.DataFrame({
+            "watchlist": [w.id for w in watchlists],
+            "w_chain": [w.chain.lower() if w.chain else None for w in watchlists],
+            "w_projects": [tuple(sorted({p.lower() for p in w.projects})) if w.projects else None for w in watchlists],
+            "w_token": [w.token.lower() if w.token else None for w in watchlists],
+            "w_tvl_min": [float(w.criteria["tvl_min"]) if w.criteria["tvl_min"] else float("-inf") for w in watchlists],
+            "w_apy_min": [float(w.criteria["apy_min"]) if w.criteria["apy_min"] else float("-inf") for w in watchlists],
+        })
+
+    def _match(self, pools, watchlists):
+        """Pares (pool, watchlist) que cumplen los criterios (pools indexadas por id).
+
+        Las pools se cruzan solo con las watchlists de su chain y con las que
+        no filtran por chain; el resto de criterios se evalúa vectorizado
+        sobre los pares resultantes.
+        """
+        if len(pools.index) == 0 or not watchlists:
+            return pd.DataFrame(columns=["pool", "watchlist"])
+
+        frame = self._frame(watchlists)
+
+        # Pares (posición de pool, posición de watchlist) agrupados por chain
+        pools_by_chain = pools.groupby("chain_key").indices
+        all_pools = np.arange(len(pools.index))
+        pool_rows, watchlist_rows = [], []
+        for chain, positions in frame.groupby("w_chain", dropna=False).indices.items():
+            candidates = all_pools if pd.isna(chain) else pools_by_chain.get(chain)
+            if candidates is None:
+                continue
+            pool_rows.append(np.repeat(candidates, len(positions)))
+            watchlist_rows.append(np.tile(positions, len(candidates)))
+        if not pool_rows:
+            return pd.DataFrame(columns=["pool", "watchlist"])
+        pool_rows = np.concatenate(pool_rows)
+        watchlist_rows = np.concatenate(watchlist_rows)
+
+        mask = (
+            (pools["tvlUsd"].to_numpy(dtype=float)[pool_rows] >= frame["w_tvl_min"].to_numpy()[watchlist_rows])
+            & (pools["apy"].to_numpy(dtype=float)[pool_rows] >= frame["w_apy_min"].to_numpy()[watchlist_rows])
+        )
+
+        # Protocolo: pertenencia a los proyectos resueltos (igual que CryptoAgent.matching_rows),
+        # calculada una vez por conjunto de proyectos distinto sobre las pools
+        project_codes, project_sets = pd.factorize(frame["w_projects"])
+        if len(project_sets):
+            has_project = np.column_stack([
+                pools["project_key"].isin(projects).to_numpy(dtype=bool) for projects in project_sets
+            ])
+            wanted = project_codes[watchlist_rows]
+            with_project = wanted >= 0
+            mask[with_project] &= has_project[pool_rows[with_project], wanted[with_project]]
+
+        # Token: búsqueda por subcadena en el símbolo del token resuelto (igual que
+        # CryptoAgent.matching_rows), calculada una vez por token distinto sobre las pools
+        token_codes, tokens = pd.factorize(frame["w_token"])
+        if len(tokens):
+            has_token = np.column_stack([
+                pools["symbol_key"].str.contains(token, regex=False).fillna(False).to_numpy(dtype=bool)
+                for token in tokens
+            ])
+            wanted = token_codes[watchlist_rows]
+            with_token = wanted >= 0
+            mask[with_token] &= has_token[pool_rows[with_token], wanted[with_token]]
+
+        return pd.DataFrame({
+            "pool": pools.index.to_numpy()[pool_rows[mask]],
+            "watchlist": frame["watchlist"].to_numpy()[watchlist_rows[mask]]
+        })
+
+    def apply(self, diff):
+        """Reevalúa las watchlists con el diff de un snapshot nuevo del feed.
+
+        Devuelve el número de pools que han cambiado.
+        """
+        with self._lock:
+            if not self.watchlists or len(diff) == 0:
+                return len(diff)
+
+            current = self.feed.current
+            changed_ids = self.feed.ids[np.concatenate([diff.added, diff.changed])]
+            removed_ids = self.feed.ids[diff.removed]
+
+            matched = self._match(current.loc[changed_ids], list(self.watchlists.values()))
+            new_members = matched.groupby("pool")["watchlist"].agg(set).to_dict() if len(matched.index) else {}
+
+            for pool in list(changed_ids) + list(removed_ids):
+                before = self.by_pool.pop(pool, set())
+                after = new_members.get(pool, set())
+                for watchlist_id in before - after:
+                    watchlist = self.watchlists[watchlist_id]
+                    watchlist.matches.discard(pool)
+                    watchlist.pending.discard(pool)
+                for watchlist_id in after - before:
+                    watchlist = self.watchlists[watchlist_id]
+                    watchlist.matches.add(pool)
+                    watchlist.pending.add(pool)
+                if after:
+                    self.by_pool[pool] = after
+
+            return len(diff)
+
+    def add(self, owner, name, criteria, chain=None, resolved=None):
+        """Guarda (o reemplaza) una watchlist y calcula sus coincidencias actuales.
+
+        `resolved` son los proyectos y el token con los que filtró el agente
+        (CryptoAgent.resolved); sin él se usan el protocolo y el token tal cual.
+        """
+        with self._lock:
+            existing = self.by_owner.get(owner, {}).get(name)
+            if existing is not None:
+                self._remove(existing)
+
+            watchlist = Watchlist(self._next_id, owner, name, criteria, chain, resolved)
+            self._next_id += 1
+            self.watchlists[watchlist.id] = watchlist
+            self.by_owner.setdefault(owner, {})[name] = watchlist
+
+            # Las coincidencias iniciales no son novedades
+            if self.feed.current is not None:
+                matched = self._match(self.feed.current, [watchlist])
+                watchlist.matches = set(matched["pool"])
+                for pool in watchlist.matches:
+                    self.by_pool.setdefault(pool, set()).add(watchlist.id)
+            return watchlist
+
+    def _remove(self, watchlist):
+        for pool in watchlist.matches:
+            members = self.by_pool.get(pool)
+            if members is not None:
+                members.discard(watchlist.id)
+                if not members:
+                    del self.by_pool[pool]
+        del self.watchlists[watchlist.id]
+        del self.by_owner[watchlist.owner][watchlist.name]
+
+    def remove(self, owner, name):
+        with self._lock:
+            watchlist = self.by_owner.get(owner, {}).get(name)
+            if watchlist is None:
+                return False
+            self._remove(watchlist)
+            return True
+
+    def for_owner(self, owner):
+        with self._lock:
+            return list(self.by_owner.get(owner, {}).values())
+
+    def take_new_matches(self, owner):
+        """Pools nuevas de cada watchlist desde la última consulta (y las marca como vistas)"""
+        with self._lock:
+            news = {}
+            for name, watchlist in self.by_owner.get(owner, {}).items():
+                if watchlist.pending:
+                    news[name] = sorted(watchlist.pending)
+                    watchlist.pending = set()
+            return news
+
+
+# Compartido por todas las sesiones del proceso
+watchlists = WatchlistRegistry(pool_feed)
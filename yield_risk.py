@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from concentration import concentration_level
+
+# Concurrent chart downloads when loading the histories of a portfolio
+HISTORY_WORKERS = 8
+
+# Days two pools must have in common for their correlation to be estimated
+MIN_OBSERVATIONS = 14
+
+
+def load_histories(pool_ids, fetch=None, workers=HISTORY_WORKERS):
+    """APY history of every pool ({pool: chart DataFrame}), downloaded concurrently.
+
+    Pools whose history cannot be fetched are left out.
+    """
+    if fetch is None:
+        from defillama import fetch_chart as fetch
+
+    def load(pool):
+        try:
+            return pool, fetch(pool)
+        except Exception:
+            return pool, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(load, list(pool_ids))
+        return {pool: chart for pool, chart in results if chart is not None and len(chart.index) > 0}
+
+
+class ApyHistory:
+    """Daily APY matrix (days x pools) aligned on calendar days.
+
+    Every history is bucketed to its calendar day (the last value of the day
+    wins) and scattered into a single float matrix; days on which a pool has
+    no data stay NaN. Built once per set of pools and sliced by window.
+    """
+
+    def __init__(self, histories):
+        self.pools = list(histories)
+        frames = [histories[pool] for pool in self.pools]
+        if not frames:
+            self.dates = np.array([], dtype='datetime64[D]')
+            self.matrix = np.empty((0, 0))
+            return
+
+        days = np.concatenate([chart['timestamp'].to_numpy(dtype='datetime64[ns]').astype('datetime64[D]')
+                               for chart in frames])
+        apy = np.concatenate([chart['apy'].to_numpy(dtype=float, na_value=np.nan) for chart in frames])
+        columns = np.repeat(np.arange(len(frames)), [len(chart.index) for chart in frames])
+
+        self.dates, rows = np.unique(days, return_inverse=True)
+        self.matrix = np.full((len(self.dates), len(self.pools)), np.nan)
+        self.matrix[rows, columns] = apy
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes + self.dates.nbytes
+
+    def window(self, days=None):
+        """Rows of the last `days` calendar days (all of them when None)"""
+        if days is None or not len(self.dates):
+            return self.dates, self.matrix
+        start = np.searchsorted(self.dates, self.dates[-1] - np.timedelta64(days - 1, 'D'))
+        return self.dates[start:], self.matrix[start:]
+
+
+def pool_exposure(positions, matched):
+    """USD held in every matched pool (positions without a pool are left out)"""
+    has_pool = matched['pool'].notna()
+    return positions.loc[has_pool, 'usd'].groupby(matched.loc[has_pool, 'pool'].to_numpy()).sum()
+
+
+def pairwise_covariance(matrix, min_observations=MIN_OBSERVATIONS):
+    """Covariance and correlation of the columns of a matrix with gaps.
+
+    Every pair uses the days both columns have data (pairwise deletion, as
+    DataFrame.cov does), computed with matrix products over the values (gaps
+    as 0) and the presence mask. Pairs with fewer than min_observations common
+    days get NaN.
+    """
+    present = ~np.isnan(matrix)
+    mask = present.astype(float)
+    # Centering on the column means first keeps the products well conditioned
+    values = np.where(present, matrix, 0.0)
+    values = np.where(present, values - values.sum(axis=0) / np.maximum(mask.sum(axis=0), 1), 0.0)
+
+    overlap = mask.T @ mask
+    # sums[i, j]: sum of column i over the days column j has data
+    sums = values.T @ mask
+    with np.errstate(invalid='ignore', divide='ignore'):
+        covariance = (values.T @ values - sums * sums.T / overlap) / (overlap - 1)
+        covariance[overlap < min_observations] = np.nan
+        # Variance of column i over the days column j has data, for the pairwise correlation
+        variances = ((values ** 2).T @ mask - sums ** 2 / overlap) / (overlap - 1)
+        correlation = np.clip(covariance / np.sqrt(variances * variances.T), -1, 1)
+    return covariance, correlation, overlap
+
+
+def portfolio_risk(history, exposure, days=None, min_observations=MIN_OBSERVATIONS):
+    """Expected yield, APY volatility and correlation of a portfolio over a history window.
+
+    `exposure` is the USD per pool (pool_exposure). Only pools with at least
+    min_observations days of history in the window take part; their weights
+    are renormalized. The portfolio volatility is sqrt(w' C w) over the
+    pairwise covariance C, with pairs that share too few days taken as
+    uncorrelated. Returns a dict of figures, a per-pool table and the
+    correlation matrix (as DataFrames labelled by pool).
+    """
+    dates, matrix = history.window(days)
+    columns = pd.Index(history.pools).get_indexer(exposure.index)
+    known = columns >= 0
+    usd = exposure.to_numpy(dtype=float)[known]
+    pools = exposure.index[known]
+    matrix = matrix[:, columns[known]]
+
+    observations = (~np.isnan(matrix)).sum(axis=0)
+    enough = observations >= min_observations
+    usd, pools, matrix, observations = usd[enough], pools[enough], matrix[:, enough], observations[enough]
+    total = float(exposure.sum())
+    covered = float(usd.sum())
+
+    if covered <= 0:
+        return None
+
+    weights = usd / covered
+    with np.errstate(invalid='ignore'):
+        mean_apy = np.nanmean(matrix, axis=0)
+        current_apy = matrix[-1]
+    covariance, correlation, _ = pairwise_covariance(matrix, min_observations)
+    volatility = np.sqrt(np.diag(covariance))
+
+    portfolio_volatility = float(np.sqrt(max(weights @ np.nan_to_num(covariance) @ weights, 0)))
+    weighted_volatility = float(weights @ np.nan_to_num(volatility))
+    expected_apy = float(weights @ mean_apy)
+
+    # Average correlation between different pools, weighted by the product of their weights
+    pair_weights = np.outer(weights, weights)
+    np.fill_diagonal(pair_weights, 0)
+    valid = ~np.isnan(correlation)
+    pair_total = pair_weights[valid].sum()
+    avg_correlation = None
+    if pair_total > 0:
+        avg_correlation = float((pair_weights * np.nan_to_num(correlation))[valid].sum() / pair_total)
+
+    # Simplified Herfindahl-Hirschman index of the pool weights (0-100), as in concentration.py
+    pool_hhi = float((weights ** 2).sum() * 100)
+
+    figures = {
+        'expected_apy': expected_apy,
+        'expected_yield': covered * expected_apy / 100,
+        'portfolio_volatility': portfolio_volatility,
+        'weighted_volatility': weighted_volatility,
+        'diversification_ratio': weighted_volatility / portfolio_volatility if portfolio_volatility > 0 else None,
+        'avg_correlation': avg_correlation,
+        'pool_hhi': pool_hhi,
+        'pool_level': str(concentration_level(pool_hhi)),
+        'pools': len(pools),
+        'days': len(dates),
+        'coverage': covered / total * 100 if total > 0 else 0.0,
+    }
+    table = pd.DataFrame({
+        'usd': usd,
+        'weight': weights * 100,
+        'mean_apy': mean_apy,
+        'current_apy': current_apy,
+        'volatility': volatility,
+        'days': observations,
+    }, index=pools)
+    return {
+        'figures': figures,
+        'pools': table,
+        'correlation': pd.DataFrame(correlation, index=pools, columns=pools),
+    }